@@ -25,6 +25,17 @@ public sealed class DatabaseContext : DbContext
         modelBuilder.Entity<UserModel>()
             .Property(user => user.Roles)
             .HasConversion<short>();
+
+        modelBuilder.Entity<MessageModel>()
+            .HasIndex(message => message.StorageMessageId)
+            .IsUnique();
+
+        modelBuilder.Entity<MessageModel>()
+            .HasIndex(message => message.AuthorId);
+
+        // Serves the recipient's stats and the keyset pages of the inbox.
+        modelBuilder.Entity<MessageModel>()
+            .HasIndex(message => new { message.RecipientId, message.Id });
         
         base.OnModelCreating(modelBuilder);
     }
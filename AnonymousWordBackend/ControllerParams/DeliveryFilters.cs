@@ -0,0 +1,8 @@
+namespace AnonymousWordBackend.ControllerParams;
+
+public class DeliveryFilters
+{
+    public required long SenderId { get; set; }
+    public string? Link { get; set; }
+    public long? RepliedMessageId { get; set; }
+}
@@ -0,0 +1,8 @@
+namespace AnonymousWordBackend.ControllerParams;
+
+public class InboxFilters
+{
+    public long? Before { get; set; }
+    public long? After { get; set; }
+    public int Limit { get; set; } = 10;
+}
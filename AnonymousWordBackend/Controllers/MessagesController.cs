@@ -70,6 +70,69 @@ public class MessagesController : ControllerBase
         return Ok(message);
     }
     
+    /// <summary>
+    /// Get the page of the Messages received by the User, newest first.
+    /// </summary>
+    /// <param name="recipientId">Recipient Telegram ID.</param>
+    /// <param name="filters">Message ID to page before or after and the page size, from 1 to 50.</param>
+    /// <returns>Messages of the page and whether there are older and newer ones.</returns>
+    [HttpGet("inbox/{recipientId:long}")]
+    public async Task<IActionResult> Inbox(long recipientId, [FromQuery] InboxFilters filters)
+    {
+        int limit = Math.Clamp(filters.Limit, 1, 50);
+
+        // One extra Message tells whether there is the next page in the paging direction.
+        List<MessageModel> messages = await _messageService.LoadInboxPage(recipientId, filters.Before, filters.After, limit + 1);
+        bool hasMore = messages.Count > limit;
+
+        if (hasMore)
+            messages.RemoveAt(filters.After != null ? 0 : messages.Count - 1);
+
+        return Ok(new
+        {
+            Messages = messages.Select(message => new { message.Id, message.Body, message.AuthoredOn }),
+            HasOlder = filters.After != null || hasMore,
+            HasNewer = filters.After != null ? hasMore : filters.Before != null
+        });
+    }
+
+    /// <summary>
+    /// Resolve everything needed to deliver the anonymous Message in one query.
+    ///
+    /// The receiver is found by the link, or as the author of the replied Message
+    /// in the sender's chat, which is returned as the original Message.
+    /// </summary>
+    /// <param name="filters">Sender Telegram ID and the link or the replied Message ID.</param>
+    /// <returns>Sender, receiver and original Message, the missing ones are null.</returns>
+    [HttpGet("delivery")]
+    public async Task<IActionResult> ResolveDelivery([FromQuery] DeliveryFilters filters)
+    {
+        IQueryable<MessageModel> repliedMessages = _databaseContext
+            .Messages
+            .Where(message => filters.RepliedMessageId != null
+                && message.RecipientId == filters.SenderId
+                && message.RecipientChatMessageId == filters.RepliedMessageId);
+
+        // The receiver and the original Message are subqueries of the sender's row.
+        var delivery = await _databaseContext
+            .Users
+            .Where(user => user.TelegramId == filters.SenderId)
+            .Select(sender => new
+            {
+                Sender = sender,
+                Receiver = filters.Link != null
+                    ? _databaseContext.Users.FirstOrDefault(user => user.Link == filters.Link)
+                    : _databaseContext.Users.FirstOrDefault(user => repliedMessages.Any(message => message.AuthorId == user.TelegramId)),
+                OriginalMessage = repliedMessages.FirstOrDefault()
+            })
+            .FirstOrDefaultAsync();
+
+        if (delivery == null)
+            return NotFound();
+
+        return Ok(delivery);
+    }
+
     /// <summary>
     /// Create Message.
     /// </summary>
@@ -77,6 +140,59 @@ public class MessagesController : ControllerBase
     /// <returns>Created Message.</returns>
     [HttpPost]
     public async Task<IActionResult> CreateMessage([FromBody] PostMessage data)
+    {
+        MessageModel messageModel = BuildMessageModel(data);
+
+        _databaseContext.Messages.Add(messageModel);
+        await _databaseContext.SaveChangesAsync();
+        
+        return Ok(messageModel);
+    }
+
+    /// <summary>
+    /// Create Messages in bulk.
+    ///
+    /// Idempotent on the storage Message ID: Messages which are already stored are skipped,
+    /// so a retried batch never creates duplicates.
+    /// </summary>
+    /// <param name="data">Messages data.</param>
+    /// <returns>Count of created and skipped Messages.</returns>
+    [HttpPost("bulk")]
+    public async Task<IActionResult> CreateMessages([FromBody] List<PostMessage> data)
+    {
+        List<long> storageMessageIds = data
+            .Select(message => message.StorageMessageId)
+            .Distinct()
+            .ToList();
+
+        HashSet<long> storedMessageIds = (await _databaseContext
+            .Messages
+            .Where(message => storageMessageIds.Contains(message.StorageMessageId))
+            .Select(message => message.StorageMessageId)
+            .ToListAsync())
+            .ToHashSet();
+
+        List<MessageModel> messageModels = [];
+        foreach (PostMessage message in data)
+        {
+            // Skip stored Messages and duplicates within the batch.
+            if (!storedMessageIds.Add(message.StorageMessageId))
+                continue;
+
+            messageModels.Add(BuildMessageModel(message));
+        }
+
+        _databaseContext.Messages.AddRange(messageModels);
+        await _databaseContext.SaveChangesAsync();
+
+        return Ok(new
+        {
+            Created = messageModels.Count,
+            Skipped = data.Count - messageModels.Count
+        });
+    }
+
+    private static MessageModel BuildMessageModel(PostMessage data)
     {
         MessageModel messageModel = new()
         {
@@ -91,9 +207,6 @@ public class MessagesController : ControllerBase
         if (data.Body != null)
             messageModel.Body = data.Body;
 
-        _databaseContext.Messages.Add(messageModel);
-        await _databaseContext.SaveChangesAsync();
-        
-        return Ok(messageModel);
+        return messageModel;
     }
 }
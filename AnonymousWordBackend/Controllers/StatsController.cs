@@ -0,0 +1,33 @@
+using AnonymousWordBackend.Contexts;
+using Microsoft.AspNetCore.Mvc;
+using Microsoft.EntityFrameworkCore;
+
+namespace AnonymousWordBackend.Controllers;
+
+[ApiController]
+[Route("/api/stats")]
+public class StatsController : ControllerBase
+{
+    private readonly DatabaseContext _databaseContext;
+
+    public StatsController(DatabaseContext databaseContext)
+    {
+        _databaseContext = databaseContext;
+    }
+
+    /// <summary>
+    /// Get the total counts of the Users and Messages.
+    ///
+    /// Used by the bot to reconcile its counters periodically, not on every request.
+    /// </summary>
+    /// <returns>Users and Messages counts.</returns>
+    [HttpGet]
+    public async Task<IActionResult> Totals()
+    {
+        return Ok(new
+        {
+            Users = await _databaseContext.Users.LongCountAsync(),
+            Messages = await _databaseContext.Messages.LongCountAsync()
+        });
+    }
+}
@@ -131,6 +131,58 @@ public class UsersController : ControllerBase
             : Ok(user);
     }
 
+    /// <summary>
+    /// Get the counts of the Messages sent and received by the User.
+    /// </summary>
+    /// <param name="telegramId">User's Telegram ID.</param>
+    /// <returns>Sent and received Messages counts.</returns>
+    [HttpGet("{telegramId:long}/stats")]
+    public async Task<IActionResult> UserStats(long telegramId)
+    {
+        return Ok(new
+        {
+            Sent = await _databaseContext.Messages.LongCountAsync(message => message.AuthorId == telegramId),
+            Received = await _databaseContext.Messages.LongCountAsync(message => message.RecipientId == telegramId)
+        });
+    }
+
+    /// <summary>
+    /// Get Telegram IDs of the banned Users.
+    /// </summary>
+    /// <returns>Telegram IDs.</returns>
+    [HttpGet("banned")]
+    public async Task<IActionResult> BannedUsers()
+    {
+        List<long> telegramIds = await _databaseContext
+            .Users
+            .Where(user => (user.Roles & Roles.Banned) == Roles.Banned)
+            .Select(user => user.TelegramId)
+            .ToListAsync();
+
+        return Ok(telegramIds);
+    }
+
+    /// <summary>
+    /// Get the page of not banned Users ordered by ID, after the given ID.
+    /// </summary>
+    /// <param name="after">ID of the last User of the previous page.</param>
+    /// <param name="limit">Page size, from 1 to 1000.</param>
+    /// <returns>IDs and Telegram IDs of the Users.</returns>
+    [HttpGet("page")]
+    public async Task<IActionResult> UsersPage([FromQuery] long after = 0, [FromQuery] int limit = 100)
+    {
+        // Keyset pagination on the primary key, every page is an index range scan.
+        var users = await _databaseContext
+            .Users
+            .Where(user => user.Id > after && (user.Roles & Roles.Banned) != Roles.Banned)
+            .OrderBy(user => user.Id)
+            .Take(Math.Clamp(limit, 1, 1000))
+            .Select(user => new { user.Id, user.TelegramId })
+            .ToListAsync();
+
+        return Ok(users);
+    }
+
     /// <summary>
     /// Patch User.
     /// </summary>
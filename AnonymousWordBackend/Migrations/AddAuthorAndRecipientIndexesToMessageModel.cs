@@ -0,0 +1,36 @@
+using AnonymousWordBackend.Contexts;
+using Microsoft.EntityFrameworkCore.Infrastructure;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+namespace AnonymousWordBackend.Migrations;
+
+[DbContext(typeof(DatabaseContext))]
+[Migration("AddAuthorAndRecipientIndexesToMessageModel")]
+public class AddAuthorAndRecipientIndexesToMessageModel : Migration
+{
+    /// <inheritdoc />
+    protected override void Up(MigrationBuilder migrationBuilder)
+    {
+        migrationBuilder.CreateIndex(
+            name: "IX_messages_author",
+            table: "messages",
+            column: "author");
+
+        migrationBuilder.CreateIndex(
+            name: "IX_messages_recipient",
+            table: "messages",
+            column: "recipient");
+    }
+
+    /// <inheritdoc />
+    protected override void Down(MigrationBuilder migrationBuilder)
+    {
+        migrationBuilder.DropIndex(
+            name: "IX_messages_author",
+            table: "messages");
+
+        migrationBuilder.DropIndex(
+            name: "IX_messages_recipient",
+            table: "messages");
+    }
+}
\ No newline at end of file
@@ -0,0 +1,37 @@
+using AnonymousWordBackend.Contexts;
+using Microsoft.EntityFrameworkCore.Infrastructure;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+namespace AnonymousWordBackend.Migrations;
+
+[DbContext(typeof(DatabaseContext))]
+[Migration("AddRecipientIdIndexToMessageModel")]
+public class AddRecipientIdIndexToMessageModel : Migration
+{
+    /// <inheritdoc />
+    protected override void Up(MigrationBuilder migrationBuilder)
+    {
+        // The composite index serves the recipient's counts as well as the keyset pages of the inbox.
+        migrationBuilder.DropIndex(
+            name: "IX_messages_recipient",
+            table: "messages");
+
+        migrationBuilder.CreateIndex(
+            name: "IX_messages_recipient_id",
+            table: "messages",
+            columns: new[] { "recipient", "id" });
+    }
+
+    /// <inheritdoc />
+    protected override void Down(MigrationBuilder migrationBuilder)
+    {
+        migrationBuilder.DropIndex(
+            name: "IX_messages_recipient_id",
+            table: "messages");
+
+        migrationBuilder.CreateIndex(
+            name: "IX_messages_recipient",
+            table: "messages",
+            column: "recipient");
+    }
+}
\ No newline at end of file
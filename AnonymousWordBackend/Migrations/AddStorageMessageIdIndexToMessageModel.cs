@@ -0,0 +1,28 @@
+using AnonymousWordBackend.Contexts;
+using Microsoft.EntityFrameworkCore.Infrastructure;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+namespace AnonymousWordBackend.Migrations;
+
+[DbContext(typeof(DatabaseContext))]
+[Migration("AddStorageMessageIdIndexToMessageModel")]
+public class AddStorageMessageIdIndexToMessageModel : Migration
+{
+    /// <inheritdoc />
+    protected override void Up(MigrationBuilder migrationBuilder)
+    {
+        migrationBuilder.CreateIndex(
+            name: "IX_messages_storage_message_id",
+            table: "messages",
+            column: "storage_message_id",
+            unique: true);
+    }
+
+    /// <inheritdoc />
+    protected override void Down(MigrationBuilder migrationBuilder)
+    {
+        migrationBuilder.DropIndex(
+            name: "IX_messages_storage_message_id",
+            table: "messages");
+    }
+}
\ No newline at end of file
@@ -33,6 +33,40 @@ public class MessageService (DatabaseContext databaseContext)
             : new MessageEntity(databaseContext, message);
     }
     
+    /// <summary>
+    /// Load the page of the Messages received by the User, newest first.
+    ///
+    /// Keyset pagination on (RecipientId, Id): the page before or after the given Message ID
+    /// is an index range scan however deep it is.
+    /// </summary>
+    public async Task<List<MessageModel>> LoadInboxPage(long recipientId, long? before, long? after, int limit)
+    {
+        IQueryable<MessageModel> query = databaseContext
+            .Messages
+            .Where(message => message.RecipientId == recipientId);
+
+        if (after != null)
+        {
+            List<MessageModel> newer = await query
+                .Where(message => message.Id > after)
+                .OrderBy(message => message.Id)
+                .Take(limit)
+                .ToListAsync();
+
+            newer.Reverse();
+
+            return newer;
+        }
+
+        if (before != null)
+            query = query.Where(message => message.Id < before);
+
+        return await query
+            .OrderByDescending(message => message.Id)
+            .Take(limit)
+            .ToListAsync();
+    }
+
     private static Expression<Func<MessageModel, bool>> GetExpression(string propertyName, object value)
     {
         ParameterExpression parameter = Expression.Parameter(typeof(MessageModel), "message");
@@ -0,0 +1,314 @@
+"""
+Local in-memory stand-in of the backend API.
+
+Serves the /api/user and /api/message endpoints the bot uses with the same
+JSON shape as the backend, after the configured latency, and counts the
+calls per endpoint.
+"""
+
+import asyncio
+import re
+import secrets
+from collections import Counter
+from itertools import count
+from json import dumps, loads
+from time import time
+
+from tornado.web import Application, RequestHandler
+
+from src.helpers.user_roles import UserRoles
+
+
+class FakeBackend(object):
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+        self.calls = Counter()
+        self.users: dict[int, dict] = {}
+        self.users_by_link: dict[str, dict] = {}
+        self.messages: dict[int, dict] = {}
+        self._user_ids = count(1)
+        self._message_ids = count(1)
+
+    def application(self) -> Application:
+        return Application([
+            (r"/api/user", UserFiltersHandler, {"backend": self}),
+            (r"/api/user/banned", BannedUsersHandler, {"backend": self}),
+            (r"/api/user/page", UsersPageHandler, {"backend": self}),
+            (r"/api/user/(\d+)", UserHandler, {"backend": self}),
+            (r"/api/user/(\d+)/stats", UserStatsHandler, {"backend": self}),
+            (r"/api/user/author/(\d+)", AuthorHandler, {"backend": self}),
+            (r"/api/user/author_from_storage/(\d+)", AuthorFromStorageHandler, {"backend": self}),
+            (r"/api/message", MessageHandler, {"backend": self}),
+            (r"/api/message/bulk", MessagesBulkHandler, {"backend": self}),
+            (r"/api/message/delivery", DeliveryHandler, {"backend": self}),
+            (r"/api/message/inbox/(\d+)", InboxHandler, {"backend": self}),
+            (r"/api/stats", StatsHandler, {"backend": self}),
+        ])
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def create_user(self, telegram_id: int, link: str = None, roles: UserRoles = UserRoles.User) -> dict:
+        user = {
+            "id": next(self._user_ids),
+            "telegramId": telegram_id,
+            "link": link or secrets.token_urlsafe(12),
+            "welcomeMessage": None,
+            "roles": roles.value,
+            "registeredAt": int(time()),
+        }
+
+        self.users[telegram_id] = user
+        self.users_by_link[user["link"]] = user
+
+        return user
+
+    def patch_user(self, telegram_id: int, data: dict) -> dict | None:
+        user = self.users.get(telegram_id)
+        if user is None:
+            return None
+
+        if data.get("link") is not None:
+            self.users_by_link.pop(user["link"], None)
+            user["link"] = data["link"]
+            self.users_by_link[user["link"]] = user
+        if data.get("welcomeMessage") is not None:
+            user["welcomeMessage"] = data["welcomeMessage"]
+
+        return user
+
+    def create_message(self, data: dict) -> dict:
+        message = {
+            "id": next(self._message_ids),
+            "authorChatMessageId": data["authorChatMessageId"],
+            "recipientChatMessageId": data["recipientChatMessageId"],
+            "storageMessageId": data["storageMessageId"],
+            "authorId": data["authorId"],
+            "recipientId": data["recipientId"],
+            "body": data.get("body"),
+            "authoredOn": int(time()),
+        }
+
+        self.messages[message["storageMessageId"]] = message
+
+        return message
+
+    def find_message(self, **filters) -> dict | None:
+        for message in self.messages.values():
+            if all(message[key] == value for key, value in filters.items()):
+                return message
+
+        return None
+
+
+class BackendHandler(RequestHandler):
+
+    def initialize(self, backend: FakeBackend):
+        self.backend = backend
+
+    async def prepare(self):
+        endpoint = re.sub(r"/\d+", "/{id}", self.request.path)
+        self.backend.calls[f"{self.request.method} {endpoint}"] += 1
+
+        if self.backend.latency:
+            await asyncio.sleep(self.backend.latency)
+
+    def respond(self, data):
+        if data is None:
+            self.set_status(404)
+            return
+
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.write(dumps(data))
+
+    def argument(self, name: str) -> int | str | None:
+        value = self.get_query_argument(name, None)
+
+        return int(value) if value is not None and value.lstrip("-").isdigit() else value
+
+
+class UserFiltersHandler(BackendHandler):
+
+    async def get(self):
+        telegram_id = self.argument("telegramId")
+        link = self.argument("link")
+
+        user = None
+        if telegram_id is not None:
+            user = self.backend.users.get(telegram_id)
+        elif link is not None:
+            user = self.backend.users_by_link.get(str(link))
+
+        if user is not None and link is not None and user["link"] != str(link):
+            user = None
+
+        self.respond(user)
+
+
+class BannedUsersHandler(BackendHandler):
+
+    async def get(self):
+        self.respond([
+            user["telegramId"]
+            for user in self.backend.users.values()
+            if UserRoles.Banned in UserRoles(user["roles"])
+        ])
+
+
+class UsersPageHandler(BackendHandler):
+
+    async def get(self):
+        after = self.argument("after") or 0
+        limit = min(max(self.argument("limit") or 100, 1), 1000)
+
+        users = sorted(
+            (
+                user for user in self.backend.users.values()
+                if user["id"] > after and UserRoles.Banned not in UserRoles(user["roles"])
+            ),
+            key=lambda user: user["id"],
+        )
+
+        self.respond([{"id": user["id"], "telegramId": user["telegramId"]} for user in users[:limit]])
+
+
+class UserHandler(BackendHandler):
+
+    async def get(self, user_id: str):
+        self.respond(next((user for user in self.backend.users.values() if user["id"] == int(user_id)), None))
+
+    async def put(self, telegram_id: str):
+        self.respond(self.backend.create_user(int(telegram_id)))
+
+    async def patch(self, telegram_id: str):
+        self.respond(self.backend.patch_user(int(telegram_id), loads(self.request.body or b"{}")))
+
+
+class UserStatsHandler(BackendHandler):
+
+    async def get(self, telegram_id: str):
+        messages = self.backend.messages.values()
+
+        self.respond({
+            "sent": sum(1 for message in messages if message["authorId"] == int(telegram_id)),
+            "received": sum(1 for message in messages if message["recipientId"] == int(telegram_id)),
+        })
+
+
+class AuthorHandler(BackendHandler):
+
+    async def get(self, message_id: str):
+        message = self.backend.find_message(recipientChatMessageId=int(message_id))
+
+        self.respond(None if message is None else self.backend.users.get(message["authorId"]))
+
+
+class AuthorFromStorageHandler(BackendHandler):
+
+    async def get(self, message_id: str):
+        message = self.backend.messages.get(int(message_id))
+
+        self.respond(None if message is None else self.backend.users.get(message["authorId"]))
+
+
+class MessageHandler(BackendHandler):
+
+    async def get(self):
+        storage_message_id = self.argument("storageMessageId")
+
+        if storage_message_id is not None:
+            self.respond(self.backend.messages.get(storage_message_id))
+            return
+
+        self.respond(self.backend.find_message(
+            recipientId=self.argument("recipientId"),
+            recipientChatMessageId=self.argument("recipientChatMessageId"),
+        ))
+
+    async def post(self):
+        self.respond(self.backend.create_message(loads(self.request.body)))
+
+
+class MessagesBulkHandler(BackendHandler):
+
+    async def post(self):
+        data = loads(self.request.body)
+
+        created = 0
+        for message in data:
+            # Idempotent on the storage Message ID, like the backend.
+            if message["storageMessageId"] in self.backend.messages:
+                continue
+
+            self.backend.create_message(message)
+            created += 1
+
+        self.respond({"created": created, "skipped": len(data) - created})
+
+
+class DeliveryHandler(BackendHandler):
+
+    async def get(self):
+        sender = self.backend.users.get(self.argument("senderId"))
+        link = self.argument("link")
+        replied_message_id = self.argument("repliedMessageId")
+
+        if sender is None:
+            self.respond(None)
+            return
+
+        receiver = None
+        original_message = None
+
+        if link is not None:
+            receiver = self.backend.users_by_link.get(str(link))
+        elif replied_message_id is not None:
+            original_message = self.backend.find_message(
+                recipientId=sender["telegramId"],
+                recipientChatMessageId=replied_message_id,
+            )
+            if original_message is not None:
+                receiver = self.backend.users.get(original_message["authorId"])
+
+        self.respond({"sender": sender, "receiver": receiver, "originalMessage": original_message})
+
+
+class InboxHandler(BackendHandler):
+
+    async def get(self, recipient_id: str):
+        before = self.argument("before")
+        after = self.argument("after")
+        limit = min(max(self.argument("limit") or 10, 1), 50)
+
+        messages = sorted(
+            (message for message in self.backend.messages.values() if message["recipientId"] == int(recipient_id)),
+            key=lambda message: message["id"],
+            reverse=True,
+        )
+
+        if after is not None:
+            page = [message for message in messages if message["id"] > after][-limit - 1:]
+            has_more = len(page) > limit
+            page = page[1:] if has_more else page
+        else:
+            page = [message for message in messages if before is None or message["id"] < before][:limit + 1]
+            has_more = len(page) > limit
+            page = page[:limit]
+
+        self.respond({
+            "messages": [
+                {"id": message["id"], "body": message["body"], "authoredOn": message["authoredOn"]}
+                for message in page
+            ],
+            "hasOlder": after is not None or has_more,
+            "hasNewer": has_more if after is not None else before is not None,
+        })
+
+
+class StatsHandler(BackendHandler):
+
+    async def get(self):
+        self.respond({"users": len(self.backend.users), "messages": len(self.backend.messages)})
@@ -0,0 +1,204 @@
+"""
+Local stand-in of the Telegram Bot API server.
+
+Answers the methods the bot uses with synthetic objects after the configured
+latency and records every send, so the load generator can wait for the
+delivery of each update.
+"""
+
+import asyncio
+from collections import Counter
+from itertools import count
+from json import dumps, loads
+from time import monotonic, time
+from typing import Callable
+
+from tornado.web import Application, RequestHandler
+
+# 1x1 transparent PNG served as every avatar.
+AVATAR = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class SentMessage(object):
+    """ Send recorded by the stand-in. """
+
+    __slots__ = ("method", "chat_id", "message_id", "params", "sent_at")
+
+    def __init__(self, method: str, chat_id: int, message_id: int, params: dict):
+        self.method = method
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.params = params
+        self.sent_at = monotonic()
+
+
+class FakeBotApi(object):
+
+    def __init__(self, latency: float = 0.0, bot_id: int = 1, bot_username: str = "bench_bot"):
+        self.latency = latency
+        self.bot_id = bot_id
+        self.bot_username = bot_username
+
+        self.calls = Counter()
+        self._message_ids: dict[int, count] = {}
+        self._file_ids = count(1)
+        self._waiters: list[tuple[Callable[[SentMessage], bool], asyncio.Future]] = []
+
+    def application(self) -> Application:
+        return Application([
+            (r"/bot[^/]+/(\w+)", BotApiHandler, {"api": self}),
+            (r"/file/bot[^/]+/(.+)", FileHandler, {"api": self}),
+        ])
+
+    def wait_for(self, predicate: Callable[[SentMessage], bool]) -> asyncio.Future:
+        """ Future resolved with the first send matching the predicate. """
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((predicate, future))
+
+        return future
+
+    async def call(self, method: str, params: dict):
+        self.calls[method] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        handler = getattr(self, f"method_{method}", None)
+        if handler is None:
+            return True
+
+        return handler(params)
+
+    def method_getMe(self, params: dict) -> dict:
+        return {
+            "id": self.bot_id,
+            "is_bot": True,
+            "first_name": "Bench",
+            "username": self.bot_username,
+            "can_join_groups": False,
+            "can_read_all_group_messages": False,
+            "supports_inline_queries": False,
+        }
+
+    def method_getChat(self, params: dict) -> dict:
+        chat_id = int(params["chat_id"])
+
+        if chat_id < 0:
+            return {"id": chat_id, "type": "channel", "title": f"Channel {chat_id}", "accent_color_id": 0, "max_reaction_count": 11}
+
+        return {
+            "id": chat_id,
+            "type": "private",
+            "first_name": f"User {chat_id}",
+            "username": f"user{chat_id}",
+            "accent_color_id": 0,
+            "max_reaction_count": 11,
+            "photo": {
+                "small_file_id": f"small-{chat_id}",
+                "small_file_unique_id": f"small-unique-{chat_id}",
+                "big_file_id": f"big-{chat_id}",
+                "big_file_unique_id": f"big-unique-{chat_id}",
+            },
+        }
+
+    def method_getFile(self, params: dict) -> dict:
+        return {
+            "file_id": params["file_id"],
+            "file_unique_id": f"unique-{params['file_id']}",
+            "file_size": len(AVATAR),
+            "file_path": f"photos/{params['file_id']}.png",
+        }
+
+    def method_sendMessage(self, params: dict) -> dict:
+        sent = self._record("sendMessage", params)
+
+        return self._message(sent, text=params.get("text", ""))
+
+    def method_copyMessage(self, params: dict) -> dict:
+        sent = self._record("copyMessage", params)
+
+        return {"message_id": sent.message_id}
+
+    def method_copyMessages(self, params: dict) -> list:
+        return [
+            {"message_id": self._record("copyMessages", params).message_id}
+            for _ in loads(params["message_ids"])
+        ]
+
+    def method_sendMediaGroup(self, params: dict) -> list:
+        return [
+            self._message(
+                self._record("sendMediaGroup", params),
+                photo=[{
+                    "file_id": f"photo-{next(self._file_ids)}",
+                    "file_unique_id": f"photo-unique-{media.get('media')}",
+                    "width": 160,
+                    "height": 160,
+                }],
+            )
+            for media in loads(params["media"])
+        ]
+
+    def _record(self, method: str, params: dict) -> SentMessage:
+        chat_id = int(params["chat_id"])
+        message_ids = self._message_ids.setdefault(chat_id, count(1))
+
+        sent = SentMessage(method, chat_id, next(message_ids), params)
+
+        for waiter in list(self._waiters):
+            predicate, future = waiter
+
+            if future.done():
+                self._waiters.remove(waiter)
+            elif predicate(sent):
+                self._waiters.remove(waiter)
+                future.set_result(sent)
+
+        return sent
+
+    @staticmethod
+    def _message(sent: SentMessage, **fields) -> dict:
+        return {
+            "message_id": sent.message_id,
+            "date": int(time()),
+            "chat": {"id": sent.chat_id, "type": "private" if sent.chat_id > 0 else "channel"},
+            **fields,
+        }
+
+
+class BotApiHandler(RequestHandler):
+
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    async def post(self, method: str):
+        if self.request.headers.get("Content-Type", "").startswith("application/json"):
+            params = loads(self.request.body or b"{}")
+        else:
+            params = {key: values[0].decode() for key, values in self.request.body_arguments.items()}
+
+        result = await self.api.call(method, params)
+
+        self.set_header("Content-Type", "application/json")
+        self.write(dumps({"ok": True, "result": result}))
+
+    get = post
+
+
+class FileHandler(RequestHandler):
+
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    async def get(self, path: str):
+        self.api.calls["downloadFile"] += 1
+
+        if self.api.latency:
+            await asyncio.sleep(self.api.latency)
+
+        self.set_header("Content-Type", "image/png")
+        self.write(AVATAR)
@@ -0,0 +1,300 @@
+"""
+Load test of the bot against the local stand-ins of Telegram and the backend.
+
+Starts the stand-in Bot API server and backend, runs the bot in the webhook
+mode against them and replays synthetic traffic: every author opens the
+session by "/start <link>" and sends the anonymous message, the receiver
+replies to it, and the receivers with the "Special" role "/reveal" it.
+Reports the throughput, the latency from the webhook POST to the delivery
+and the backend calls per update.
+
+Needs a running Redis, as set in settings.json or the REDIS_* env. Run it
+from the project root:
+
+    python -m benchmarks.load_test --authors 50 --messages 10 --telegram-latency 0.05
+
+Sends obey the "send_scheduler" budgets and the "message_limits" from
+settings.json, raise them to measure the handlers alone.
+"""
+
+import asyncio
+import os
+import random
+import subprocess
+import sys
+from argparse import ArgumentParser, Namespace
+from json import loads
+from statistics import quantiles
+from time import monotonic
+
+import httpx
+
+from benchmarks.fake_backend import FakeBackend
+from benchmarks.fake_bot_api import FakeBotApi, SentMessage
+from src.const import ROOT_DIR
+from src.helpers.reply_templates import load_reply_templates
+from src.helpers.user_roles import UserRoles
+from src.utilities.settings import load_settings
+from tools.post_updates import message_update
+
+BOT_TOKEN = "123:bench"
+STORAGE_CHANNEL_ID = -1001
+ERROR_CHANNEL_ID = -1002
+SECRET_TOKEN = "bench"
+
+
+class LoadTest(object):
+
+    def __init__(self, arguments: Namespace):
+        self.arguments = arguments
+        self.replies = load_reply_templates()
+        self.webhook = load_settings().TELEGRAM["webhook"]
+
+        self.bot_api = FakeBotApi(latency=arguments.telegram_latency)
+        self.backend = FakeBackend(latency=arguments.backend_latency)
+
+        # IDs unique to the run, so the keys left in Redis by the previous runs never match.
+        self.first_user_id = random.randrange(10 ** 9, 2 * 10 ** 9, 10 ** 6)
+
+        self.updates = 0
+        self.latencies: dict[str, list[float]] = {"start": [], "message": [], "reply": [], "reveal": []}
+        self.failures = 0
+
+    async def run(self):
+        self.bot_api.application().listen(self.arguments.bot_api_port, address="127.0.0.1")
+        self.backend.application().listen(self.arguments.backend_port, address="127.0.0.1")
+
+        receivers = [
+            self.backend.create_user(
+                self.first_user_id + number,
+                link=f"bench_{self.first_user_id + number}",
+                roles=UserRoles.User | UserRoles.Special if number < self.arguments.special else UserRoles.User,
+            )
+            for number in range(self.arguments.receivers)
+        ]
+
+        process = self.start_bot()
+
+        try:
+            await self.wait_for_bot(process)
+
+            headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET_TOKEN}
+            limits = httpx.Limits(max_connections=self.arguments.connections)
+
+            async with httpx.AsyncClient(headers=headers, limits=limits, timeout=self.arguments.timeout) as client:
+                started_at = monotonic()
+
+                await asyncio.gather(*(
+                    self.author_traffic(
+                        client,
+                        self.first_user_id + self.arguments.receivers + number,
+                        receivers[number % len(receivers)],
+                    )
+                    for number in range(self.arguments.authors)
+                ))
+
+                elapsed = monotonic() - started_at
+
+            # Count the calls of the write-behind outbox too.
+            await self.wait_for_outbox()
+        finally:
+            await self.stop_bot(process)
+
+        self.report(elapsed)
+
+    def start_bot(self) -> subprocess.Popen:
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN=BOT_TOKEN,
+            TELEGRAM_STORAGE_CHANNEL_ID=str(STORAGE_CHANNEL_ID),
+            TELEGRAM_ERROR_NOTIFICATIONS_CHANNEL_ID=str(ERROR_CHANNEL_ID),
+            TELEGRAM_MODE="webhook",
+            TELEGRAM_WEBHOOK_URL=self.webhook_url,
+            TELEGRAM_WEBHOOK_SECRET_TOKEN=SECRET_TOKEN,
+            TELEGRAM_BASE_URL=f"http://127.0.0.1:{self.arguments.bot_api_port}/bot",
+            TELEGRAM_BASE_FILE_URL=f"http://127.0.0.1:{self.arguments.bot_api_port}/file/bot",
+            API_BASE_URL=f"http://127.0.0.1:{self.arguments.backend_port}",
+        )
+
+        return subprocess.Popen([sys.executable, "main.py"], cwd=ROOT_DIR, env=env)
+
+    async def stop_bot(self, process: subprocess.Popen):
+        """ Stop the bot, still serving the sends of the updates it finishes on shutdown. """
+
+        process.terminate()
+
+        while process.poll() is None:
+            await asyncio.sleep(0.1)
+
+    @property
+    def webhook_url(self) -> str:
+        return f"http://127.0.0.1:{self.webhook['port']}/{self.webhook['url_path']}"
+
+    async def wait_for_bot(self, process: subprocess.Popen):
+        """ Wait until the bot sets the webhook, it's listening by then. """
+
+        deadline = monotonic() + self.arguments.timeout
+
+        while self.bot_api.calls["setWebhook"] == 0:
+            if process.poll() is not None:
+                raise RuntimeError(f"The bot exited with the code {process.returncode}.")
+            if monotonic() > deadline:
+                raise RuntimeError("The bot didn't start in time.")
+
+            await asyncio.sleep(0.1)
+
+    async def wait_for_outbox(self):
+        deadline = monotonic() + self.arguments.timeout
+        delivered = len(self.latencies["message"]) + len(self.latencies["reply"])
+
+        while len(self.backend.messages) < delivered and monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+    async def author_traffic(self, client: httpx.AsyncClient, author_id: int, receiver: dict):
+        """ Messages of one author and the answers of the receiver, each waits for the previous one. """
+
+        receiver_id = receiver["telegramId"]
+        is_special = UserRoles.Special in UserRoles(receiver["roles"])
+
+        for number in range(self.arguments.messages):
+            await self.send(
+                client,
+                "start",
+                message_update(author_id, f"/start {receiver['link']}"),
+                lambda sent: sent.chat_id == author_id
+                and sent.params.get("text") == self.replies.COMMAND_START["ANONYMOUS_MESSAGE"],
+            )
+
+            update = message_update(author_id, f"Anonymous message #{number}")
+            delivery = self.wait_for_copy(receiver_id, author_id, update["message"]["message_id"])
+            # Cards revealing the author to the "Special" receiver.
+            cards = [self.bot_api.wait_for(lambda sent: sent.chat_id == receiver_id and self.is_card(sent, author_id))] \
+                if is_special else []
+
+            delivered = await self.send(client, "message", update, delivery, cards)
+            if delivered is None:
+                continue
+
+            if random.random() < self.arguments.replies:
+                update = message_update(receiver_id, f"Reply #{number}")
+                update["message"]["reply_to_message"] = {
+                    "message_id": delivered.message_id,
+                    "date": update["message"]["date"],
+                    "chat": update["message"]["chat"],
+                }
+
+                await self.send(
+                    client,
+                    "reply",
+                    update,
+                    self.wait_for_copy(author_id, receiver_id, update["message"]["message_id"]),
+                )
+
+            if is_special:
+                update = message_update(receiver_id, "/reveal")
+                update["message"]["reply_to_message"] = {
+                    "message_id": delivered.message_id,
+                    "date": update["message"]["date"],
+                    "chat": update["message"]["chat"],
+                }
+
+                await self.send(
+                    client,
+                    "reveal",
+                    update,
+                    lambda sent: sent.chat_id == receiver_id and self.is_card(sent, author_id),
+                )
+
+    def wait_for_copy(self, chat_id: int, from_chat_id: int, message_id: int) -> asyncio.Future:
+        return self.bot_api.wait_for(
+            lambda sent: sent.method == "copyMessage"
+            and sent.chat_id == chat_id
+            and int(sent.params["from_chat_id"]) == from_chat_id
+            and int(sent.params["message_id"]) == message_id
+        )
+
+    @staticmethod
+    def is_card(sent: SentMessage, author_id: int) -> bool:
+        """ Whether the send is the card revealing the author. """
+
+        if sent.method == "sendMediaGroup":
+            text = loads(sent.params["media"])[0].get("caption", "")
+        elif sent.method == "sendMessage":
+            text = sent.params.get("text", "")
+        else:
+            return False
+
+        return f"ID: `{author_id}`" in text
+
+    async def send(
+            self,
+            client: httpx.AsyncClient,
+            kind: str,
+            update: dict,
+            expected,
+            additional: list[asyncio.Future] = (),
+    ) -> SentMessage | None:
+        """ POST the update and wait for the expected send, return it or None on failure. """
+
+        if not isinstance(expected, asyncio.Future):
+            expected = self.bot_api.wait_for(expected)
+
+        started_at = monotonic()
+        self.updates += 1
+
+        try:
+            response = await client.post(self.webhook_url, json=update)
+            response.raise_for_status()
+
+            sent, *_ = await asyncio.wait_for(asyncio.gather(expected, *additional), self.arguments.timeout)
+        except (httpx.HTTPError, asyncio.TimeoutError):
+            self.failures += 1
+            return None
+
+        self.latencies[kind].append(sent.sent_at - started_at)
+
+        return sent
+
+    def report(self, elapsed: float):
+        delivered = len(self.latencies["message"]) + len(self.latencies["reply"])
+
+        print(f"Updates: {self.updates}, failed: {self.failures}, elapsed: {elapsed:.2f}s")
+        print(f"Delivered messages: {delivered}, {delivered / elapsed:.1f} messages/s")
+        print(f"Backend calls per update: {self.backend.total_calls / max(self.updates, 1):.2f} {dict(self.backend.calls)}")
+        print(f"Bot API calls: {dict(self.bot_api.calls)}")
+
+        for kind, latencies in self.latencies.items():
+            if len(latencies) < 2:
+                continue
+
+            percentiles = quantiles(latencies, n=100)
+
+            print("{kind:>8}: p50 {p50:.1f}ms, p95 {p95:.1f}ms, p99 {p99:.1f}ms ({count})".format(
+                kind=kind,
+                p50=percentiles[49] * 1000,
+                p95=percentiles[94] * 1000,
+                p99=percentiles[98] * 1000,
+                count=len(latencies),
+            ))
+
+
+def main():
+    parser = ArgumentParser(description="Load test of the bot against the local stand-ins.")
+    parser.add_argument("--authors", type=int, default=20, help="Authors sending concurrently.")
+    parser.add_argument("--receivers", type=int, default=10)
+    parser.add_argument("--special", type=int, default=1, help="Receivers with the \"Special\" role.")
+    parser.add_argument("--messages", type=int, default=5, help="Anonymous messages per author.")
+    parser.add_argument("--replies", type=float, default=0.5, help="Share of the messages replied to.")
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--backend-latency", type=float, default=0.0)
+    parser.add_argument("--bot-api-port", type=int, default=8081)
+    parser.add_argument("--backend-port", type=int, default=8082)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    arguments = parser.parse_args()
+
+    asyncio.run(LoadTest(arguments).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,82 @@
+import asyncio
 import logging
+import math
+import os
 import re
+import signal
+from datetime import datetime, timezone
 from typing import BinaryIO
 
-import requests
-
 from re import match
-from redis import Redis
-from telegram import Update, User, InputMediaPhoto
+from telegram import (
+    Update,
+    User,
+    InputMedia,
+    InputMediaAudio,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo,
+    Message,
+    MessageId,
+    ChatPhoto,
+)
 from telegram.constants import ParseMode
-from telegram.error import BadRequest
+from telegram.error import BadRequest, TelegramError
 from telegram.helpers import escape_markdown
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
-    CallbackContext,
+    ContextTypes,
     filters,
 )
 
-from src.const import API_BASE_URL, USER_LINK_REGEX, USER_WELCOME_REGEX
+from src.const import API_BASE_URL, INBOX_BODY_LENGTH, USER_LINK_REGEX, USER_WELCOME_REGEX
+from src.runner import application_builder, run_application
+from src.context import UpdateContext
+from src.update_processor import UserOrderedUpdateProcessor
 from src.decorators.auth import auth
 from src.decorators.admin import admin
+from src.decorators.timed import timed
 from src.markup import Markup
+from src.models import MessageModel, UserModel
+from src.metrics import start_metrics_server
 from src.helpers.reply_templates import load_reply_templates
-from src.helpers.user_roles import UserRoles
+from src.services.admission import AdmissionControl, UpdatePriority
+from src.services.albums import AlbumCollector
+from src.services.backend import BackendClient
+from src.services.ban_list import BanList
+from src.services.broadcasts import Broadcaster
+from src.services.chat_cache import ChatCache
+from src.services.deliveries import Delivery, DeliveryResolver
+from src.services.error_reports import ErrorAggregator
+from src.services.inbox import Inbox
+from src.services.message_index import MessageIndex
+from src.services.message_limits import LimitCheck, MessageLimits
+from src.services.message_outbox import MessageOutbox
+from src.services.redis_client import create_redis, check_redis
+from src.services.send_scheduler import SendScheduler, Priority
+from src.services.sessions import SessionStore
+from src.services.stats import StatsCounters
+from src.services.storage_archive import StorageArchive
+from src.services.update_stream import UpdateStream
+from src.services.messages import MessageRepository
+from src.services.user_cache import UserCache
+from src.tracing import Tracer, span
+from src.services.users import UserRepository
 from src.utilities.env import load_env
+from src.utilities.settings import load_settings
 
 
 class TelegramBot:
 
-    def __init__(self):
+    def __init__(self, shard: int = None):
+        """
+        Without the shard the bot receives the updates itself, with the shard it
+        runs as the worker handling the updates of the shard from the update stream.
+        """
+
         # Set up logger.
         logging.basicConfig(
             format='[%(asctime)s] %(message)s',
@@ -37,17 +84,86 @@ class TelegramBot:
         )
         self.logger = logging.getLogger('bot')
 
-        self.redis = Redis(decode_responses=True)
-        self.redis.ping()
-
         self.env = load_env()
+        self.settings = load_settings()
         self.replies = load_reply_templates()
 
+        self.redis = create_redis(self.settings.REDIS, self.env)
+        self.sessions = SessionStore(self.redis, **self.settings.SESSIONS)
+        self.message_limits = MessageLimits(self.redis, **self.settings.MESSAGE_LIMITS)
+
+        self.backend = BackendClient(base_url=self.env.API_BASE_URL or API_BASE_URL, **self.settings.BACKEND)
+        self.user_cache = UserCache(self.redis, **self.settings.USER_CACHE)
+        self.ban_list = BanList(self.redis, self.backend, self.user_cache, **self.settings.BAN_LIST)
+        self.users = UserRepository(self.backend, self.user_cache, self.ban_list)
+        self.message_index = MessageIndex(self.redis, **self.settings.MESSAGE_INDEX)
+        self.message_outbox = MessageOutbox(self.redis, self.backend, **self.settings.MESSAGE_OUTBOX)
+        self.updates = UpdateStream(self.redis, **self.settings.UPDATE_STREAM)
+        self.shard = shard
+
+        if shard is not None and not 0 <= shard < self.updates.shards:
+            raise ValueError(f"Shard must be from 0 to {self.updates.shards - 1}.")
+
+        self.stats = StatsCounters(self.redis, self.backend, **self.settings.STATS)
+        self.messages = MessageRepository(self.backend, self.message_index, self.message_outbox, self.stats)
+        self.deliveries = DeliveryResolver(self.backend, self.users, self.messages)
+        self.inbox = Inbox(self.redis, self.backend, **self.settings.INBOX)
+        self.chats = ChatCache(**self.settings.CHAT_CACHE)
+        self.storage_archive = StorageArchive(
+            self.redis,
+            self.messages,
+            self.chats,
+            self.env.TELEGRAM_STORAGE_CHANNEL_ID,
+            **self.settings.STORAGE_ARCHIVE,
+        )
+
+        # Every worker consumes the outbox and the storage queue under its own name.
+        if shard is not None:
+            self.message_outbox.consumer = f"{self.message_outbox.consumer}-{shard}"
+            self.storage_archive.consumer = f"{self.storage_archive.consumer}-{shard}"
+        self.broadcasts = Broadcaster(self.redis, self.backend, **self.settings.BROADCAST)
+        self.errors = ErrorAggregator(self.env.TELEGRAM_ERROR_NOTIFICATIONS_CHANNEL_ID, **self.settings.ERROR_REPORTS)
+
+        # All outbound sends go through the scheduler, the channels' traffic goes after the users'.
+        self.send_scheduler = SendScheduler(
+            chat_priorities={
+                self.env.TELEGRAM_STORAGE_CHANNEL_ID: Priority.STORAGE,
+                self.env.TELEGRAM_ERROR_NOTIFICATIONS_CHANNEL_ID: Priority.ERROR,
+            },
+            **self.settings.SEND_SCHEDULER,
+        )
+
         # self.input_handler = InputHandler(self.logger, self.database_handler)
 
-        self.markup = Markup()
+        self.markup = Markup(self.replies)
+
+        self.tracer = Tracer(**self.settings.TRACING)
+        self.albums = AlbumCollector(**self.settings.ALBUMS)
+        self.admission = AdmissionControl(**self.settings.ADMISSION)
+
+        # Every worker writes the slow updates to its own file.
+        if shard is not None:
+            path, extension = os.path.splitext(self.tracer.path)
+            self.tracer.path = f"{path}-{shard}{extension}"
+
+        builder = application_builder(self.env, self.settings) \
+            .context_types(ContextTypes(context=UpdateContext)) \
+            .rate_limiter(self.send_scheduler) \
+            .concurrent_updates(UserOrderedUpdateProcessor(
+                self.settings.TELEGRAM["concurrent_updates"],
+                self.tracer,
+                self.albums,
+                self.admission,
+            )) \
+            .post_init(self.post_init) \
+            .post_stop(self.post_stop) \
+            .post_shutdown(self.post_shutdown)
+
+        # Workers get the updates from the update stream.
+        if shard is not None:
+            builder.updater(None)
 
-        self.bot = Application.builder().token(self.env.TELEGRAM_BOT_TOKEN).build()
+        self.bot = builder.build()
 
         # Register command handlers.
         self.bot.add_handler(CommandHandler('start', self.start_command))
@@ -56,40 +172,42 @@ class TelegramBot:
         self.bot.add_handler(CommandHandler('link', self.link_command))
         self.bot.add_handler(CommandHandler('welcome', self.welcome_command))
         self.bot.add_handler(CommandHandler('delete', self.delete_command))
-        # self.bot.add_handler(CommandHandler('stats', self.stats_command))
+        self.bot.add_handler(CommandHandler('stats', self.stats_command))
+        self.bot.add_handler(CommandHandler('inbox', self.inbox_command))
         # self.bot.add_handler(CommandHandler('help', self.help_command))
         self.bot.add_handler(CommandHandler('reveal', self.reveal_command))
+        self.bot.add_handler(CommandHandler('broadcast', self.broadcast_command))
+
+        # Register callback query handlers.
+        self.bot.add_handler(CallbackQueryHandler(self.inbox_callback, pattern=r"^inbox:(before|after):\d+$"))
 
         # Register message handler.
         self.bot.add_handler(MessageHandler(filters.ALL, self.handle_message))
 
+        # Deliveries go first under load, the profile edits are shed first.
+        self.admission.classify_by(self.bot.handlers[0], {
+            self.handle_message: self.message_priority,
+            self.link_command: UpdatePriority.PROFILE,
+            self.welcome_command: UpdatePriority.PROFILE,
+            self.delete_command: UpdatePriority.PROFILE,
+        })
+
         self.logger.info('Initialized the Telegram bot.')
 
+    @timed
     @auth
-    async def start_command(self, update: Update, context: CallbackContext):
+    async def start_command(self, update: Update, context: UpdateContext):
         """ Start command. """
 
         receiver_link = None
-
-        author = requests.get(f"{API_BASE_URL}/api/user", params={
-            "telegramId": update.message.from_user.id,
-        })
-
-        if author.status_code != 200:
-            return await self.handle_error(
-                update,
-                context,
-                f"FATAL: GET /api/user [tid: {update.message.from_user.id}] ({author.status_code}) - User not registered?"
-            )
+        author = context.user
 
         if len(context.args) != 0:
             receiver_link = context.args[0]
 
-        author = author.json()
-
         # Send the usual "start" command message if no receiver link is present.
         if receiver_link is None:
-            if author["link"] is None:
+            if author.link is None:
                 return await update.message.reply_text(
                     text=self.replies.COMMAND_START["NO_LINK"],
                     parse_mode=ParseMode.MARKDOWN,
@@ -98,57 +216,53 @@ class TelegramBot:
             return await update.message.reply_text(
                 text=self.replies.COMMAND_START["DEFAULT"].format(
                     bot_username=escape_markdown(update.get_bot().username),
-                    user_link=escape_markdown(author["link"]),
+                    user_link=escape_markdown(author.link),
                 ),
                 parse_mode=ParseMode.MARKDOWN,
             )
 
-        receiver = requests.get(f"{API_BASE_URL}/api/user", params={
-            "link": receiver_link,
-        })
+        limit = await self.message_limits.take_session(update.message.from_user.id, receiver_link)
+        if not limit.allowed:
+            return await self.reply_rate_limited(update, limit)
+
+        receiver = await self.users.get_by_link(receiver_link)
 
         if receiver.status_code != 200:
             return await update.message.reply_text("Похоже получатель изменил или удалил ссылку...")
 
-        receiver = receiver.json()
+        receiver = receiver.data
 
-        session = self.redis.set(
-            f"session:{update.message.from_user.id}:message",
-            receiver_link,
-            1800,
-        )
+        await self.sessions.open(update.message.from_user.id, receiver_link)
 
         await update.message.reply_text(
             text=self.replies.COMMAND_START["ANONYMOUS_MESSAGE"],
             parse_mode=ParseMode.MARKDOWN,
         )
 
-        if receiver["welcomeMessage"]:
+        if receiver.welcome_message:
             await update.message.reply_text(
-                text=receiver["welcomeMessage"],
+                text=receiver.welcome_message,
                 parse_mode=ParseMode.MARKDOWN,
             )
 
     # @TODO Implement this.
     # @auth
-    # async def donate_command(self, update: Update, context: CallbackContext):
+    # async def donate_command(self, update: Update, context: UpdateContext):
     #     """ Donate command. """
     #
     #     await update.message.reply_text(text=self.replies.COMMAND_DONATE, parse_mode=ParseMode.MARKDOWN)
 
+    @timed
     @auth
-    async def link_command(self, update: Update, context: CallbackContext):
+    async def link_command(self, update: Update, context: UpdateContext):
         """ Command to change the User's link. """
 
         link = "".join(context.args)
 
         if link == "":
-            user = requests.get(f"{API_BASE_URL}/api/user", params={
-                "telegramId": update.message.from_user.id,
-            })
-            user = user.json()
+            user = context.user
 
-            if user["link"] is None:
+            if user.link is None:
                 return await update.message.reply_text(
                     text=self.replies.COMMAND_LINK["NO_LINK"],
                     parse_mode=ParseMode.MARKDOWN,
@@ -157,7 +271,7 @@ class TelegramBot:
             return await update.message.reply_text(
                 text=self.replies.COMMAND_LINK["DEFAULT"].format(
                     bot_username=update.get_bot().username,
-                    link=user["link"],
+                    link=user.link,
                 ),
                 parse_mode=ParseMode.MARKDOWN,
             )
@@ -168,27 +282,26 @@ class TelegramBot:
                 parse_mode=ParseMode.MARKDOWN,
             )
 
-        _request = requests.patch(f"{API_BASE_URL}/api/user/{update.message.from_user.id}", json={
-            "link": link,
-        })
+        _request = await self.users.patch(context.user, link=link)
         if _request.status_code == 409:
             return await update.message.reply_text(
                 text=self.replies.COMMAND_LINK["ALREADY_EXIST"],
                 parse_mode=ParseMode.MARKDOWN,
             )
         elif _request.status_code == 200:
-            user = _request.json()
+            user = _request.data
 
             await update.message.reply_text(
                 text=self.replies.COMMAND_LINK["SUCCESS"].format(
                     bot_username=update.get_bot().username,
-                    link=user["link"],
+                    link=user.link,
                 ),
                 parse_mode=ParseMode.MARKDOWN,
             )
 
+    @timed
     @auth
-    async def welcome_command(self, update: Update, context: CallbackContext):
+    async def welcome_command(self, update: Update, context: UpdateContext):
         """ Command to change the User's welcome message. """
 
         welcome = " ".join(context.args)
@@ -205,9 +318,7 @@ class TelegramBot:
                 parse_mode=ParseMode.MARKDOWN,
             )
 
-        _request = requests.patch(f"{API_BASE_URL}/api/user/{update.message.from_user.id}", json={
-            "welcomeMessage": welcome,
-        })
+        _request = await self.users.patch(context.user, welcome_message=welcome)
 
         if _request.status_code != 200:
             return await update.message.reply_text(
@@ -215,7 +326,7 @@ class TelegramBot:
                 parse_mode=ParseMode.MARKDOWN,
             )
 
-        user = _request.json()
+        user = _request.data
 
         if welcome != "clear":
             await update.message.reply_text(
@@ -224,7 +335,7 @@ class TelegramBot:
             )
 
             await update.message.reply_text(
-                text=user["welcomeMessage"],
+                text=user.welcome_message,
                 parse_mode=ParseMode.MARKDOWN,
             )
         else:
@@ -233,33 +344,106 @@ class TelegramBot:
                 parse_mode=ParseMode.MARKDOWN,
             )
 
+    @timed
     @auth
-    async def delete_command(self, update: Update, context: CallbackContext):
+    async def delete_command(self, update: Update, context: UpdateContext):
         """ Command to delete User's link. """
 
-        user = requests.get(f"{API_BASE_URL}/api/user", params={
-            "telegramId": update.message.from_user.id,
-        })
-        user = user.json()
+        user = context.user
 
-        if user["link"] is None:
+        if user.link is None:
             return await update.message.reply_text(
                 text=self.replies.COMMAND_DELETE["ALREADY_DELETED"],
                 parse_mode=ParseMode.MARKDOWN,
             )
 
-        requests.patch(f"{API_BASE_URL}/api/user/{update.message.from_user.id}", json={
-            "link": "del",
-        })
+        await self.users.patch(user, link="del")
 
         await update.message.reply_text(
             text=self.replies.COMMAND_DELETE["SUCCESS"],
             parse_mode=ParseMode.MARKDOWN,
         )
 
+    @timed
+    @auth
+    async def stats_command(self, update: Update, context: UpdateContext):
+        """ Command to show the User's stats, the "Special" Users get the global stats too. """
+
+        user_stats = await self.stats.get_user(update.message.from_user.id)
+        text = self.replies.COMMAND_STATS["DEFAULT"].format(**user_stats)
+
+        if context.user.is_special:
+            totals = await self.stats.get_totals()
+            text += "\n\n" + self.replies.COMMAND_STATS["GLOBAL"].format(days=self.stats.active_days, **totals)
+
+        await update.message.reply_text(
+            text=text,
+            parse_mode=ParseMode.MARKDOWN,
+        )
+
+    @timed
+    @auth
+    async def inbox_command(self, update: Update, context: UpdateContext):
+        """ Command to browse the received anonymous messages, starting from the latest ones. """
+
+        page = await self.inbox.get_page(update.message.from_user.id)
+
+        if not page.ok:
+            return await self.handle_error(update, context, "GET /api/message/inbox/{recipientId}", page.status_code)
+
+        await update.message.reply_text(
+            text=self.inbox_text(page.data),
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=self.markup.inbox(page.data),
+        )
+
+    @timed
+    @auth
+    async def inbox_callback(self, update: Update, context: UpdateContext):
+        """ Show the newer or the older page of the inbox in place of the current one. """
+
+        query = update.callback_query
+        _, direction, message_id = query.data.split(":")
+
+        page = await self.inbox.get_page(update.effective_user.id, **{direction: int(message_id)})
+
+        if not page.ok:
+            self.errors.report(
+                "BackendError",
+                "GET /api/message/inbox/{recipientId}",
+                page.status_code,
+                update,
+                f"{direction}: {message_id}",
+            )
+
+            return await query.answer(self.replies.ERROR)
+
+        await query.answer()
+        await query.edit_message_text(
+            text=self.inbox_text(page.data),
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=self.markup.inbox(page.data),
+        )
+
+    def inbox_text(self, page: dict) -> str:
+        if len(page["messages"]) == 0:
+            return self.replies.COMMAND_INBOX["EMPTY"]
+
+        messages = []
+        for message in page["messages"]:
+            body = message["body"]
+
+            messages.append(self.replies.COMMAND_INBOX["MESSAGE"].format(
+                date=datetime.fromtimestamp(message["authoredOn"], timezone.utc).strftime("%d.%m.%Y %H:%M"),
+                body=escape_markdown(body[:INBOX_BODY_LENGTH]) if body else self.replies.COMMAND_INBOX["NO_TEXT"],
+            ))
+
+        return self.replies.COMMAND_INBOX["DEFAULT"].format(messages="\n\n".join(messages))
+
+    @timed
     @auth
     @admin
-    async def reveal_command(self, update: Update, context: CallbackContext):
+    async def reveal_command(self, update: Update, context: UpdateContext):
         reply_message = update.message.reply_to_message
 
         if reply_message is None:
@@ -267,18 +451,86 @@ class TelegramBot:
                 "Перешлите нужное анонимное сообщение и одновременно используйте эту команду."
             )
 
-        author = requests.get(f"{API_BASE_URL}/api/user/author/{reply_message.message_id}")
-        author = author.json()
+        message = await self.messages.get_by_recipient_chat(update.message.from_user.id, reply_message.message_id)
+
+        if message.status_code != 200:
+            return await self.handle_error(
+                update,
+                context,
+                "GET /api/message",
+                message.status_code,
+                f"mid: {reply_message.message_id}",
+            )
 
         await self.reveal_author(
             update,
             context,
             recipient_id=update.message.from_user.id,
-            author_id=author["telegramId"],
+            author_id=message.data.author_id,
+        )
+
+    @timed
+    @auth
+    @admin
+    async def broadcast_command(self, update: Update, context: UpdateContext):
+        """ Command to broadcast the replied message to all Users, "status" and "cancel" manage the broadcast. """
+
+        action = "".join(context.args)
+
+        if action == "status":
+            state = await self.broadcasts.status()
+
+            if state is None:
+                return await update.message.reply_text(self.replies.COMMAND_BROADCAST["NOT_FOUND"])
+
+            return await update.message.reply_text(self.broadcast_report(state))
+
+        if action == "cancel":
+            if not await self.broadcasts.cancel():
+                return await update.message.reply_text(self.replies.COMMAND_BROADCAST["NOT_RUNNING"])
+
+            return await update.message.reply_text(self.replies.COMMAND_BROADCAST["CANCELLED"])
+
+        reply_message = update.message.reply_to_message
+
+        if reply_message is None:
+            return await update.message.reply_text(self.replies.COMMAND_BROADCAST["DEFAULT"])
+
+        if not await self.broadcasts.create(update.message.from_user.id, update.message.chat_id, reply_message.message_id):
+            return await update.message.reply_text(self.replies.COMMAND_BROADCAST["ALREADY_RUNNING"])
+
+        await update.message.reply_text(self.replies.COMMAND_BROADCAST["STARTED"])
+
+    def broadcast_report(self, state: dict) -> str:
+        return self.replies.COMMAND_BROADCAST["STATUS"].format(
+            status=self.replies.COMMAND_BROADCAST["STATUSES"][state["status"]],
+            sent=state["sent"],
+            blocked=state["blocked"],
+            deactivated=state["deactivated"],
+            failed=state["failed"],
         )
 
+    async def report_broadcast(self, state: dict):
+        """ Report the finished broadcast to the admin who started it. """
+
+        try:
+            await self.bot.bot.send_message(chat_id=int(state["admin_id"]), text=self.broadcast_report(state))
+        except TelegramError as error:
+            self.logger.warning('Failed to report the broadcast: %s', error)
+
+    @staticmethod
+    def message_priority(update: Update) -> UpdatePriority:
+        """ Priority of the message by its content alone, before any I/O. """
+
+        # Edited messages and service messages have nothing to deliver.
+        if update.message is None or (update.message.text is None and update.message.effective_attachment is None):
+            return UpdatePriority.NOOP
+
+        return UpdatePriority.DELIVERY
+
+    @timed
     @auth
-    async def handle_message(self, update: Update, context: CallbackContext):
+    async def handle_message(self, update: Update, context: UpdateContext):
         """ Handle user input. """
 
         # @TODO Remove when all possible errors are handled.
@@ -287,160 +539,234 @@ class TelegramBot:
                 return
 
             if update.message.forward_origin and update.message.forward_origin.chat.id == int(self.env.TELEGRAM_STORAGE_CHANNEL_ID):
-                author = requests.get(f"{API_BASE_URL}/api/user/author_from_storage/{update.message.forward_origin.message_id}")
-                author = author.json()
+                message = await self.messages.get_by_storage(update.message.forward_origin.message_id)
+                message = message.data
 
                 await self.reveal_author(
                     update,
                     context,
                     recipient_id=update.message.from_user.id,
-                    author_id=author["telegramId"],
+                    author_id=message.author_id,
                 )
 
                 return
 
-            receiver_link = self.redis.get(f"session:{update.message.from_user.id}:message")
-            reply_message = update.message.reply_to_message
+            # The items of the album arriving after it was delivered follow it to the same receiver.
+            follow_up = self.albums.follow_up(update)
+            if follow_up is not None:
+                with span("album"):
+                    messages = await self.albums.collect(update)
 
-            # If the User has receiver link.
-            if receiver_link is not None:
-                delete = self.redis.delete(f"session:{update.message.from_user.id}:message")
-
-                receiver = requests.get(f"{API_BASE_URL}/api/user", params={
-                    "link": receiver_link,
-                })
-
-                if receiver.status_code == 404:
-                    return await update.message.reply_text("Похоже получатель изменил или удалил ссылку.")
-                elif receiver.status_code != 200:
-                    return await self.handle_error(
-                        update,
-                        context,
-                        f"FATAL: GET /api/user [link: {receiver_link}] ({receiver.status_code})"
-                    )
-
-            # If the User replied to the anonymous message.
-            elif reply_message:
-                # Get Author of the replied message.
-                receiver = requests.get(f"{API_BASE_URL}/api/user/author/{reply_message.message_id}")
-
-                if receiver.status_code != 200:
-                    return await self.handle_error(
-                        update,
-                        context,
-                        f"FATAL: GET /api/user/author/{reply_message.message_id} ({receiver.status_code})"
-                    )
-
-            else:
-                return
+                return await self.send_anonymous_message(update, context, *follow_up, messages, follow_up=True)
 
-            receiver = receiver.json()
+            reply_message = update.message.reply_to_message
 
-            # Send notification about successfully sent anonymous message to the author.
-            await update.message.reply_text(self.replies.EVENT_ANONYMOUS_MESSAGE_SENT)
+            # Consume the session atomically, so it's never used by two messages. The cached receiver
+            # and the replied message are fetched in the same round trip.
+            session = await self.sessions.consume(
+                update.message.from_user.id,
+                reply_message.message_id if reply_message else None,
+            )
+            receiver_link = session.receiver_link
 
-            # Send message to the storage and reveal the message author.
-            message_in_storage = await update.message.copy(self.env.TELEGRAM_STORAGE_CHANNEL_ID)
-            await self.reveal_author(
-                update,
-                context,
-                recipient_id=receiver["telegramId"],
-                author_id=update.message.from_user.id,
-                to_storage=True,
-                storage_message_id=message_in_storage.message_id,
+            # The User has neither the receiver link, nor replied to the anonymous message.
+            if receiver_link is None and reply_message is None:
+                return
+
+            # Resolve the receiver by the link or as the Author of the replied message.
+            delivery = await self.deliveries.resolve(
+                update.message.from_user.id,
+                session,
+                reply_message.message_id if reply_message else None,
             )
 
-            if receiver_link:
-                # Send notification about new anonymous message to the recipient.
-                await update.get_bot().send_message(
-                    chat_id=receiver["telegramId"],
-                    text=self.replies.EVENT_ANONYMOUS_MESSAGE_RECEIVED,
-                    parse_mode=ParseMode.MARKDOWN,
+            if not delivery.ok:
+                return await self.handle_error(
+                    update,
+                    context,
+                    "GET /api/message/delivery",
+                    delivery.status_code,
+                    f"link: {receiver_link}, mid: {reply_message.message_id if reply_message else None}",
                 )
 
-            message_in_recipient_chat = None
-            if receiver_link:
-                # Send anonymous message to the recipient.
-                message_in_recipient_chat = await update.message.copy(receiver["telegramId"])
-            elif reply_message:
-                # Send anonymous message to the author by replied message.
-                original_message = requests.get(f"{API_BASE_URL}/api/message", params={
-                    "recipientId": update.message.from_user.id,
-                    "recipientChatMessageId": reply_message.message_id,
-                })
-                original_message = original_message.json()
-
-                # Catch "Message to be replied not found" error.
-                try:
-                    message_in_recipient_chat = await update.message.copy(
-                        original_message["authorId"],
-                        reply_to_message_id=original_message["authorChatMessageId"],
-                    )
-                except BadRequest:
-                    await update.get_bot().send_message(
-                        chat_id=original_message["authorId"],
-                        text="Вам ответили на *удаленное сообщение*!",
-                    )
-                    message_in_recipient_chat = await update.message.copy(original_message["authorId"])
-
-            # Reveal the message's author to the receiver with the "Special" role.
-            if UserRoles.Special in UserRoles(receiver["roles"]):
-                await self.reveal_author(
+            if receiver_link is not None and delivery.receiver is None:
+                return await update.message.reply_text("Похоже получатель изменил или удалил ссылку.")
+            elif delivery.receiver is None:
+                return await self.handle_error(
                     update,
                     context,
-                    recipient_id=receiver["telegramId"],
-                    author_id=update.message.from_user.id,
+                    "GET /api/message/delivery",
+                    "no receiver",
+                    f"mid: {reply_message.message_id}",
                 )
 
-            # Store all needed data in backend.
-            requests.post(
-                f"{API_BASE_URL}/api/message",
-                json={
-                    "authorChatMessageId": update.message.message_id,
-                    "recipientChatMessageId": message_in_recipient_chat.message_id,
-                    "storageMessageId": message_in_storage.message_id,
-                    "authorId": update.message.from_user.id,
-                    "recipientId": int(receiver["telegramId"]),
-                    "body": update.message.text,
-                }
-            )
-        except Exception:
-            await update.message.copy(self.env.TELEGRAM_ERROR_NOTIFICATIONS_CHANNEL_ID)
+            # Only the messages with the resolved receiver are counted, the album as one.
+            limit = await self.message_limits.take_message(update.message.from_user.id)
+            if not limit.allowed:
+                # The session is kept for the message sent after the limit.
+                if receiver_link is not None:
+                    await self.sessions.open(update.message.from_user.id, receiver_link)
+
+                return await self.reply_rate_limited(update, limit)
+
+            # The whole album is sent as one anonymous message.
+            with span("album"):
+                messages = await self.albums.collect(update)
+
+            await self.send_anonymous_message(update, context, receiver_link, delivery, messages)
+        except Exception as error:
+            # Reported in the digest, the UID and MID locate the message.
+            self.errors.report_exception(error, update)
+
+    async def send_anonymous_message(
+            self,
+            update: Update,
+            context: UpdateContext,
+            receiver_link: str | None,
+            delivery: Delivery,
+            messages: list[Message],
+            follow_up: bool = False,
+    ):
+        """ Deliver the anonymous message or album and queue it to the storage. """
+
+        receiver = delivery.receiver
+        original_message = delivery.original_message
+
+        # The confirmation to the author and the delivery to the recipient don't depend on each other.
+        _, messages_in_recipient_chat = await asyncio.gather(
+            # Send notification about successfully sent anonymous message to the author.
+            update.message.reply_text(self.replies.EVENT_ANONYMOUS_MESSAGE_SENT),
+            self.deliver_message(update, receiver, receiver_link, original_message, messages),
+        )
+
+        # The late items of the album follow it.
+        self.albums.delivered(update, (receiver_link, delivery))
 
-            error = "Something strange happen.\n\nUID: `{uid}`\nMID: `{mid}`".format(
-                uid=update.message.from_user.id,
-                mid=update.message.message_id,
+        # Reveal the message's author to the receiver with the "Special" role, once per album.
+        if receiver.is_special and not follow_up:
+            context.application.create_task(
+                self.reveal_author(
+                    update,
+                    context,
+                    recipient_id=receiver.telegram_id,
+                    author_id=update.message.from_user.id,
+                ),
+                update=update,
             )
 
-            self.logger.error(error)
+        # The copy to the storage and the record in the backend are queued, not waited for: the storage
+        # channel takes 20 posts a minute. The replies resolve by the recipient chat index meanwhile,
+        # every item of the album is replied to on its own.
+        await self.storage_archive.push(messages, [
+            MessageModel(
+                author_chat_message_id=message.message_id,
+                recipient_chat_message_id=message_in_recipient_chat.message_id,
+                storage_message_id=None,
+                author_id=update.message.from_user.id,
+                recipient_id=receiver.telegram_id,
+                body=message.text,
+            )
+            for message, message_in_recipient_chat in zip(messages, messages_in_recipient_chat)
+        ])
 
+    async def deliver_message(
+            self,
+            update: Update,
+            receiver: UserModel,
+            receiver_link: str | None,
+            original_message: MessageModel | None,
+            messages: list[Message],
+    ) -> list[MessageId]:
+        """ Send the anonymous message or album to the recipient chat. """
+
+        if receiver_link:
+            # Send notification about new anonymous message to the recipient.
             await update.get_bot().send_message(
-                chat_id=self.env.TELEGRAM_ERROR_NOTIFICATIONS_CHANNEL_ID,
-                text=error,
+                chat_id=receiver.telegram_id,
+                text=self.replies.EVENT_ANONYMOUS_MESSAGE_RECEIVED,
                 parse_mode=ParseMode.MARKDOWN,
             )
 
+            # Send anonymous message to the recipient.
+            return await self.copy_messages(update, receiver.telegram_id, messages)
+
+        # Send anonymous message to the author by replied message.
+        # Catch "Message to be replied not found" error.
+        try:
+            return await self.reply_messages(update, original_message, messages)
+        except BadRequest:
+            await update.get_bot().send_message(
+                chat_id=original_message.author_id,
+                text="Вам ответили на *удаленное сообщение*!",
+            )
+            return await self.copy_messages(update, original_message.author_id, messages)
+
+    async def reply_messages(
+            self,
+            update: Update,
+            original_message: MessageModel,
+            messages: list[Message],
+    ) -> list[MessageId]:
+        """ Send the message or the album to the author as the reply to the original message. """
+
+        if len(messages) == 1:
+            return [await messages[0].copy(
+                original_message.author_id,
+                reply_to_message_id=original_message.author_chat_message_id,
+            )]
+
+        # The album can't be copied as a reply, it's sent again by the file IDs of its items.
+        return list(await update.get_bot().send_media_group(
+            chat_id=original_message.author_id,
+            media=[self.album_media(message) for message in messages],
+            reply_to_message_id=original_message.author_chat_message_id,
+        ))
+
+    @staticmethod
+    def album_media(message: Message) -> InputMedia:
+        """ Item of the album to send it again, with its caption. """
+
+        caption = {"caption": message.caption, "caption_entities": message.caption_entities}
+
+        if message.photo:
+            return InputMediaPhoto(message.photo[-1].file_id, has_spoiler=message.has_media_spoiler, **caption)
+        if message.video:
+            return InputMediaVideo(message.video.file_id, has_spoiler=message.has_media_spoiler, **caption)
+        if message.audio:
+            return InputMediaAudio(message.audio.file_id, **caption)
+
+        return InputMediaDocument(message.document.file_id, **caption)
+
+    async def copy_messages(self, update: Update, chat_id: int | str, messages: list[Message]) -> list[MessageId]:
+        """ Copy the message, or the whole album in one call, keeping it grouped. """
+
+        if len(messages) == 1:
+            return [await messages[0].copy(chat_id)]
+
+        return list(await update.get_bot().copy_messages(
+            chat_id=chat_id,
+            from_chat_id=update.message.chat_id,
+            message_ids=[message.message_id for message in messages],
+        ))
+
+    async def reply_rate_limited(self, update: Update, limit: LimitCheck):
+        """ Tell the sender when the exceeded limit lets the next message through. """
+
+        return await update.message.reply_text(
+            self.replies.EVENT_RATE_LIMITED[limit.exceeded.upper()].format(seconds=math.ceil(limit.retry_after)),
+        )
+
     async def reveal_author(
             self,
             update: Update,
-            context: CallbackContext,
+            context: UpdateContext,
             recipient_id: int | str,
             author_id: int | str,
-            to_storage: bool = False,
-            storage_message_id: int = None,
     ):
-        recipient = await update.get_bot().getChat(recipient_id)
-        subject = await update.get_bot().getChat(author_id)
-
-        chat_to_reveal = \
-            await update.get_bot().getChat(self.env.TELEGRAM_STORAGE_CHANNEL_ID) \
-            if to_storage \
-            else recipient
-
-        message_text = ""
-
-        if to_storage:
-            message_text += "*Author:*\n\n"
+        recipient, subject = await asyncio.gather(
+            self.chats.get_chat(update.get_bot(), recipient_id),
+            self.chats.get_chat(update.get_bot(), author_id),
+        )
 
         subject_username = ('@' + escape_markdown(subject.username)) if subject.username else '-'
         subject_first_name = ('`' + escape_markdown(subject.first_name) + '`') if subject.first_name else '-'
@@ -449,91 +775,148 @@ class TelegramBot:
             link=('@' + escape_markdown(subject.username)) if subject.username else subject.id
         )
 
-        message_text += "username: {username}\n".format(username=subject_username)
+        message_text = "username: {username}\n".format(username=subject_username)
         message_text += "first name: {first_name}\n".format(first_name=subject_first_name)
         message_text += "last name: {last_name}\n\n".format(last_name=subject_last_name)
-        if not to_storage:
-            message_text += \
-                "Если {subject} не запретил отправку сообщений от незнакомых пользователей ".format(
-                    subject=
-                    ("@" + escape_markdown(subject.username))
-                    if subject.username
-                    else "*" + escape_markdown(subject.first_name) + "*",
-                ) + \
-                "или у вас есть его контакт, то вы сможете открыть чат с ним в браузере:\n"
+        message_text += \
+            "Если {subject} не запретил отправку сообщений от незнакомых пользователей ".format(
+                subject=
+                ("@" + escape_markdown(subject.username))
+                if subject.username
+                else "*" + escape_markdown(subject.first_name) + "*",
+            ) + \
+            "или у вас есть его контакт, то вы сможете открыть чат с ним в браузере:\n"
 
         message_text += subject_chat_link
 
         message_text += f"\n\nID: `{subject.id}`"
 
-        if to_storage:
-            message_text += "\n\n*Recipient:*\n\n"
+        if subject.photo:
+            messages = await recipient.send_media_group(
+                media=[await self.avatar_media(subject.photo, "subject.png")],
+                caption=message_text,
+                parse_mode=ParseMode.MARKDOWN,
+            )
 
-            recipient_username = ('@' + escape_markdown(recipient.username)) if recipient.username else '-'
-            recipient_first_name = ('`' + escape_markdown(recipient.first_name) + '`') if recipient.first_name else '-'
-            recipient_last_name = ('`' + escape_markdown(recipient.last_name) + '`') if recipient.last_name else '-'
-            recipient_chat_link = "[Chat (web)](https://web.telegram.org/k/#{link})".format(
-                link=('@' + escape_markdown(recipient.username)) if recipient.username else recipient.id
+            # Remember the uploaded avatar to resend it by the file ID next time.
+            if messages[0].photo:
+                self.chats.store_avatar(subject.photo, messages[0].photo[-1].file_id)
+        else:
+            await recipient.send_message(
+                message_text,
+                parse_mode=ParseMode.MARKDOWN,
             )
 
-            message_text += "username: {username}\n".format(username=recipient_username)
-            message_text += "first name: {first_name}\n".format(first_name=recipient_first_name)
-            message_text += "last name: {last_name}\n\n".format(last_name=recipient_last_name)
-            message_text += recipient_chat_link
+    async def avatar_media(self, photo: ChatPhoto, filename: str) -> InputMediaPhoto:
+        """ Build the avatar media, uploaded once and resent by the file ID afterwards. """
 
-            message_text += f"\n\nID: `{recipient.id}`"
+        file_id = self.chats.get_avatar(photo)
 
-            message_text += f"\n\nMessage ID: `{storage_message_id}`"
+        if file_id is not None:
+            return InputMediaPhoto(media=file_id)
 
-        avatars = []
+        avatar = await photo.get_small_file()
 
-        if subject.photo:
-            subject_avatar = await subject.photo.get_small_file()
+        return InputMediaPhoto(
+            media=bytes(await avatar.download_as_bytearray()),
+            filename=filename,
+        )
 
-            media = InputMediaPhoto(
-                media=bytes(await subject_avatar.download_as_bytearray()),
-                filename="subject.png",
-            )
+    async def handle_error(
+            self,
+            update: Update,
+            context: UpdateContext,
+            endpoint: str,
+            status_code: int | str,
+            details: str = None,
+    ):
+        """ Report the failed backend call to the errors digest and apologize to the User. """
 
-            avatars.append(media)
+        self.errors.report("BackendError", endpoint, status_code, update, details)
 
-        if to_storage and recipient.photo:
-            recipient_avatar = await recipient.photo.get_small_file()
+        if update.callback_query is not None:
+            return await update.callback_query.answer(self.replies.ERROR)
 
-            media = InputMediaPhoto(
-                media=bytes(await recipient_avatar.download_as_bytearray()),
-                filename="recipient.png",
-            )
+        await update.effective_message.reply_text(self.replies.ERROR)
 
-            avatars.append(media)
+    async def post_init(self, application: Application):
+        """ Check the connections and start the background workers. """
 
-        if len(avatars) != 0:
-            await chat_to_reveal.send_media_group(
-                media=avatars,
-                caption=message_text,
-                parse_mode=ParseMode.MARKDOWN,
-            )
-        else:
-            if to_storage:
-                message_text += "\n\navatar is hidden"
+        # Workers share the host with the ingest process, which takes the configured port.
+        start_metrics_server(self.settings.METRICS, 0 if self.shard is None else 1 + self.shard)
 
-            await chat_to_reveal.send_message(
-                message_text,
-                parse_mode=ParseMode.MARKDOWN,
-            )
+        await check_redis(self.redis)
 
-    async def handle_error(self, update: Update, context: CallbackContext, message: str):
-        """ Handle errors. """
+        await self.message_outbox.start()
+        await self.storage_archive.start(application.bot)
+        await self.ban_list.start()
+        await self.broadcasts.start(application.bot, self.report_broadcast)
+        await self.stats.start()
+        await self.errors.start(application.bot)
 
-        self.logger.error(message)
+    async def post_stop(self, application: Application):
+        """ Post the last errors digest while the bot can still send. """
 
-        await update.get_bot().send_message(
-            chat_id=self.env.TELEGRAM_ERROR_NOTIFICATIONS_CHANNEL_ID,
-            text=escape_markdown(message),
-            parse_mode=ParseMode.MARKDOWN,
-        )
+        await self.errors.stop()
 
-        await update.message.reply_text(self.replies.ERROR)
+    async def post_shutdown(self, application: Application):
+        """ Stop the background workers and release the shared connections on shutdown. """
+
+        self.logger.info('User cache: %s', self.user_cache.stats())
+        self.logger.info('Send scheduler: %s', self.send_scheduler.stats())
+        self.logger.info('Admission: %s', self.admission.stats())
+
+        await self.message_outbox.stop()
+        await self.storage_archive.stop()
+        await self.ban_list.stop()
+        await self.broadcasts.stop()
+        await self.stats.stop()
+
+        await self.backend.close()
+        await self.redis.aclose()
+
+        self.tracer.close()
 
     def run(self):
-        self.bot.run_polling(allowed_updates=Update.ALL_TYPES)
+        if self.shard is not None:
+            return asyncio.run(self.run_worker())
+
+        run_application(self.bot, self.env, self.settings)
+
+    async def run_worker(self):
+        """ Handle the updates of the shard from the update stream until stopped. """
+
+        stop = asyncio.Event()
+        for stop_signal in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(stop_signal, stop.set)
+
+        async with self.bot:
+            await self.post_init(self.bot)
+            await self.bot.start()
+
+            consumer = asyncio.create_task(self.updates.consume(
+                self.shard,
+                f"worker-{self.shard}",
+                self.process_streamed_update,
+            ))
+
+            self.logger.info('Handling the updates of the shard %s.', self.shard)
+
+            await stop.wait()
+
+            consumer.cancel()
+            try:
+                await consumer
+            except asyncio.CancelledError:
+                pass
+
+            await self.bot.stop()
+            await self.post_stop(self.bot)
+            await self.post_shutdown(self.bot)
+
+    async def process_streamed_update(self, data: dict):
+        """ Handle the update from the update stream as if it was received by the bot. """
+
+        update = Update.de_json(data, self.bot.bot)
+
+        await self.bot.update_processor.process_update(update, self.bot.process_update(update))
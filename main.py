@@ -1,5 +1,26 @@
+from argparse import ArgumentParser
+
 import bot as telegram_bot
 
 if __name__ == "__main__":
-    bot = telegram_bot.TelegramBot()
+    parser = ArgumentParser(description="AnonymousWord Telegram bot.")
+    parser.add_argument(
+        "role",
+        nargs="?",
+        choices=("bot", "ingest", "worker"),
+        default="bot",
+        help="\"bot\" runs everything in one process, \"ingest\" and \"worker\" run the sharded deployment.",
+    )
+    parser.add_argument("--shard", type=int, default=0, help="Shard handled by the worker.")
+    arguments = parser.parse_args()
+
+    if arguments.role == "ingest":
+        from src.ingest import UpdateIngest
+
+        bot = UpdateIngest()
+    elif arguments.role == "worker":
+        bot = telegram_bot.TelegramBot(shard=arguments.shard)
+    else:
+        bot = telegram_bot.TelegramBot()
+
     bot.run()
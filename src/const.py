@@ -7,3 +7,8 @@ API_BASE_URL = "http://localhost:9939"
 USER_LINK_REGEX = r"^[a-zA-Z0-9_]{6,32}$"
 USER_WELCOME_REGEX = r"^.{6,256}$"
 
+# Marks the cache entry which wasn't fetched yet.
+NOT_LOADED = object()
+
+# Length the message body is cut to in the inbox page.
+INBOX_BODY_LENGTH = 300
@@ -0,0 +1,18 @@
+from telegram.ext import Application, CallbackContext
+
+from src.models import UserModel
+
+
+class UpdateContext(CallbackContext):
+    """
+    Callback context shared by the decorators and the handler of one update.
+
+    The User resolved by the "auth" decorator is kept here, so the "admin"
+    decorator and the handler body never fetch it from the backend again.
+    """
+
+    def __init__(self, application: Application, chat_id: int = None, user_id: int = None):
+        super().__init__(application=application, chat_id=chat_id, user_id=user_id)
+
+        # The backend User of the update's sender.
+        self.user: UserModel | None = None
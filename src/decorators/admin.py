@@ -1,32 +1,35 @@
 from functools import wraps
 
-import requests
 from telegram import Update
-from telegram.ext import CallbackContext
 
-from src.const import API_BASE_URL
-from src.helpers.user_roles import UserRoles
+from src.context import UpdateContext
+from src.tracing import span
 
 
 def admin(func):
     """
-    Register the User if his not already registered.
+    Allow access only for the Users with the "Special" role.
+
+    Reuses the User resolved by the "auth" decorator when it's present.
     """
 
     @wraps(func)
-    def wrapper(this, update: Update, context: CallbackContext):
-        user = requests.get(f"{API_BASE_URL}/api/user", params={
-            "telegramId": update.effective_user.id,
-        })
+    async def wrapper(this, update: Update, context: UpdateContext):
+        with span("admin"):
+            user = context.user
+
+            if user is None:
+                user = await this.users.get_by_telegram_id(update.effective_user.id)
 
-        if user.status_code != 200:
-            return
+                if user.status_code != 200:
+                    return
 
-        user = user.json()
+                user = user.data
+                context.user = user
 
-        if UserRoles.Special in UserRoles(user["roles"]):
-            return func(this, update, context)
+            if not user.is_special:
+                return None
 
-        return None
+        return await func(this, update, context)
 
     return wrapper
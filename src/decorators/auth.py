@@ -1,48 +1,79 @@
-import requests
-
+import logging
 from functools import wraps
 from telegram import Update, ChatPermissions
-from telegram.ext import CallbackContext
+from telegram.error import TelegramError
 from datetime import datetime, timedelta
-from time import sleep
 
-from src.const import API_BASE_URL
-from src.helpers.user_roles import UserRoles
+from src.context import UpdateContext
+from src.services.ban_list import BanList
+from src.tracing import span
 
 
 def auth(func):
     """
     Register the User if his not already registered.
+
+    The resolved User is stored in the update context as "context.user".
+    The updates of the Users known to be banned are dropped before any
+    backend call.
     """
 
     @wraps(func)
-    def wrapper(this, update: Update, context: CallbackContext):
-        user = requests.get(f"{API_BASE_URL}/api/user", params={
-            "telegramId": update.message.from_user.id,
-        })
-
-        if user.status_code == 404:
-            # Create new User.
-            user = requests.put(
-                f"{API_BASE_URL}/api/user/{update.message.from_user.id}",
-                headers={
-                    "Content-Type": "application/json",
-                }
-            )
-
-        user = user.json()
-
-        # Deny access for the banned users.
-        if UserRoles.Banned in UserRoles(user["roles"]):
-            update.get_bot().restrict_chat_member(
-                chat_id=update.message.chat.id,
-                user_id=update.message.from_user.id,
-                permissions=ChatPermissions.no_permissions(),
-                until_date=datetime.now() + timedelta(days=3650),
-            )
-
-            return
-
-        return func(this, update, context)
+    async def wrapper(this, update: Update, context: UpdateContext):
+        with span("auth"):
+            ban_entry, user = await this.users.get_sender(update.effective_user.id)
+
+            # Deny access for the banned users.
+            if ban_entry is not None:
+                if not BanList.is_restricted(ban_entry):
+                    await restrict(this, update)
+
+                return
+
+            endpoint = "GET /api/user"
+
+            if user.status_code == 404:
+                # Create new User.
+                endpoint = "PUT /api/user/{telegramId}"
+                user = await this.users.create(update.effective_user.id)
+
+                if user.ok:
+                    await this.stats.count_user()
+
+            if not user.ok:
+                return await this.handle_error(update, context, endpoint, user.status_code)
+
+            user = user.data
+            context.user = user
+
+            # Banned, but not in the ban list yet.
+            if user.is_banned:
+                await restrict(this, update)
+
+                return
+
+        return await func(this, update, context)
 
     return wrapper
+
+
+async def restrict(this, update: Update):
+    """ Restrict the banned User once, not on every update. """
+
+    if not await this.ban_list.claim_restriction(update.effective_user.id):
+        return
+
+    try:
+        await update.get_bot().restrict_chat_member(
+            chat_id=update.effective_chat.id,
+            user_id=update.effective_user.id,
+            permissions=ChatPermissions.no_permissions(),
+            until_date=datetime.now() + timedelta(days=3650),
+        )
+    except TelegramError as error:
+        # Not retried, the updates of the User are dropped anyway.
+        logging.getLogger('bot.auth').warning(
+            'Failed to restrict the User %s: %s',
+            update.effective_user.id,
+            error,
+        )
@@ -0,0 +1,35 @@
+from functools import wraps
+from time import perf_counter
+
+from telegram import Update
+
+from src.context import UpdateContext
+from src.metrics import HANDLER_LATENCY
+from src.tracing import record_span
+
+
+def timed(func):
+    """
+    Record the handler latency, including the decorators below it, and its span.
+    """
+
+    histogram = HANDLER_LATENCY.labels(func.__name__)
+    name = f"handler {func.__name__}"
+
+    @wraps(func)
+    async def wrapper(this, update: Update, context: UpdateContext):
+        started_at = perf_counter()
+        error = None
+
+        try:
+            return await func(this, update, context)
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            duration = perf_counter() - started_at
+
+            histogram.observe(duration)
+            record_span(name, started_at, duration, error)
+
+    return wrapper
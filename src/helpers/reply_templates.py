@@ -10,9 +10,13 @@ class ReplyTemplates(object):
     COMMAND_LINK = None
     COMMAND_WELCOME = None
     COMMAND_DELETE = None
+    COMMAND_BROADCAST = None
+    COMMAND_STATS = None
+    COMMAND_INBOX = None
 
     EVENT_ANONYMOUS_MESSAGE_SENT = None
     EVENT_ANONYMOUS_MESSAGE_RECEIVED = None
+    EVENT_RATE_LIMITED = None
 
     ERROR = None
 
@@ -0,0 +1,58 @@
+import logging
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler, CallbackContext
+
+from src.metrics import start_metrics_server
+from src.runner import application_builder, run_application
+from src.services.redis_client import create_redis, check_redis
+from src.services.update_stream import UpdateStream
+from src.utilities.env import load_env
+from src.utilities.settings import load_settings
+
+
+class UpdateIngest:
+    """
+    Ingest process of the sharded deployment.
+
+    Receives the updates by polling or by webhook and publishes them to the
+    shard streams, the handlers run in the worker processes.
+    """
+
+    def __init__(self):
+        # Set up logger.
+        logging.basicConfig(
+            format='[%(asctime)s] %(message)s',
+            level=logging.INFO,
+        )
+        self.logger = logging.getLogger('bot.ingest')
+
+        self.env = load_env()
+        self.settings = load_settings()
+
+        self.redis = create_redis(self.settings.REDIS, self.env)
+        self.updates = UpdateStream(self.redis, **self.settings.UPDATE_STREAM)
+
+        self.bot = application_builder(self.env, self.settings) \
+            .post_init(self.post_init) \
+            .post_shutdown(self.post_shutdown) \
+            .build()
+
+        # Updates are published in the order they are received.
+        self.bot.add_handler(TypeHandler(Update, self.publish))
+
+        self.logger.info('Initialized the update ingest for %s shards.', self.updates.shards)
+
+    async def publish(self, update: Update, context: CallbackContext):
+        await self.updates.publish(update)
+
+    async def post_init(self, application: Application):
+        start_metrics_server(self.settings.METRICS)
+
+        await check_redis(self.redis)
+
+    async def post_shutdown(self, application: Application):
+        await self.redis.aclose()
+
+    def run(self):
+        run_application(self.bot, self.env, self.settings)
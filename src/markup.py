@@ -1,10 +1,39 @@
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 
+from src.helpers.reply_templates import ReplyTemplates
+
 
 class Markup(object):
 
+    def __init__(self, replies: ReplyTemplates):
+        self.replies = replies
+
     @staticmethod
     def start_command():
         return InlineKeyboardMarkup([[
             InlineKeyboardButton(text="", callback_data="")
         ]])
+
+    def inbox(self, page: dict) -> InlineKeyboardMarkup | None:
+        """ Buttons to the newer and the older page of the inbox, by the first and the last Message IDs. """
+
+        if len(page["messages"]) == 0:
+            return None
+
+        buttons = []
+
+        if page["hasNewer"]:
+            buttons.append(InlineKeyboardButton(
+                text=self.replies.COMMAND_INBOX["NEWER"],
+                callback_data=f"inbox:after:{page['messages'][0]['id']}",
+            ))
+        if page["hasOlder"]:
+            buttons.append(InlineKeyboardButton(
+                text=self.replies.COMMAND_INBOX["OLDER"],
+                callback_data=f"inbox:before:{page['messages'][-1]['id']}",
+            ))
+
+        if len(buttons) == 0:
+            return None
+
+        return InlineKeyboardMarkup([buttons])
@@ -0,0 +1,93 @@
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Handlers are dominated by the network round trips, the buckets span them up to the flood waits.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds",
+    "Time to handle the update by the handler.",
+    ["handler"],
+    buckets=LATENCY_BUCKETS,
+)
+
+BACKEND_LATENCY = Histogram(
+    "bot_backend_request_duration_seconds",
+    "Time of the backend API request.",
+    ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+BACKEND_RESPONSES = Counter(
+    "bot_backend_responses_total",
+    "Backend API responses by the status code, \"error\" if there was no response.",
+    ["method", "endpoint", "status"],
+)
+
+REDIS_LATENCY = Histogram(
+    "bot_redis_command_duration_seconds",
+    "Time of the Redis command, the pipelines are timed as a whole.",
+    ["command"],
+    buckets=LATENCY_BUCKETS,
+)
+
+TELEGRAM_LATENCY = Histogram(
+    "bot_telegram_request_duration_seconds",
+    "Time of the Bot API request, without waiting for the send scheduler.",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_ERRORS = Counter(
+    "bot_telegram_errors_total",
+    "Failed Bot API requests by the error.",
+    ["method", "error"],
+)
+
+USER_CACHE_LOOKUPS = Counter(
+    "bot_user_cache_lookups_total",
+    "Lookups of the Users in the cache by the key and the result, to tune its TTL.",
+    ["key", "result"],
+)
+
+SEND_QUEUE_DEPTH = Gauge(
+    "bot_send_queue_depth",
+    "Sends waiting for a permit of the send scheduler by the priority.",
+    ["priority"],
+)
+SEND_WAIT = Histogram(
+    "bot_send_wait_seconds",
+    "Time the send waited for a permit of the send scheduler by the priority.",
+    ["priority"],
+    # The channels' budget is per minute, their sends wait for minutes when backed up.
+    buckets=LATENCY_BUCKETS + (60.0, 120.0, 300.0),
+)
+
+UPDATES_IN_FLIGHT = Gauge(
+    "bot_updates_in_flight",
+    "Updates received and not handled yet, including the ones waiting for a slot.",
+)
+UPDATES_HANDLING = Gauge(
+    "bot_updates_handling",
+    "Updates being handled right now.",
+)
+UPDATES_SHED = Counter(
+    "bot_updates_shed_total",
+    "Updates dropped by the admission control by the priority and the reason.",
+    ["priority", "reason"],
+)
+
+
+def start_metrics_server(settings: dict, port_offset: int = 0):
+    """
+    Serve the metrics in the Prometheus format, as set in settings.json.
+
+    The processes running on the same host take the ports after the configured one.
+    """
+
+    if not settings["enabled"]:
+        return
+
+    port = settings["port"] + port_offset
+    start_http_server(port, addr=settings["listen"])
+
+    logging.getLogger('bot.metrics').info('Serving the metrics on %s:%s.', settings["listen"], port)
@@ -0,0 +1,151 @@
+from orjson import dumps, loads
+
+from src.helpers.user_roles import UserRoles
+
+
+class UserModel(object):
+    """
+    User of the backend, decoded once from the response.
+
+    The roles are decoded to the flags on load. In the cache the User is
+    stored as a JSON array in the order of the slots, without the keys.
+    """
+
+    __slots__ = ("id", "telegram_id", "link", "welcome_message", "roles", "registered_at")
+
+    def __init__(
+            self,
+            id: int,
+            telegram_id: int,
+            link: str | None,
+            welcome_message: str | None,
+            roles: UserRoles,
+            registered_at: int,
+    ):
+        self.id = id
+        self.telegram_id = telegram_id
+        self.link = link
+        self.welcome_message = welcome_message
+        self.roles = roles
+        self.registered_at = registered_at
+
+    @property
+    def is_banned(self) -> bool:
+        return UserRoles.Banned in self.roles
+
+    @property
+    def is_special(self) -> bool:
+        return UserRoles.Special in self.roles
+
+    @classmethod
+    def from_json(cls, data: dict) -> "UserModel":
+        """ Decode the User from the backend JSON. """
+
+        return cls(
+            data["id"],
+            data["telegramId"],
+            data["link"],
+            data["welcomeMessage"],
+            UserRoles(data["roles"]),
+            data["registeredAt"],
+        )
+
+    def encode(self) -> bytes:
+        return dumps((
+            self.id,
+            self.telegram_id,
+            self.link,
+            self.welcome_message,
+            self.roles.value,
+            self.registered_at,
+        ))
+
+    @classmethod
+    def decode(cls, value: str | bytes) -> "UserModel":
+        data = loads(value)
+
+        # Entry cached as the backend JSON before the compact form.
+        if isinstance(data, dict):
+            return cls.from_json(data)
+
+        id, telegram_id, link, welcome_message, roles, registered_at = data
+
+        return cls(id, telegram_id, link, welcome_message, UserRoles(roles), registered_at)
+
+
+class MessageModel(object):
+    """
+    Anonymous Message, decoded once from the backend response or built by the bot.
+
+    In the index the Message is stored as a JSON array without the body,
+    which is needed only to store the Message in the backend.
+    """
+
+    __slots__ = (
+        "author_chat_message_id",
+        "recipient_chat_message_id",
+        "storage_message_id",
+        "author_id",
+        "recipient_id",
+        "body",
+    )
+
+    def __init__(
+            self,
+            author_chat_message_id: int,
+            recipient_chat_message_id: int,
+            storage_message_id: int | None,
+            author_id: int,
+            recipient_id: int,
+            body: str | None = None,
+    ):
+        self.author_chat_message_id = author_chat_message_id
+        self.recipient_chat_message_id = recipient_chat_message_id
+        self.storage_message_id = storage_message_id
+        self.author_id = author_id
+        self.recipient_id = recipient_id
+        self.body = body
+
+    @classmethod
+    def from_json(cls, data: dict) -> "MessageModel":
+        """ Decode the Message from the backend JSON. """
+
+        return cls(
+            data["authorChatMessageId"],
+            data["recipientChatMessageId"],
+            data["storageMessageId"],
+            data["authorId"],
+            data["recipientId"],
+            data.get("body"),
+        )
+
+    def to_json(self) -> dict:
+        """ Message in the shape the backend accepts. """
+
+        return {
+            "authorChatMessageId": self.author_chat_message_id,
+            "recipientChatMessageId": self.recipient_chat_message_id,
+            "storageMessageId": self.storage_message_id,
+            "authorId": self.author_id,
+            "recipientId": self.recipient_id,
+            "body": self.body,
+        }
+
+    def encode(self) -> bytes:
+        return dumps((
+            self.author_chat_message_id,
+            self.recipient_chat_message_id,
+            self.storage_message_id,
+            self.author_id,
+            self.recipient_id,
+        ))
+
+    @classmethod
+    def decode(cls, value: str | bytes) -> "MessageModel":
+        data = loads(value)
+
+        # Entry indexed as the backend JSON before the compact form.
+        if isinstance(data, dict):
+            return cls.from_json(data)
+
+        return cls(*data)
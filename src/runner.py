@@ -0,0 +1,56 @@
+import logging
+
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder
+
+from src.telegram_request import InstrumentedRequest
+from src.utilities.env import Env
+from src.utilities.settings import Settings
+
+
+def application_builder(env: Env, settings: Settings) -> ApplicationBuilder:
+    """
+    Application builder with the bot token and the Bot API server, as set in settings.json or env.
+
+    The Bot API requests, except the long polling, are timed for the metrics.
+    """
+
+    builder = Application.builder() \
+        .token(env.TELEGRAM_BOT_TOKEN) \
+        .request(InstrumentedRequest(connection_pool_size=256))
+
+    base_url = env.TELEGRAM_BASE_URL or settings.TELEGRAM["base_url"]
+    if base_url:
+        builder.base_url(base_url)
+
+    base_file_url = env.TELEGRAM_BASE_FILE_URL or settings.TELEGRAM["base_file_url"]
+    if base_file_url:
+        builder.base_file_url(base_file_url)
+
+    return builder
+
+
+def run_application(application: Application, env: Env, settings: Settings):
+    """
+    Receive the updates by polling or by webhook, as set in settings.json or env.
+    """
+
+    logger = logging.getLogger('bot')
+    mode = env.TELEGRAM_MODE or settings.TELEGRAM["mode"]
+
+    if mode == "webhook":
+        webhook = settings.TELEGRAM["webhook"]
+
+        logger.info('Receiving updates by webhook on %s:%s.', webhook["listen"], webhook["port"])
+
+        return application.run_webhook(
+            listen=webhook["listen"],
+            port=webhook["port"],
+            url_path=webhook["url_path"],
+            webhook_url=env.TELEGRAM_WEBHOOK_URL or webhook["webhook_url"],
+            secret_token=env.TELEGRAM_WEBHOOK_SECRET_TOKEN or None,
+            max_connections=webhook["max_connections"],
+            allowed_updates=Update.ALL_TYPES,
+        )
+
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from enum import IntEnum
+from typing import Callable, Mapping, Sequence
+
+from telegram import Update
+from telegram.ext import BaseHandler
+
+from src.metrics import UPDATES_SHED
+
+
+class UpdatePriority(IntEnum):
+    """ Priority of the incoming update, the lower value is shed last. """
+
+    DELIVERY = 0
+    COMMAND = 1
+    PROFILE = 2
+    # No handler would do anything with the update.
+    NOOP = 3
+
+
+class AdmissionControl(object):
+    """
+    Admission of the incoming updates to the handlers under load.
+
+    The update is classified by the handler which would take it, before any
+    I/O, and the updates no handler would do anything with are dropped at
+    once. At most the max pending updates are in flight, the rest are shed.
+
+    The queue latency is the time the last started update waited for a free
+    concurrency slot. While it's over the threshold, the profile edits are
+    shed and the other commands are deferred until it drops, or shed after
+    the defer timeout. The anonymous deliveries and replies are only shed
+    when the pending updates are over the bound.
+
+    The posts to the storage and the errors channels are sent off the
+    handlers, so the channels' send limits never hold a slot and don't
+    show in the latency; only the sends to the users' chats do.
+    """
+
+    def __init__(self, max_pending: int = 1000, latency_threshold: float = 2.0, defer_timeout: float = 10.0):
+        self.max_pending = max_pending
+        self.latency_threshold = latency_threshold
+        self.defer_timeout = defer_timeout
+
+        self.logger = logging.getLogger('bot.admission')
+
+        self.handlers: Sequence[BaseHandler] = ()
+        self.priorities: Mapping[Callable, UpdatePriority | Callable[[Update], UpdatePriority]] = {}
+
+        self.pending = 0
+        self.admitted = 0
+        self.queue_latency = 0.0
+
+        self._calm = asyncio.Event()
+        self._calm.set()
+        self._shed = {priority: {} for priority in UpdatePriority}
+
+    def classify_by(
+            self,
+            handlers: Sequence[BaseHandler],
+            priorities: Mapping[Callable, UpdatePriority | Callable[[Update], UpdatePriority]],
+    ):
+        """
+        Classify the updates by the callback of the first handler they match.
+
+        The priority of the callback is either fixed, or a function of the
+        update. The callbacks without a priority are handled as commands.
+        """
+
+        self.handlers = handlers
+        self.priorities = priorities
+
+    def classify(self, update: object) -> UpdatePriority:
+        if not isinstance(update, Update):
+            return UpdatePriority.COMMAND
+
+        for handler in self.handlers:
+            check = handler.check_update(update)
+
+            if check is None or check is False:
+                continue
+
+            priority = self.priorities.get(handler.callback, UpdatePriority.COMMAND)
+
+            return priority(update) if callable(priority) else priority
+
+        return UpdatePriority.NOOP
+
+    def enter(self, priority: UpdatePriority) -> bool:
+        """ Take the update in, False if it's shed. Every update taken in must leave. """
+
+        if priority is UpdatePriority.NOOP:
+            self.shed(priority, "noop")
+            return False
+
+        if self.pending >= self.max_pending:
+            self.shed(priority, "overflow")
+            return False
+
+        self.pending += 1
+
+        return True
+
+    def leave(self):
+        self.pending -= 1
+
+    async def admit(self, priority: UpdatePriority) -> bool:
+        """ Wait until the update may take a slot by its priority, False if it's shed. """
+
+        if priority is UpdatePriority.DELIVERY or self._calm.is_set():
+            self.admitted += 1
+            return True
+
+        if priority is UpdatePriority.PROFILE:
+            self.shed(priority, "latency")
+            return False
+
+        try:
+            await asyncio.wait_for(self._calm.wait(), self.defer_timeout)
+        except asyncio.TimeoutError:
+            self.shed(priority, "deferred")
+            return False
+
+        self.admitted += 1
+
+        return True
+
+    def release(self):
+        """ Release the admitted update once it's handled. """
+
+        self.admitted -= 1
+
+        # Nothing waits for a slot when no update is admitted, the deferred ones may go.
+        if self.admitted == 0:
+            self.record_wait(0.0)
+
+    def record_wait(self, wait: float):
+        """ Take the slot wait time of the started update as the queue latency. """
+
+        self.queue_latency = wait
+
+        if wait > self.latency_threshold:
+            self._calm.clear()
+        else:
+            self._calm.set()
+
+    def shed(self, priority: UpdatePriority, reason: str):
+        self._shed[priority][reason] = self._shed[priority].get(reason, 0) + 1
+        UPDATES_SHED.labels(priority.name, reason).inc()
+
+        if reason != "noop":
+            self.logger.debug('Shed the %s update (%s), queue latency %.3fs.', priority.name, reason, self.queue_latency)
+
+    def stats(self) -> dict:
+        """ Pending updates, the queue latency and the shed updates by the priority and the reason. """
+
+        return {
+            "pending": self.pending,
+            "admitted": self.admitted,
+            "queue_latency": self.queue_latency,
+            "shed": {priority.name: dict(reasons) for priority, reasons in self._shed.items() if reasons},
+        }
@@ -0,0 +1,123 @@
+import asyncio
+from time import monotonic
+from typing import Any
+
+from telegram import Message, Update
+
+
+class Album(object):
+    __slots__ = ("first_update_id", "messages", "updated_at")
+
+    def __init__(self, update: Update):
+        self.first_update_id = update.update_id
+        self.messages = [update.message]
+        self.updated_at = monotonic()
+
+
+class AlbumCollector(object):
+    """
+    Collect the messages of one album (media group) into a single batch.
+
+    Telegram delivers every item of the album as its own update. The first
+    item is handled as usual and waits until no new item arrived for the
+    delay, the other items join its batch and aren't handled at all.
+
+    The items arriving after the album was collected make a batch of their
+    own, which follows the album to where it was delivered for the
+    follow-up time.
+    """
+
+    def __init__(self, delay: float = 0.5, max_size: int = 10, follow_up_time: float = 60.0):
+        self.delay = delay
+        self.max_size = max_size
+        self.follow_up_time = follow_up_time
+
+        self._albums: dict[tuple[int, str], Album] = {}
+        # Where the albums went, with the time their late items follow them until, in the order of the time.
+        self._delivered: dict[tuple[int, str], tuple[float, Any]] = {}
+
+    @staticmethod
+    def key(update: Update) -> tuple[int, str] | None:
+        if update.message is None or update.message.media_group_id is None or update.effective_user is None:
+            return None
+
+        return update.effective_user.id, update.message.media_group_id
+
+    def add(self, update: object) -> bool:
+        """ Add the album item, True if it joined the batch of the first item and must not be handled. """
+
+        key = self.key(update) if isinstance(update, Update) else None
+        if key is None:
+            return False
+
+        album = self._albums.get(key)
+
+        if album is None:
+            self._albums[key] = Album(update)
+            return False
+
+        album.messages.append(update.message)
+        album.updated_at = monotonic()
+
+        return True
+
+    async def collect(self, update: Update) -> list[Message]:
+        """ Wait for the rest of the album of the first item, the single message is returned as is. """
+
+        key = self.key(update)
+        album = self._albums.get(key) if key is not None else None
+
+        if album is None or album.first_update_id != update.update_id:
+            return [update.message]
+
+        try:
+            while len(album.messages) < self.max_size:
+                wait = album.updated_at + self.delay - monotonic()
+                if wait <= 0:
+                    break
+
+                await asyncio.sleep(wait)
+        finally:
+            del self._albums[key]
+
+        return sorted(album.messages, key=lambda message: message.message_id)
+
+    def discard(self, update: object):
+        """ Drop the album of the first item, if it wasn't collected by the handler. """
+
+        key = self.key(update) if isinstance(update, Update) else None
+        album = self._albums.get(key) if key is not None else None
+
+        if album is not None and album.first_update_id == update.update_id:
+            del self._albums[key]
+
+    def delivered(self, update: Update, target: Any):
+        """ Remember where the album of the update was delivered, so its late items follow it. """
+
+        key = self.key(update)
+        if key is None:
+            return
+
+        now = monotonic()
+
+        # Drop the expired albums, the oldest ones go first.
+        while self._delivered:
+            oldest = next(iter(self._delivered))
+            if self._delivered[oldest][0] > now:
+                break
+
+            del self._delivered[oldest]
+
+        self._delivered.pop(key, None)
+        self._delivered[key] = (now + self.follow_up_time, target)
+
+    def follow_up(self, update: Update) -> Any | None:
+        """ Where the album of the late item was delivered, None if it's not a late item. """
+
+        key = self.key(update)
+        delivered = self._delivered.get(key) if key is not None else None
+
+        if delivered is None or delivered[0] <= monotonic():
+            return None
+
+        return delivered[1]
@@ -0,0 +1,239 @@
+from time import perf_counter
+from typing import Any, NamedTuple
+
+import httpx
+from orjson import dumps, loads
+
+from src.const import API_BASE_URL
+from src.metrics import BACKEND_LATENCY, BACKEND_RESPONSES
+from src.tracing import record_span
+
+
+class BackendResponse(NamedTuple):
+    """ Decoded response of the backend API. """
+
+    status_code: int
+    data: Any
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200
+
+
+class BackendClient(object):
+    """
+    Shared async client of the backend API.
+
+    Keeps a pool of keep-alive connections to the backend, so the handlers
+    never block the event loop and never open a new TCP connection per call.
+    """
+
+    def __init__(
+            self,
+            base_url: str = API_BASE_URL,
+            max_connections: int = 64,
+            max_keepalive_connections: int = 32,
+            keepalive_expiry: float = 30.0,
+            connect_timeout: float = 2.0,
+            timeout: float = 5.0,
+    ):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+
+    async def close(self):
+        """ Close all pooled connections. """
+
+        await self._client.aclose()
+
+    async def request(self, method: str, path: str, endpoint: str = None, **kwargs) -> BackendResponse:
+        """
+        Send the request to the backend and decode its JSON body.
+
+        The "endpoint" is the path template the request is timed under, the path by default.
+        The "json" body is encoded and the response is decoded by orjson.
+        """
+
+        endpoint = endpoint or path
+
+        if "json" in kwargs:
+            kwargs["content"] = dumps(kwargs.pop("json"))
+            kwargs["headers"] = {"Content-Type": "application/json"}
+
+        started_at = perf_counter()
+
+        try:
+            response = await self._client.request(method, path, **kwargs)
+        except httpx.HTTPError as error:
+            duration = perf_counter() - started_at
+
+            BACKEND_LATENCY.labels(method, endpoint).observe(duration)
+            BACKEND_RESPONSES.labels(method, endpoint, "error").inc()
+            record_span(f"backend {method} {endpoint}", started_at, duration, error)
+            raise
+
+        duration = perf_counter() - started_at
+
+        BACKEND_LATENCY.labels(method, endpoint).observe(duration)
+        BACKEND_RESPONSES.labels(method, endpoint, response.status_code).inc()
+        record_span(f"backend {method} {endpoint}", started_at, duration, status=response.status_code)
+
+        data = None
+        if response.content and response.headers.get("Content-Type", "").startswith("application/json"):
+            data = loads(response.content)
+
+        return BackendResponse(response.status_code, data)
+
+    async def get_user(self, telegram_id: int | str = None, link: str = None) -> BackendResponse:
+        """ GET /api/user by Telegram ID or link. """
+
+        params = {}
+        if telegram_id is not None:
+            params["telegramId"] = telegram_id
+        if link is not None:
+            params["link"] = link
+
+        return await self.request("GET", "/api/user", params=params)
+
+    async def create_user(self, telegram_id: int | str) -> BackendResponse:
+        """ PUT /api/user/{telegramId} """
+
+        return await self.request("PUT", f"/api/user/{telegram_id}", "/api/user/{telegramId}")
+
+    async def patch_user(
+            self,
+            telegram_id: int | str,
+            link: str = None,
+            welcome_message: str = None,
+    ) -> BackendResponse:
+        """ PATCH /api/user/{telegramId} """
+
+        data = {}
+        if link is not None:
+            data["link"] = link
+        if welcome_message is not None:
+            data["welcomeMessage"] = welcome_message
+
+        return await self.request("PATCH", f"/api/user/{telegram_id}", "/api/user/{telegramId}", json=data)
+
+    async def get_banned_users(self) -> BackendResponse:
+        """ GET /api/user/banned """
+
+        return await self.request("GET", "/api/user/banned")
+
+    async def get_users_page(self, after: int = 0, limit: int = 100) -> BackendResponse:
+        """ GET /api/user/page, the not banned Users after the ID. """
+
+        return await self.request("GET", "/api/user/page", params={"after": after, "limit": limit})
+
+    async def get_user_stats(self, telegram_id: int | str) -> BackendResponse:
+        """ GET /api/user/{telegramId}/stats """
+
+        return await self.request("GET", f"/api/user/{telegram_id}/stats", "/api/user/{telegramId}/stats")
+
+    async def get_stats(self) -> BackendResponse:
+        """ GET /api/stats, the total counts of the Users and Messages. """
+
+        return await self.request("GET", "/api/stats")
+
+    async def get_author(self, recipient_chat_message_id: int) -> BackendResponse:
+        """ GET /api/user/author/{messageId} """
+
+        return await self.request(
+            "GET",
+            f"/api/user/author/{recipient_chat_message_id}",
+            "/api/user/author/{messageId}",
+        )
+
+    async def get_author_from_storage(self, storage_message_id: int) -> BackendResponse:
+        """ GET /api/user/author_from_storage/{messageId} """
+
+        return await self.request(
+            "GET",
+            f"/api/user/author_from_storage/{storage_message_id}",
+            "/api/user/author_from_storage/{messageId}",
+        )
+
+    async def get_message(self, recipient_id: int | str, recipient_chat_message_id: int) -> BackendResponse:
+        """ GET /api/message by the recipient chat. """
+
+        return await self.request("GET", "/api/message", params={
+            "recipientId": recipient_id,
+            "recipientChatMessageId": recipient_chat_message_id,
+        })
+
+    async def get_message_from_storage(self, storage_message_id: int) -> BackendResponse:
+        """ GET /api/message by the storage channel Message. """
+
+        return await self.request("GET", "/api/message", params={
+            "storageMessageId": storage_message_id,
+        })
+
+    async def get_delivery(
+            self,
+            sender_id: int | str,
+            link: str = None,
+            replied_message_id: int = None,
+    ) -> BackendResponse:
+        """ GET /api/message/delivery, the sender, the receiver and the original Message. """
+
+        params = {"senderId": sender_id}
+        if link is not None:
+            params["link"] = link
+        if replied_message_id is not None:
+            params["repliedMessageId"] = replied_message_id
+
+        return await self.request("GET", "/api/message/delivery", params=params)
+
+    async def get_inbox(
+            self,
+            recipient_id: int | str,
+            before: int = None,
+            after: int = None,
+            limit: int = 10,
+    ) -> BackendResponse:
+        """ GET /api/message/inbox/{recipientId}, the page before or after the Message ID. """
+
+        params = {"limit": limit}
+        if before is not None:
+            params["before"] = before
+        if after is not None:
+            params["after"] = after
+
+        return await self.request(
+            "GET",
+            f"/api/message/inbox/{recipient_id}",
+            "/api/message/inbox/{recipientId}",
+            params=params,
+        )
+
+    async def create_message(
+            self,
+            author_chat_message_id: int,
+            recipient_chat_message_id: int,
+            storage_message_id: int,
+            author_id: int | str,
+            recipient_id: int | str,
+            body: str = None,
+    ) -> BackendResponse:
+        """ POST /api/message """
+
+        return await self.request("POST", "/api/message", json={
+            "authorChatMessageId": author_chat_message_id,
+            "recipientChatMessageId": recipient_chat_message_id,
+            "storageMessageId": storage_message_id,
+            "authorId": int(author_id),
+            "recipientId": int(recipient_id),
+            "body": body,
+        })
+
+    async def create_messages(self, messages: list[dict]) -> BackendResponse:
+        """ POST /api/message/bulk """
+
+        return await self.request("POST", "/api/message/bulk", json=messages)
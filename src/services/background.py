@@ -0,0 +1,192 @@
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+
+from src.services.redis_client import create_group
+
+
+class BackgroundService(object):
+    """
+    Service running its loop in a background task from start() until stop().
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """ Start the loop in the background. """
+
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """ Stop the loop and wait until it's stopped. """
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+
+    async def run(self):
+        raise NotImplementedError
+
+
+class PeriodicService(BackgroundService):
+    """
+    Service running its job every interval.
+
+    With the lock key set, the job runs in one of the processes per interval:
+    the one which sets the key first, the key expires with the interval. The
+    failed job is logged and runs again in the next interval.
+    """
+
+    FAILURE_MESSAGE = 'Failed to run the periodic job.'
+
+    def __init__(self, interval: float, redis: Redis = None, lock_key: str = None):
+        super().__init__()
+
+        self.interval = interval
+        self.redis = redis
+        self.lock_key = lock_key
+
+        self.logger = logging.getLogger('bot')
+
+    async def run(self):
+        while True:
+            try:
+                if await self.claim_interval():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception(self.FAILURE_MESSAGE)
+
+            await asyncio.sleep(self.interval)
+
+    async def claim_interval(self) -> bool:
+        """ True if this process runs the job in the current interval. """
+
+        if self.lock_key is None:
+            return True
+
+        return bool(await self.redis.set(self.lock_key, 1, ex=max(int(self.interval), 1), nx=True))
+
+    async def run_once(self):
+        raise NotImplementedError
+
+
+class StreamConsumer(BackgroundService):
+    """
+    Service consuming the entries of a Redis stream in its consumer group.
+
+    The entries of a crashed consumer are claimed once they're idle for the
+    claim time, then the own pending entries are read before the new ones.
+    The handler acknowledges the entries it's done with, the failed batch
+    stays pending and is read again after the growing delay.
+    """
+
+    STREAM: str
+    GROUP: str
+
+    FAILURE_MESSAGE = 'Failed to handle the stream batch.'
+
+    def __init__(
+            self,
+            redis: Redis,
+            consumer: str = "bot",
+            batch_size: int = 100,
+            block: int = 1000,
+            claim_idle: int = 60000,
+            retry_delay: float = 1.0,
+            max_retry_delay: float = 30.0,
+    ):
+        super().__init__()
+
+        self.redis = redis
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.block = block
+        self.claim_idle = claim_idle
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self.logger = logging.getLogger('bot')
+
+    async def start(self):
+        """ Start the background consumer. """
+
+        await create_group(self.redis, self.STREAM, self.GROUP)
+        await super().start()
+
+    async def run(self):
+        retry_delay = self.retry_delay
+
+        while True:
+            try:
+                entries = await self._read()
+
+                if len(entries) == 0:
+                    continue
+
+                if await self.handle(entries):
+                    retry_delay = self.retry_delay
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception(self.FAILURE_MESSAGE)
+
+            # The batch stays pending and is read again after the delay.
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, self.max_retry_delay)
+
+    async def handle(self, entries: list[tuple[str, dict]]) -> bool:
+        """ Handle the batch, False if it failed and must be read again after the delay. """
+
+        raise NotImplementedError
+
+    async def _read(self) -> list[tuple[str, dict]]:
+        # Entries of a crashed consumer.
+        _, entries, *_ = await self.redis.xautoclaim(
+            self.STREAM,
+            self.GROUP,
+            self.consumer,
+            min_idle_time=self.claim_idle,
+            count=self.batch_size,
+        )
+        if len(entries) != 0:
+            return entries
+
+        # Own entries which failed to be handled.
+        entries = self._entries(await self.redis.xreadgroup(
+            self.GROUP,
+            self.consumer,
+            {self.STREAM: "0"},
+            count=self.batch_size,
+        ))
+        if len(entries) != 0:
+            return entries
+
+        # New entries.
+        return self._entries(await self.redis.xreadgroup(
+            self.GROUP,
+            self.consumer,
+            {self.STREAM: ">"},
+            count=self.batch_size,
+            block=self.block,
+        ))
+
+    @staticmethod
+    def _entries(response) -> list[tuple[str, dict]]:
+        if not response:
+            return []
+
+        # Skip the entries deleted while pending.
+        return [(entry_id, fields) for entry_id, fields in response[0][1] if fields]
@@ -0,0 +1,104 @@
+import logging
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from src.models import UserModel
+from src.services.backend import BackendClient
+from src.services.background import PeriodicService
+from src.services.user_cache import UserCache
+
+
+class BanList(PeriodicService):
+    """
+    Telegram IDs of the banned Users in Redis.
+
+    Every banned User is a field of one hash, so the update of a banned User
+    is dropped by a single HGET before any backend call. The value counts the
+    restriction claims, the User is restricted by the first one only.
+
+    The list is filled as the Users are resolved and refreshed from the
+    backend periodically, so the roles changed by the admins are picked up.
+    The cached Users removed from the list are dropped from the cache, so the
+    unbanned User isn't banned again by the stale roles.
+    """
+
+    KEY = "users:banned"
+    REFRESH_LOCK_KEY = "users:banned:refresh"
+
+    # Replace the banned IDs, keeping the restriction claims of the Users still banned. Returns the removed IDs.
+    REPLACE_SCRIPT = """
+        local claims = {}
+        local entries = redis.call('HGETALL', KEYS[1])
+        for i = 1, #entries, 2 do
+            claims[entries[i]] = entries[i + 1]
+        end
+        redis.call('DEL', KEYS[1])
+        for i = 1, #ARGV do
+            redis.call('HSET', KEYS[1], ARGV[i], claims[ARGV[i]] or '0')
+            claims[ARGV[i]] = nil
+        end
+        local removed = {}
+        for telegram_id in pairs(claims) do
+            table.insert(removed, telegram_id)
+        end
+        return removed
+    """
+
+    FAILURE_MESSAGE = 'Failed to refresh the ban list.'
+
+    def __init__(self, redis: Redis, backend: BackendClient, cache: UserCache, refresh_interval: int = 60):
+        # One process refreshes the list per interval.
+        super().__init__(refresh_interval, redis, self.REFRESH_LOCK_KEY)
+
+        self.backend = backend
+        self.cache = cache
+
+        self.logger = logging.getLogger('bot.ban_list')
+        self._replace = redis.register_script(self.REPLACE_SCRIPT)
+
+    def queue_get(self, telegram_id: int | str, pipeline: Pipeline):
+        """ Queue getting the ban entry of the User on the pipeline, None if the User isn't banned. """
+
+        pipeline.hget(self.KEY, telegram_id)
+
+    @staticmethod
+    def is_restricted(entry: str) -> bool:
+        return int(entry) > 0
+
+    def queue_sync(self, user: UserModel, pipeline: Pipeline):
+        """ Queue adding or removing the User resolved from the backend on the pipeline. """
+
+        if user.is_banned:
+            pipeline.hsetnx(self.KEY, user.telegram_id, 0)
+        else:
+            pipeline.hdel(self.KEY, user.telegram_id)
+
+    async def claim_restriction(self, telegram_id: int | str) -> bool:
+        """ Ban the User, True if the User wasn't restricted yet. """
+
+        return await self.redis.hincrby(self.KEY, telegram_id, 1) == 1
+
+    async def refresh(self):
+        """ Replace the banned IDs with the ones from the backend. """
+
+        response = await self.backend.get_banned_users()
+
+        if not response.ok:
+            self.logger.warning('Failed to get the banned Users (%s).', response.status_code)
+            return
+
+        removed = await self._replace(keys=[self.KEY], args=response.data)
+
+        # The cached roles of the unbanned Users would put them back to the list.
+        for telegram_id in removed:
+            # Not a lookup of the cache, read without counting it.
+            value = await self.redis.get(self.cache.telegram_id_key(telegram_id))
+
+            if value is not None:
+                await self.cache.invalidate(UserModel.decode(value))
+
+        self.logger.info('Refreshed the ban list, %s Users are banned, %s unbanned.', len(response.data), len(removed))
+
+    async def run_once(self):
+        await self.refresh()
@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import secrets
+from collections import Counter
+from time import monotonic, time
+from typing import Any, Callable, Coroutine
+
+from redis.asyncio import Redis
+from telegram import Bot
+from telegram.error import Forbidden, TelegramError
+
+from src.services.backend import BackendClient
+from src.services.background import BackgroundService
+from src.services.send_scheduler import Priority, TokenBucket
+
+
+class Broadcaster(BackgroundService):
+    """
+    Resumable broadcast of the message to all registered Users.
+
+    The job state is a Redis hash with the keyset cursor of the Users page,
+    so the broadcast continues from the last page after a restart. Every
+    process runs the loop, the one holding the lease sends the pages and
+    checkpoints each of them; a page interrupted by a crash is sent again.
+    The lease is renewed after every send, as the bulk sends wait behind all
+    other traffic and a page may take longer than the lease.
+
+    The sends go through a small worker pool within the broadcast rate and
+    with the bulk priority of the send scheduler, so the deliveries to the
+    users always go first. The Users who blocked the bot or were deleted are
+    recorded in the unreachable hash.
+    """
+
+    KEY = "broadcast"
+    LEASE_KEY = "broadcast:lease"
+    UNREACHABLE_KEY = "broadcast:unreachable"
+
+    RUNNING = "running"
+    CANCELLED = "cancelled"
+    DONE = "done"
+
+    OUTCOMES = ("sent", "blocked", "deactivated", "failed")
+
+    # KEYS are the state and the lease keys, ARGV are the fields of the new job.
+    START_SCRIPT = """
+        if redis.call('HGET', KEYS[1], 'status') == 'running' then
+            return 0
+        end
+        redis.call('DEL', KEYS[1], KEYS[2])
+        redis.call('HSET', KEYS[1], unpack(ARGV))
+        return 1
+    """
+
+    # KEYS are the state and the lease keys, ARGV are the lease token, TTL (ms) and the broadcast ID.
+    CLAIM_SCRIPT = """
+        if redis.call('HGET', KEYS[1], 'status') ~= 'running' or redis.call('HGET', KEYS[1], 'id') ~= ARGV[3] then
+            return 0
+        end
+        local lease = redis.call('GET', KEYS[2])
+        if lease and lease ~= ARGV[1] then
+            return 0
+        end
+        redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[2])
+        return 1
+    """
+
+    # KEYS are the state, the lease and the unreachable keys, ARGV are the lease token,
+    # the broadcast ID, the cursor, the outcome counts and the unreachable ID/reason pairs.
+    CHECKPOINT_SCRIPT = """
+        if redis.call('GET', KEYS[2]) ~= ARGV[1] or redis.call('HGET', KEYS[1], 'id') ~= ARGV[2] then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], 'cursor', ARGV[3])
+        redis.call('HINCRBY', KEYS[1], 'sent', ARGV[4])
+        redis.call('HINCRBY', KEYS[1], 'blocked', ARGV[5])
+        redis.call('HINCRBY', KEYS[1], 'deactivated', ARGV[6])
+        redis.call('HINCRBY', KEYS[1], 'failed', ARGV[7])
+        for i = 8, #ARGV, 2 do
+            redis.call('HSET', KEYS[3], ARGV[i], ARGV[i + 1])
+        end
+        return 1
+    """
+
+    # KEYS are the state and the lease keys, ARGV are the lease token, the broadcast ID and the finish time.
+    FINISH_SCRIPT = """
+        if redis.call('GET', KEYS[2]) ~= ARGV[1] or redis.call('HGET', KEYS[1], 'id') ~= ARGV[2] then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], 'status', 'done', 'finished_at', ARGV[3])
+        redis.call('DEL', KEYS[2])
+        return 1
+    """
+
+    # KEYS is the lease key, ARGV is the lease token.
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            backend: BackendClient,
+            page_size: int = 100,
+            workers: int = 4,
+            rate: dict = None,
+            lease_ttl: float = 60.0,
+            check_interval: float = 30.0,
+    ):
+        super().__init__()
+
+        self.redis = redis
+        self.backend = backend
+        self.page_size = page_size
+        self.workers = workers
+        self.rate = rate or {"limit": 20, "period": 1.0}
+        self.lease_ttl = lease_ttl
+        self.check_interval = check_interval
+
+        self.logger = logging.getLogger('bot.broadcast')
+        self.token = secrets.token_hex(8)
+
+        self._start = redis.register_script(self.START_SCRIPT)
+        self._claim = redis.register_script(self.CLAIM_SCRIPT)
+        self._checkpoint = redis.register_script(self.CHECKPOINT_SCRIPT)
+        self._finish = redis.register_script(self.FINISH_SCRIPT)
+        self._release = redis.register_script(self.RELEASE_SCRIPT)
+
+        self._bot: Bot | None = None
+        self._on_finish: Callable[[dict], Coroutine[Any, Any, Any]] | None = None
+        self._bucket = TokenBucket(**self.rate)
+        self._wakeup = asyncio.Event()
+
+    async def create(self, admin_id: int, from_chat_id: int, message_id: int) -> bool:
+        """ Create the broadcast of the message, False if another broadcast is running. """
+
+        created = await self._start(keys=[self.KEY, self.LEASE_KEY], args=[
+            "id", secrets.token_hex(8),
+            "status", self.RUNNING,
+            "admin_id", admin_id,
+            "from_chat_id", from_chat_id,
+            "message_id", message_id,
+            "cursor", 0,
+            "started_at", int(time()),
+            *(value for outcome in self.OUTCOMES for value in (outcome, 0)),
+        ])
+
+        if created:
+            self._wakeup.set()
+
+        return bool(created)
+
+    async def cancel(self) -> bool:
+        """ Cancel the running broadcast, its sender stops after the current sends. """
+
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            await pipeline.watch(self.KEY)
+
+            if await pipeline.hget(self.KEY, "status") != self.RUNNING:
+                return False
+
+            pipeline.multi()
+            pipeline.hset(self.KEY, "status", self.CANCELLED)
+            await pipeline.execute()
+
+        return True
+
+    async def status(self) -> dict | None:
+        """ State of the last broadcast, None if there was none. """
+
+        return await self.redis.hgetall(self.KEY) or None
+
+    async def start(self, bot: Bot, on_finish: Callable[[dict], Coroutine[Any, Any, Any]]):
+        """ Start the loop sending the running broadcast in the background, the finished state is passed to the callback. """
+
+        self._bot = bot
+        self._on_finish = on_finish
+        self._wakeup = asyncio.Event()
+        await super().start()
+
+    async def stop(self):
+        """ Stop the loop, the broadcast is continued from its checkpoint. """
+
+        if self._task is None:
+            return
+
+        await super().stop()
+        await self._release(keys=[self.LEASE_KEY], args=[self.token])
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+
+            try:
+                state = await self.redis.hgetall(self.KEY)
+
+                if state.get("status") == self.RUNNING and await self._claim_lease(state["id"]):
+                    await self.send_pages(state)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception('Failed to send the broadcast.')
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def send_pages(self, state: dict):
+        """ Send the pages from the checkpoint while the lease is held and the broadcast is running. """
+
+        cursor = int(state["cursor"])
+
+        self.logger.info('Sending the broadcast from the User %s.', cursor)
+
+        while True:
+            response = await self.backend.get_users_page(after=cursor, limit=self.page_size)
+
+            if not response.ok:
+                self.logger.warning('Failed to get the Users page (%s).', response.status_code)
+                return
+
+            if len(response.data) == 0:
+                return await self._finish_broadcast(state["id"])
+
+            outcomes, unreachable, renewed = await self._send_page(
+                state["id"],
+                response.data,
+                int(state["from_chat_id"]),
+                int(state["message_id"]),
+            )
+            cursor = response.data[-1]["id"]
+
+            # The outcomes of the cancelled page are still counted while the lease is held.
+
+            if not await self._checkpoint(
+                    keys=[self.KEY, self.LEASE_KEY, self.UNREACHABLE_KEY],
+                    args=[
+                        self.token,
+                        state["id"],
+                        cursor,
+                        *(outcomes[outcome] for outcome in self.OUTCOMES),
+                        *(value for item in unreachable.items() for value in item),
+                    ],
+            ):
+                self.logger.warning('Lost the broadcast lease at the User %s.', cursor)
+                return
+
+            # Cancelled or taken over during the page.
+            if not renewed:
+                return
+
+    async def _send_page(
+            self,
+            broadcast_id: str,
+            users: list[dict],
+            from_chat_id: int,
+            message_id: int,
+    ) -> tuple[Counter, dict[int, str], bool]:
+        """ Send the page renewing the lease after every send, False with the outcomes if it was lost. """
+
+        outcomes = Counter()
+        unreachable = {}
+        pending = iter(users)
+        renewed = True
+
+        async def worker():
+            nonlocal renewed
+
+            # The workers share the iterator, every User is taken once.
+            for user in pending:
+                await self._throttle()
+
+                if not renewed:
+                    return
+
+                outcome = await self._send(user["telegramId"], from_chat_id, message_id)
+                outcomes[outcome] += 1
+
+                if outcome in ("blocked", "deactivated"):
+                    unreachable[user["telegramId"]] = outcome
+
+                # The lease ends the page once lost, before another process sends it again.
+                if renewed and not await self._claim_lease(broadcast_id):
+                    renewed = False
+                    return
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+
+        return outcomes, unreachable, renewed
+
+    async def _send(self, telegram_id: int, from_chat_id: int, message_id: int) -> str:
+        try:
+            await self._bot.copy_message(
+                chat_id=telegram_id,
+                from_chat_id=from_chat_id,
+                message_id=message_id,
+                rate_limit_args={"priority": Priority.BULK},
+            )
+        except Forbidden as error:
+            return "deactivated" if "deactivated" in error.message else "blocked"
+        except TelegramError as error:
+            self.logger.warning('Failed to send the broadcast to %s: %s', telegram_id, error)
+            return "failed"
+
+        return "sent"
+
+    async def _throttle(self):
+        while True:
+            now = monotonic()
+            ready_at = self._bucket.ready_at(now)
+
+            if ready_at <= now:
+                self._bucket.take(now)
+                return
+
+            await asyncio.sleep(ready_at - now)
+
+    async def _claim_lease(self, broadcast_id: str) -> bool:
+        return bool(await self._claim(
+            keys=[self.KEY, self.LEASE_KEY],
+            args=[self.token, int(self.lease_ttl * 1000), broadcast_id],
+        ))
+
+    async def _finish_broadcast(self, broadcast_id: str):
+        if not await self._finish(keys=[self.KEY, self.LEASE_KEY], args=[self.token, broadcast_id, int(time())]):
+            return
+
+        state = await self.redis.hgetall(self.KEY)
+
+        self.logger.info('Finished the broadcast: %s', state)
+
+        await self._on_finish(state)
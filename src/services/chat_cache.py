@@ -0,0 +1,33 @@
+from telegram import Bot, ChatFullInfo, ChatPhoto
+
+from src.utilities.lru_cache import LRUCache
+
+
+class ChatCache(object):
+    """
+    In-memory cache of the chat info and the avatars used by the reveal cards.
+
+    Avatars are cached as Telegram file IDs of the photos the bot already
+    uploaded, so they are resent without downloading them again.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0, avatar_ttl: float = 86400.0):
+        self.chats = LRUCache(maxsize, ttl)
+        self.avatars = LRUCache(maxsize, avatar_ttl)
+
+    async def get_chat(self, bot: Bot, chat_id: int | str) -> ChatFullInfo:
+        chat = self.chats.get(int(chat_id))
+
+        if chat is None:
+            chat = await bot.get_chat(chat_id)
+            self.chats.set(int(chat_id), chat)
+
+        return chat
+
+    def get_avatar(self, photo: ChatPhoto) -> str | None:
+        """ Get file ID of the already uploaded avatar. """
+
+        return self.avatars.get(photo.small_file_unique_id)
+
+    def store_avatar(self, photo: ChatPhoto, file_id: str):
+        self.avatars.set(photo.small_file_unique_id, file_id)
@@ -0,0 +1,79 @@
+from typing import NamedTuple
+
+from src.models import MessageModel, UserModel
+from src.services.backend import BackendClient
+from src.services.messages import MessageRepository
+from src.services.sessions import Session
+from src.services.users import UserRepository
+
+
+class Delivery(NamedTuple):
+    """ Receiver of the anonymous message, with the original Message for the reply. """
+
+    status_code: int
+    receiver: UserModel | None
+    original_message: MessageModel | None
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200
+
+
+class DeliveryResolver(object):
+    """
+    Resolve the receiver and the replied Message of the anonymous message.
+
+    The consumed session brings the cached receiver and the indexed replied
+    Message, the author of the reply is then taken from the cache. On any
+    miss the whole delivery is resolved by one backend call instead of a
+    call per record, and the returned records are cached in one round trip.
+    """
+
+    def __init__(self, backend: BackendClient, users: UserRepository, messages: MessageRepository):
+        self.backend = backend
+        self.users = users
+        self.messages = messages
+
+    async def resolve(self, sender_id: int | str, session: Session, replied_message_id: int = None) -> Delivery:
+        """ Resolve the receiver by the session's link, otherwise by the replied Message. """
+
+        if session.receiver_link is not None:
+            receiver = self.users.cache.decode_by_link(session.receiver_link, session.receiver)
+
+            if receiver is not None:
+                return Delivery(200, receiver, None)
+
+            return await self._resolve(sender_id, link=session.receiver_link)
+
+        original_message = self.messages.index.decode(session.replied_message)
+
+        if original_message is not None:
+            receiver = await self.users.cache.get_by_telegram_id(original_message.author_id)
+
+            if receiver is not None:
+                return Delivery(200, receiver, original_message)
+
+        return await self._resolve(sender_id, replied_message_id=replied_message_id)
+
+    async def _resolve(self, sender_id: int | str, link: str = None, replied_message_id: int = None) -> Delivery:
+        response = await self.backend.get_delivery(sender_id, link=link, replied_message_id=replied_message_id)
+
+        if not response.ok:
+            return Delivery(response.status_code, None, None)
+
+        data = response.data
+        receiver = UserModel.from_json(data["receiver"]) if data["receiver"] is not None else None
+        original_message = MessageModel.from_json(data["originalMessage"]) if data["originalMessage"] is not None else None
+
+        pipeline = self.users.cache.redis.pipeline(transaction=False)
+
+        # The sender is cached too, so its ban stays in sync.
+        self.users.queue_store(UserModel.from_json(data["sender"]), pipeline)
+        if receiver is not None:
+            self.users.queue_store(receiver, pipeline)
+        if original_message is not None:
+            self.messages.index.queue_store(original_message, pipeline)
+
+        await pipeline.execute()
+
+        return Delivery(200, receiver, original_message)
@@ -0,0 +1,167 @@
+import logging
+import traceback
+from collections import deque
+from time import time
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+
+from src.services.background import PeriodicService
+from src.tracing import current_trace
+
+# Span names of the calls an error is attributed to.
+CALL_SPANS = ("backend ", "telegram ", "redis ")
+
+
+class ErrorGroup(object):
+    """ Errors of one fingerprint within the digest interval. """
+
+    __slots__ = ("count", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.samples: list[tuple[int | None, int | None]] = []
+
+
+class ErrorAggregator(PeriodicService):
+    """
+    Aggregated reporting of the errors to the error notifications channel.
+
+    The errors are grouped by the fingerprint of the error kind, the failed
+    endpoint and the status code. Instead of a post per failure, the channel
+    gets a periodic digest with the count and a few sample UIDs/MIDs of every
+    group, so an outage doesn't flood the channel and take the send budget
+    of the users. The full details of the recent errors are kept in a
+    bounded ring buffer.
+    """
+
+    FAILURE_MESSAGE = 'Failed to post the errors digest.'
+
+    def __init__(
+            self,
+            chat_id: int | str,
+            interval: float = 60.0,
+            max_samples: int = 5,
+            max_groups: int = 20,
+            buffer_size: int = 1000,
+    ):
+        super().__init__(interval)
+
+        self.chat_id = chat_id
+        self.max_samples = max_samples
+        self.max_groups = max_groups
+
+        self.logger = logging.getLogger('bot.errors')
+        self.recent: deque[dict] = deque(maxlen=buffer_size)
+
+        self._groups: dict[tuple[str, str | None, int | str | None], ErrorGroup] = {}
+        self._bot: Bot | None = None
+
+    def report(
+            self,
+            kind: str,
+            endpoint: str = None,
+            status_code: int | str = None,
+            update: Update = None,
+            details: str = None,
+    ):
+        """ Count the error to the next digest and keep its details. """
+
+        fingerprint = (kind, endpoint, status_code)
+        user_id = update.effective_user.id if update is not None and update.effective_user else None
+        message_id = update.effective_message.message_id if update is not None and update.effective_message else None
+
+        group = self._groups.get(fingerprint)
+        if group is None:
+            group = self._groups[fingerprint] = ErrorGroup()
+
+            # Logged once per digest, the repeats are only counted.
+            self.logger.error('%s %s (%s): %s', kind, endpoint or '-', status_code or '-', details or '-')
+
+        group.count += 1
+        if update is not None and len(group.samples) < self.max_samples:
+            group.samples.append((user_id, message_id))
+
+        self.recent.append({
+            "timestamp": time(),
+            "kind": kind,
+            "endpoint": endpoint,
+            "status_code": status_code,
+            "user_id": user_id,
+            "message_id": message_id,
+            "details": details,
+        })
+
+    def report_exception(self, error: BaseException, update: Update = None):
+        """ Count the unhandled exception, attributed to the call which failed in the update's trace. """
+
+        self.report(
+            type(error).__name__,
+            self.failed_call(),
+            update=update,
+            details="".join(traceback.format_exception(error)),
+        )
+
+    @staticmethod
+    def failed_call() -> str | None:
+        trace = current_trace.get()
+
+        if trace is None:
+            return None
+
+        for span in reversed(trace.spans):
+            if span.error is not None and span.name.startswith(CALL_SPANS):
+                return span.name
+
+        return None
+
+    def digest(self) -> str | None:
+        """ Text of the digest of the errors since the last one, None if there were none. """
+
+        if len(self._groups) == 0:
+            return None
+
+        groups = sorted(self._groups.items(), key=lambda item: item[1].count, reverse=True)
+        self._groups = {}
+
+        lines = [f"Errors in the last {self.interval:g}s:"]
+
+        for (kind, endpoint, status_code), group in groups[:self.max_groups]:
+            samples = ", ".join(f"{user_id}/{message_id}" for user_id, message_id in group.samples)
+
+            lines.append(f"\n{group.count}× {kind} {endpoint or '-'} ({status_code or '-'})\nUID/MID: {samples or '-'}")
+
+        if len(groups) > self.max_groups:
+            lines.append(f"\n…and {len(groups) - self.max_groups} more.")
+
+        return "\n".join(lines)
+
+    async def start(self, bot: Bot):
+        """ Start posting the digests in the background. """
+
+        self._bot = bot
+        await super().start()
+
+    async def stop(self):
+        """ Stop posting the digests, the pending errors are posted at once. """
+
+        if self._task is None:
+            return
+
+        await super().stop()
+        await self.post_digest()
+
+    async def run_once(self):
+        await self.post_digest()
+
+    async def post_digest(self):
+        text = self.digest()
+
+        if text is None:
+            return
+
+        try:
+            await self._bot.send_message(chat_id=self.chat_id, text=text)
+        except TelegramError as error:
+            # Not retried, the groups are already in the log.
+            self.logger.warning('Failed to post the errors digest: %s', error)
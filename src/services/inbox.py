@@ -0,0 +1,50 @@
+from orjson import dumps, loads
+
+from redis.asyncio import Redis
+
+from src.services.backend import BackendClient, BackendResponse
+
+
+class Inbox(object):
+    """
+    Pages of the anonymous Messages received by the User.
+
+    The pages come from the keyset-paginated backend endpoint, by the Message
+    ID before or after which the page starts, so paging deep into a large
+    inbox costs the same as the first page. The viewed pages are cached in
+    Redis for a short time, so paging back and forth doesn't hit the backend.
+    The latest page is dropped when a Message to the recipient is recorded
+    and again when it's stored in the backend. The page after the Message
+    ID with no newer Messages would change with the next Message, so it
+    isn't cached at all, the other pages don't change with new Messages.
+    """
+
+    def __init__(self, redis: Redis, backend: BackendClient, page_size: int = 5, ttl: int = 60):
+        self.redis = redis
+        self.backend = backend
+        self.page_size = page_size
+        self.ttl = ttl
+
+    @staticmethod
+    def page_key(recipient_id: int | str, before: int = None, after: int = None) -> str:
+        if after is not None:
+            return f"inbox:{recipient_id}:after:{after}"
+        if before is not None:
+            return f"inbox:{recipient_id}:before:{before}"
+
+        return f"inbox:{recipient_id}:latest"
+
+    async def get_page(self, recipient_id: int | str, before: int = None, after: int = None) -> BackendResponse:
+        """ Get the page before or after the Message ID, the latest one without them. """
+
+        key = self.page_key(recipient_id, before, after)
+
+        page = await self.redis.get(key)
+        if page is not None:
+            return BackendResponse(200, loads(page))
+
+        response = await self.backend.get_inbox(recipient_id, before=before, after=after, limit=self.page_size)
+        if response.ok and (after is None or response.data["hasNewer"]):
+            await self.redis.set(key, dumps(response.data), self.ttl)
+
+        return response
@@ -0,0 +1,56 @@
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from src.models import MessageModel
+
+
+class MessageIndex(object):
+    """
+    Index of the anonymous Messages in Redis.
+
+    Maps the Message in the recipient chat and the Message in the storage
+    channel to the same record the backend stores, so the reply and reveal
+    paths resolve the author with a single GET.
+    """
+
+    def __init__(self, redis: Redis, ttl: int = 604800):
+        self.redis = redis
+        self.ttl = ttl
+
+    @staticmethod
+    def recipient_key(recipient_id: int | str, recipient_chat_message_id: int) -> str:
+        return f"message:recipient:{recipient_id}:{recipient_chat_message_id}"
+
+    @staticmethod
+    def storage_key(storage_message_id: int) -> str:
+        return f"message:storage:{storage_message_id}"
+
+    async def get_by_recipient_chat(self, recipient_id: int | str, recipient_chat_message_id: int) -> MessageModel | None:
+        """ Get the Message by its ID in the recipient chat. """
+
+        return self.decode(await self.redis.get(self.recipient_key(recipient_id, recipient_chat_message_id)))
+
+    async def get_by_storage(self, storage_message_id: int) -> MessageModel | None:
+        """ Get the Message by its ID in the storage channel. """
+
+        return self.decode(await self.redis.get(self.storage_key(storage_message_id)))
+
+    @staticmethod
+    def decode(value: str | None) -> MessageModel | None:
+        return MessageModel.decode(value) if value is not None else None
+
+    async def store(self, message: MessageModel):
+        """ Index the Message by its recipient chat and storage channel IDs. """
+
+        pipeline = self.redis.pipeline(transaction=False)
+        self.queue_store(message, pipeline)
+        await pipeline.execute()
+
+    def queue_store(self, message: MessageModel, pipeline: Pipeline):
+        """ Queue indexing the Message on the pipeline, by the recipient chat only until it's copied to the storage. """
+
+        value = message.encode()
+
+        pipeline.set(self.recipient_key(message.recipient_id, message.recipient_chat_message_id), value, self.ttl)
+        if message.storage_message_id is not None:
+            pipeline.set(self.storage_key(message.storage_message_id), value, self.ttl)
@@ -0,0 +1,96 @@
+import secrets
+from typing import NamedTuple
+
+from redis.asyncio import Redis
+
+
+class LimitCheck(NamedTuple):
+    """ Result of the limits check, the exceeded limit is None if the send is allowed. """
+
+    exceeded: str | None
+    retry_after: float
+
+    @property
+    def allowed(self) -> bool:
+        return self.exceeded is None
+
+
+class MessageLimits(object):
+    """
+    Sliding-window limits of the anonymous messages in Redis.
+
+    Every limit keeps the timestamps of the recent sends in a sorted set. The
+    limits of one send are checked and taken in a single script, so the send
+    is either counted by all of them or by none, and concurrent workers never
+    let extra sends through.
+
+    The sender limit counts all messages of the User. The receiver and pair
+    limits count the sessions opened by the receiver link, as every anonymous
+    message by the link needs its own session.
+    """
+
+    # KEYS are the limit keys, ARGV are the send ID and the limit/window (ms) pairs of the keys.
+    TAKE_SCRIPT = """
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+        for i, key in ipairs(KEYS) do
+            local limit = tonumber(ARGV[i * 2])
+            local window = tonumber(ARGV[i * 2 + 1])
+            redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+            if redis.call('ZCARD', key) >= limit then
+                local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+                return {i, tonumber(oldest[2]) + window - now}
+            end
+        end
+        for i, key in ipairs(KEYS) do
+            redis.call('ZADD', key, now, ARGV[1])
+            redis.call('PEXPIRE', key, ARGV[i * 2 + 1])
+        end
+        return {0, 0}
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            sender: dict = None,
+            receiver: dict = None,
+            pair: dict = None,
+    ):
+        self.redis = redis
+        self.limits = {
+            "sender": sender or {"limit": 20, "window": 60},
+            "receiver": receiver or {"limit": 60, "window": 60},
+            "pair": pair or {"limit": 5, "window": 60},
+        }
+
+        self._take = redis.register_script(self.TAKE_SCRIPT)
+
+    async def take_message(self, sender_id: int | str) -> LimitCheck:
+        """ Count the message of the sender. """
+
+        return await self._take_limits({
+            "sender": f"limit:sender:{sender_id}",
+        })
+
+    async def take_session(self, sender_id: int | str, receiver_link: str) -> LimitCheck:
+        """ Count the session opened by the receiver link. """
+
+        return await self._take_limits({
+            "receiver": f"limit:receiver:{receiver_link}",
+            "pair": f"limit:pair:{sender_id}:{receiver_link}",
+        })
+
+    async def _take_limits(self, keys: dict[str, str]) -> LimitCheck:
+        names = list(keys)
+        args = [secrets.token_hex(8)]
+
+        for name in names:
+            args.append(self.limits[name]["limit"])
+            args.append(int(self.limits[name]["window"] * 1000))
+
+        exceeded, retry_after = await self._take(keys=list(keys.values()), args=args)
+
+        if exceeded == 0:
+            return LimitCheck(None, 0.0)
+
+        return LimitCheck(names[exceeded - 1], retry_after / 1000)
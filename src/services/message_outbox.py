@@ -0,0 +1,82 @@
+import logging
+from orjson import dumps, loads
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from src.models import MessageModel
+from src.services.backend import BackendClient
+from src.services.background import StreamConsumer
+from src.services.inbox import Inbox
+
+
+class MessageOutbox(StreamConsumer):
+    """
+    Durable write-behind queue of the Messages to store in the backend.
+
+    Messages are appended to a Redis stream and a background consumer stores
+    them in batches through POST /api/message/bulk. An entry is acknowledged
+    only after the backend stored it, so a failed batch stays pending and is
+    retried; the endpoint is idempotent on the storage Message ID. The cached
+    latest inbox pages of the recipients are dropped along with it.
+    """
+
+    STREAM = "outbox:messages"
+    DEAD_LETTER_STREAM = "outbox:messages:dead"
+    GROUP = "backend"
+
+    FAILURE_MESSAGE = 'Failed to store the outbox batch.'
+
+    def __init__(self, redis: Redis, backend: BackendClient, **kwargs):
+        super().__init__(redis, **kwargs)
+
+        self.backend = backend
+
+        self.logger = logging.getLogger('bot.outbox')
+
+    async def push(self, message: MessageModel):
+        """ Append the Message to the outbox. """
+
+        await self.redis.xadd(self.STREAM, {"message": dumps(message.to_json())})
+
+    def queue_push(self, message: MessageModel, pipeline: Pipeline):
+        """ Queue appending the Message to the outbox on the pipeline. """
+
+        pipeline.xadd(self.STREAM, {"message": dumps(message.to_json())})
+
+    async def handle(self, entries: list[tuple[str, dict]]) -> bool:
+        ids = [entry_id for entry_id, _ in entries]
+        messages = [loads(fields["message"]) for _, fields in entries]
+
+        response = await self.backend.create_messages(messages)
+
+        if response.ok:
+            await self._acknowledge(ids, {message["recipientId"] for message in messages})
+            return True
+
+        # The batch will never be accepted, keep it aside for the manual review.
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            self.logger.error('Backend rejected the outbox batch (%s).', response.status_code)
+
+            pipeline = self.redis.pipeline(transaction=False)
+            for _, fields in entries:
+                pipeline.xadd(self.DEAD_LETTER_STREAM, fields)
+            await pipeline.execute()
+
+            await self._acknowledge(ids)
+            return True
+
+        self.logger.warning('Backend failed to store the outbox batch (%s).', response.status_code)
+
+        return False
+
+    async def _acknowledge(self, ids: list[str], recipient_ids: set[int] = frozenset()):
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.xack(self.STREAM, self.GROUP, *ids)
+        pipeline.xdel(self.STREAM, *ids)
+
+        # The page could be cached between the Message was queued and stored.
+        for recipient_id in recipient_ids:
+            pipeline.delete(Inbox.page_key(recipient_id))
+
+        await pipeline.execute()
@@ -0,0 +1,90 @@
+from redis.asyncio.client import Pipeline
+
+from src.const import NOT_LOADED
+from src.models import MessageModel
+from src.services.backend import BackendClient, BackendResponse
+from src.services.inbox import Inbox
+from src.services.message_index import MessageIndex
+from src.services.message_outbox import MessageOutbox
+from src.services.stats import StatsCounters
+
+
+class MessageRepository(object):
+    """
+    Resolve and record the anonymous Messages through the index in front of the backend.
+
+    The data of the successful responses is the Message model.
+    """
+
+    def __init__(self, backend: BackendClient, index: MessageIndex, outbox: MessageOutbox, stats: StatsCounters):
+        self.backend = backend
+        self.index = index
+        self.outbox = outbox
+        self.stats = stats
+
+    async def get_by_recipient_chat(
+            self,
+            recipient_id: int | str,
+            recipient_chat_message_id: int,
+            index_entry: str | None | object = NOT_LOADED,
+    ) -> BackendResponse:
+        """
+        Get the Message by its ID in the recipient chat.
+
+        Takes the index entry if it was already fetched along with other keys.
+        """
+
+        if index_entry is NOT_LOADED:
+            message = await self.index.get_by_recipient_chat(recipient_id, recipient_chat_message_id)
+        else:
+            message = self.index.decode(index_entry)
+
+        if message is not None:
+            return BackendResponse(200, message)
+
+        return await self._resolve(await self.backend.get_message(
+            recipient_id=recipient_id,
+            recipient_chat_message_id=recipient_chat_message_id,
+        ))
+
+    async def get_by_storage(self, storage_message_id: int) -> BackendResponse:
+        message = await self.index.get_by_storage(storage_message_id)
+        if message is not None:
+            return BackendResponse(200, message)
+
+        return await self._resolve(await self.backend.get_message_from_storage(storage_message_id))
+
+    async def create(self, message: MessageModel):
+        """ Index, count and queue the Message to be stored in the backend, in one round trip. """
+
+        await self.create_many([message])
+
+    async def create_many(self, messages: list[MessageModel]):
+        """ Index, count and queue the Messages to be stored in the backend, in one round trip. """
+
+        pipeline = self.index.redis.pipeline(transaction=False)
+
+        for message in messages:
+            self.queue_create(message, pipeline)
+
+        await pipeline.execute()
+
+    def queue_create(self, message: MessageModel, pipeline: Pipeline):
+        """ Queue indexing, counting and storing the Message on the pipeline. """
+
+        self.index.queue_store(message, pipeline)
+        self.outbox.queue_push(message, pipeline)
+        self.stats.queue_message(message, pipeline)
+        # The latest inbox page of the recipient is stale.
+        pipeline.delete(Inbox.page_key(message.recipient_id))
+
+    async def _resolve(self, response: BackendResponse) -> BackendResponse:
+        """ Decode the Message resolved from the backend and index it. """
+
+        if not response.ok:
+            return response
+
+        message = MessageModel.from_json(response.data)
+        await self.index.store(message)
+
+        return BackendResponse(response.status_code, message)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from time import perf_counter
+
+from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError, ResponseError
+
+from src.metrics import REDIS_LATENCY
+from src.tracing import record_span
+from src.utilities.env import Env
+
+
+class InstrumentedPipeline(Pipeline):
+    """ Pipeline timing its round trip. """
+
+    async def execute(self, raise_on_error: bool = True):
+        commands = len(self.command_stack)
+        started_at = perf_counter()
+        error = None
+
+        try:
+            return await super().execute(raise_on_error)
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            duration = perf_counter() - started_at
+
+            REDIS_LATENCY.labels("PIPELINE").observe(duration)
+            record_span("redis PIPELINE", started_at, duration, error, commands=commands)
+
+
+class InstrumentedRedis(Redis):
+    """ Redis client timing every command, the scripts included. """
+
+    async def execute_command(self, *args, **options):
+        started_at = perf_counter()
+        error = None
+
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            duration = perf_counter() - started_at
+
+            REDIS_LATENCY.labels(args[0]).observe(duration)
+            record_span(f"redis {args[0]}", started_at, duration, error)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def create_redis(settings: dict, env: Env) -> Redis:
+    """
+    Create the async Redis client with the connection pool.
+
+    The host, port and password from env override the ones from settings.json.
+    """
+
+    pool = ConnectionPool(
+        host=env.REDIS_HOST or settings["host"],
+        port=int(env.REDIS_PORT or settings["port"]),
+        db=settings["db"],
+        password=env.REDIS_PASSWORD or None,
+        max_connections=settings["max_connections"],
+        socket_timeout=settings["socket_timeout"],
+        socket_connect_timeout=settings["socket_connect_timeout"],
+        health_check_interval=settings["health_check_interval"],
+        decode_responses=True,
+    )
+
+    return InstrumentedRedis(connection_pool=pool)
+
+
+async def check_redis(redis: Redis, retries: int = 5, delay: float = 1.0):
+    """ Make sure Redis is reachable, retrying while it's starting up. """
+
+    logger = logging.getLogger('bot.redis')
+
+    for attempt in range(1, retries + 1):
+        try:
+            await redis.ping()
+            return
+        except RedisError as error:
+            if attempt == retries:
+                raise
+
+            logger.warning('Redis is not reachable (%s), retrying in %.1fs.', error, delay)
+            await asyncio.sleep(delay)
+
+
+async def create_group(redis: Redis, stream: str, group: str):
+    """ Create the consumer group of the stream reading it from the start, unless it exists. """
+
+    try:
+        await redis.xgroup_create(stream, group, id="0", mkstream=True)
+    except ResponseError as error:
+        # The group already exists.
+        if "BUSYGROUP" not in str(error):
+            raise
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+from collections import deque
+from enum import IntEnum
+from time import monotonic
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.metrics import SEND_QUEUE_DEPTH, SEND_WAIT
+from src.tracing import span
+
+
+class Priority(IntEnum):
+    """ Priority of the outbound send, the lower value is sent first. """
+
+    USER = 0
+    STORAGE = 1
+    ERROR = 2
+    BULK = 3
+
+
+# Bot API methods which send a message to the chat.
+SEND_ENDPOINTS = frozenset((
+    "sendMessage",
+    "copyMessage",
+    "copyMessages",
+    "forwardMessage",
+    "forwardMessages",
+    "sendMediaGroup",
+    "sendPhoto",
+    "sendAudio",
+    "sendDocument",
+    "sendVideo",
+    "sendAnimation",
+    "sendVoice",
+    "sendVideoNote",
+    "sendSticker",
+    "sendLocation",
+    "sendVenue",
+    "sendContact",
+    "sendPoll",
+    "sendDice",
+))
+
+
+class TokenBucket(object):
+    """ Token bucket of the send budget, paused on the Telegram flood limit. """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "paused_until")
+
+    def __init__(self, limit: int, period: float):
+        self.rate = limit / period
+        self.capacity = limit
+        self.tokens = float(limit)
+        self.updated_at = monotonic()
+        self.paused_until = 0.0
+
+    def ready_at(self, now: float) -> float:
+        """ Time when the bucket has a token. """
+
+        self._refill(now)
+
+        if self.tokens >= 1:
+            return max(now, self.paused_until)
+
+        return max(now + (1 - self.tokens) / self.rate, self.paused_until)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class SendJob(object):
+    __slots__ = ("chat_id", "priority", "enqueued_at", "permit", "retries")
+
+    def __init__(self, chat_id: int, priority: Priority):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.enqueued_at = monotonic()
+        self.permit = asyncio.get_running_loop().create_future()
+        self.retries = 0
+
+
+class SendScheduler(BaseRateLimiter[dict]):
+    """
+    Scheduler of the outbound Telegram sends.
+
+    Every send waits for a permit within the global and the per-chat budget.
+    Permits are granted by the priority: deliveries to the users go before
+    the storage channel, the error channel and the bulk traffic. On
+    "RetryAfter" the whole chat is paused once and its sends are retried
+    after the pause instead of each of them hitting the limit again.
+
+    The priority is taken from the "priority" key of the "rate_limit_args",
+    otherwise it's derived from the destination chat.
+    """
+
+    MAX_BUCKETS = 10000
+
+    def __init__(
+            self,
+            chat_priorities: dict[int | str, Priority] = None,
+            global_limit: dict = None,
+            private_chat_limit: dict = None,
+            group_chat_limit: dict = None,
+            max_retries: int = 3,
+    ):
+        self.chat_priorities = {int(chat_id): priority for chat_id, priority in (chat_priorities or {}).items()}
+        self.private_chat_limit = private_chat_limit or {"limit": 3, "period": 3.0}
+        self.group_chat_limit = group_chat_limit or {"limit": 20, "period": 60.0}
+        self.max_retries = max_retries
+
+        self.logger = logging.getLogger('bot.send_scheduler')
+
+        self._global = TokenBucket(**(global_limit or {"limit": 30, "period": 1.0}))
+        self._buckets: dict[int, TokenBucket] = {}
+        self._queues: dict[Priority, deque[SendJob]] = {priority: deque() for priority in Priority}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        # Sent count and total/max time waited for the permit by the priority.
+        self._sent = {priority: 0 for priority in Priority}
+        self._wait_time = {priority: 0.0 for priority in Priority}
+        self._max_wait_time = {priority: 0.0 for priority in Priority}
+
+    async def initialize(self) -> None:
+        # Called again by the updater's initialization of the bot.
+        if self._task is not None:
+            return
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+
+    async def process_request(
+            self,
+            callback: Callable[..., Coroutine[Any, Any, bool | dict | None]],
+            args: Any,
+            kwargs: dict,
+            endpoint: str,
+            data: dict,
+            rate_limit_args: dict | None,
+    ) -> bool | dict | None:
+        if endpoint not in SEND_ENDPOINTS or "chat_id" not in data:
+            return await callback(*args, **kwargs)
+
+        chat_id = int(data["chat_id"])
+        job = SendJob(chat_id, self._priority(chat_id, rate_limit_args))
+        self._enqueue(job)
+
+        while True:
+            with span("send_scheduler wait", priority=job.priority.name, retries=job.retries):
+                await job.permit
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as error:
+                if job.retries >= self.max_retries:
+                    raise
+
+                # Hold all sends to the chat until the flood limit is over.
+                self._bucket(chat_id).pause(monotonic() + error.retry_after)
+
+                job.retries += 1
+                job.permit = asyncio.get_running_loop().create_future()
+                self._enqueue(job, retry=True)
+
+    def stats(self) -> dict:
+        """ Queue depth and permit wait time by the priority. """
+
+        return {
+            priority.name: {
+                "queued": len(self._queues[priority]),
+                "sent": self._sent[priority],
+                "average_wait_time": self._wait_time[priority] / self._sent[priority] if self._sent[priority] else 0.0,
+                "max_wait_time": self._max_wait_time[priority],
+            }
+            for priority in Priority
+        }
+
+    def _priority(self, chat_id: int, rate_limit_args: dict | None) -> Priority:
+        if rate_limit_args and "priority" in rate_limit_args:
+            return Priority(rate_limit_args["priority"])
+
+        return self.chat_priorities.get(chat_id, Priority.USER)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_BUCKETS:
+                self._prune()
+
+            # Private chats have positive IDs, groups and channels have negative ones.
+            bucket = TokenBucket(**(self.private_chat_limit if chat_id > 0 else self.group_chat_limit))
+            self._buckets[chat_id] = bucket
+
+        return bucket
+
+    def _prune(self):
+        now = monotonic()
+
+        for chat_id in [chat_id for chat_id, bucket in self._buckets.items() if bucket.is_idle(now)]:
+            del self._buckets[chat_id]
+
+    def _enqueue(self, job: SendJob, retry: bool = False):
+        if retry:
+            self._queues[job.priority].appendleft(job)
+        else:
+            self._queues[job.priority].append(job)
+
+        SEND_QUEUE_DEPTH.labels(job.priority.name).set(len(self._queues[job.priority]))
+
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+
+            next_check = self._dispatch(monotonic())
+            timeout = None if next_check is None else max(next_check - monotonic(), 0.0)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self, now: float) -> float | None:
+        """ Grant the permits to the ready sends, return the time of the next check. """
+
+        next_check = None
+
+        for priority in Priority:
+            queue = self._queues[priority]
+            blocked = deque()
+
+            while len(queue) != 0:
+                global_ready_at = self._global.ready_at(now)
+                if global_ready_at > now:
+                    blocked.extend(queue)
+                    self._queues[priority] = blocked
+                    SEND_QUEUE_DEPTH.labels(priority.name).set(len(blocked))
+
+                    return global_ready_at if next_check is None else min(next_check, global_ready_at)
+
+                job = queue.popleft()
+
+                # The sender gave up waiting.
+                if job.permit.done():
+                    continue
+
+                bucket = self._bucket(job.chat_id)
+                ready_at = bucket.ready_at(now)
+
+                if ready_at > now:
+                    blocked.append(job)
+                    next_check = ready_at if next_check is None else min(next_check, ready_at)
+                    continue
+
+                bucket.take(now)
+                self._global.take(now)
+
+                wait_time = now - job.enqueued_at
+                self._sent[priority] += 1
+                self._wait_time[priority] += wait_time
+                self._max_wait_time[priority] = max(self._max_wait_time[priority], wait_time)
+                SEND_WAIT.labels(priority.name).observe(wait_time)
+
+                job.permit.set_result(None)
+
+            self._queues[priority] = blocked
+            SEND_QUEUE_DEPTH.labels(priority.name).set(len(blocked))
+
+        return next_check
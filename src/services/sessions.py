@@ -0,0 +1,56 @@
+from typing import NamedTuple
+
+from redis.asyncio import Redis
+
+from src.const import NOT_LOADED
+from src.services.message_index import MessageIndex
+from src.services.user_cache import UserCache
+
+
+class Session(NamedTuple):
+    """ Consumed session with the cache entries fetched along with it. """
+
+    receiver_link: str | None
+    # Raw cache entry of the receiver, "NOT_LOADED" without the receiver link.
+    receiver: str | None | object
+    # Raw index entry of the replied Message, "NOT_LOADED" without the reply.
+    replied_message: str | None | object
+
+
+class SessionStore(object):
+    """
+    Sessions of the Users sending the anonymous message by the receiver link.
+    """
+
+    def __init__(self, redis: Redis, ttl: int = 1800):
+        self.redis = redis
+        self.ttl = ttl
+
+    @staticmethod
+    def key(user_id: int | str) -> str:
+        return f"session:{user_id}:message"
+
+    async def open(self, user_id: int | str, receiver_link: str):
+        await self.redis.set(self.key(user_id), receiver_link, self.ttl)
+
+    async def consume(self, user_id: int | str, replied_message_id: int = None) -> Session:
+        """
+        Get and delete the session atomically.
+
+        The replied Message is fetched in the same round trip. The receiver
+        cache key is only known from the session, so the cached receiver is
+        fetched in the second one.
+        """
+
+        async with self.redis.pipeline() as pipeline:
+            pipeline.getdel(self.key(user_id))
+            if replied_message_id is not None:
+                pipeline.get(MessageIndex.recipient_key(user_id, replied_message_id))
+
+            receiver_link, *replied_message = await pipeline.execute()
+
+        return Session(
+            receiver_link=receiver_link,
+            receiver=await self.redis.get(UserCache.link_key(receiver_link)) if receiver_link else NOT_LOADED,
+            replied_message=replied_message[0] if replied_message_id is not None else NOT_LOADED,
+        )
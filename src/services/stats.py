@@ -0,0 +1,199 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from orjson import loads
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from src.models import MessageModel
+from src.services.backend import BackendClient
+from src.services.background import PeriodicService
+from src.services.message_outbox import MessageOutbox
+
+
+class StatsCounters(PeriodicService):
+    """
+    Counters of the Users and Messages in Redis, updated as the events happen.
+
+    Every Message increments the sent count of its author, the received
+    count of its recipient and the global total, and adds the author to the
+    HyperLogLog of the day's active senders. Reading the stats is a few
+    O(1) commands however large the backend tables are.
+
+    The totals are reconciled with the backend periodically, the counters of
+    the User are taken from the backend once, on the first read.
+    """
+
+    TOTALS_KEY = "stats:totals"
+    RECONCILE_LOCK_KEY = "stats:reconcile"
+
+    FAILURE_MESSAGE = 'Failed to reconcile the stats.'
+
+    # Take the User's counts from the backend unless they were already taken, along with the
+    # local increments made since the snapshot of the counters, which the backend counts miss.
+    RECONCILE_USER_SCRIPT = """
+        if redis.call('HEXISTS', KEYS[1], 'reconciled') == 1 then
+            return 0
+        end
+        local sent = tonumber(redis.call('HGET', KEYS[1], 'sent') or 0) - tonumber(ARGV[3])
+        local received = tonumber(redis.call('HGET', KEYS[1], 'received') or 0) - tonumber(ARGV[4])
+        redis.call('HSET', KEYS[1], 'sent', ARGV[1] + sent, 'received', ARGV[2] + received, 'reconciled', 1)
+        return 1
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            backend: BackendClient,
+            reconcile_interval: int = 3600,
+            active_days: int = 7,
+    ):
+        # One process reconciles the totals per interval.
+        super().__init__(reconcile_interval, redis, self.RECONCILE_LOCK_KEY)
+
+        self.backend = backend
+        self.active_days = active_days
+
+        self.logger = logging.getLogger('bot.stats')
+        self._reconcile_user = redis.register_script(self.RECONCILE_USER_SCRIPT)
+
+    @staticmethod
+    def user_key(telegram_id: int | str) -> str:
+        return f"stats:user:{telegram_id}"
+
+    @staticmethod
+    def active_key(day: datetime) -> str:
+        return f"stats:active:{day:%Y%m%d}"
+
+    async def count_user(self):
+        """ Count the registered User. """
+
+        await self.redis.hincrby(self.TOTALS_KEY, "users", 1)
+
+    def queue_message(self, message: MessageModel, pipeline: Pipeline):
+        """ Queue counting the Message on the pipeline. """
+
+        active_key = self.active_key(datetime.now(timezone.utc))
+
+        pipeline.hincrby(self.user_key(message.author_id), "sent", 1)
+        pipeline.hincrby(self.user_key(message.recipient_id), "received", 1)
+        pipeline.hincrby(self.TOTALS_KEY, "messages", 1)
+        pipeline.pfadd(active_key, message.author_id)
+        # The day is counted in the union of the last days until it's out of the range.
+        pipeline.expire(active_key, int(timedelta(days=self.active_days + 1).total_seconds()))
+
+    async def get_user(self, telegram_id: int | str) -> dict:
+        """ Sent and received counts of the User. """
+
+        counts = await self.redis.hgetall(self.user_key(telegram_id))
+
+        if "reconciled" not in counts:
+            await self.reconcile_user(telegram_id)
+            counts = await self.redis.hgetall(self.user_key(telegram_id))
+
+        return {
+            "sent": int(counts.get("sent", 0)),
+            "received": int(counts.get("received", 0)),
+        }
+
+    async def get_totals(self) -> dict:
+        """ Global totals and the active senders of today and of the last days. """
+
+        today = datetime.now(timezone.utc)
+
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hgetall(self.TOTALS_KEY)
+        pipeline.pfcount(self.active_key(today))
+        pipeline.pfcount(*(self.active_key(today - timedelta(days=days)) for days in range(self.active_days)))
+
+        totals, active_today, active_days = await pipeline.execute()
+
+        return {
+            "users": int(totals.get("users", 0)),
+            "messages": int(totals.get("messages", 0)),
+            "active_today": active_today,
+            "active_days": active_days,
+        }
+
+    async def reconcile_user(self, telegram_id: int | str):
+        """
+        Take the User's counts from the backend, the counts of a User missing there are kept.
+
+        The User's Messages still in the outbox aren't counted by the backend
+        yet, and the ones queued after the snapshot of the counters are added
+        as the increments since the snapshot.
+        """
+
+        response = await self.backend.get_user_stats(telegram_id)
+
+        if not response.ok:
+            self.logger.warning('Failed to get the stats of the User %s (%s).', telegram_id, response.status_code)
+            return
+
+        async with self.redis.pipeline() as pipeline:
+            pipeline.hgetall(self.user_key(telegram_id))
+            pipeline.xrevrange(MessageOutbox.STREAM, count=1)
+
+            counts, last_entry = await pipeline.execute()
+
+        pending_sent, pending_received = await self.count_pending(telegram_id, last_entry[0][0] if last_entry else None)
+
+        await self._reconcile_user(
+            keys=[self.user_key(telegram_id)],
+            args=[
+                response.data["sent"] + pending_sent,
+                response.data["received"] + pending_received,
+                counts.get("sent", 0),
+                counts.get("received", 0),
+            ],
+        )
+
+    async def count_pending(
+            self,
+            telegram_id: int | str,
+            last_entry_id: str | None,
+            page_size: int = 1000,
+    ) -> tuple[int, int]:
+        """ Sent and received counts of the User's Messages in the outbox up to the entry. """
+
+        sent = received = 0
+        start = "-"
+
+        while last_entry_id is not None:
+            entries = await self.redis.xrange(MessageOutbox.STREAM, start, last_entry_id, count=page_size)
+
+            for _, fields in entries:
+                message = loads(fields["message"])
+                sent += str(message["authorId"]) == str(telegram_id)
+                received += str(message["recipientId"]) == str(telegram_id)
+
+            if len(entries) < page_size:
+                break
+
+            start = "(" + entries[-1][0]
+
+        return sent, received
+
+    async def reconcile(self):
+        """ Replace the totals with the backend counts. """
+
+        response = await self.backend.get_stats()
+
+        if not response.ok:
+            self.logger.warning('Failed to get the stats (%s).', response.status_code)
+            return
+
+        # The Messages still in the outbox aren't counted by the backend yet.
+        pending = await self.redis.xlen(MessageOutbox.STREAM)
+
+        totals = {
+            "users": response.data["users"],
+            "messages": response.data["messages"] + pending,
+        }
+
+        await self.redis.hset(self.TOTALS_KEY, mapping=totals)
+
+        self.logger.info('Reconciled the stats: %s', totals)
+
+    async def run_once(self):
+        await self.reconcile()
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from html import escape
+from orjson import dumps, loads
+
+from redis.asyncio import Redis
+from telegram import Bot, ChatFullInfo, Message
+from telegram.constants import MessageLimit, ParseMode
+from telegram.error import BadRequest, Forbidden
+
+from src.models import MessageModel
+from src.services.background import StreamConsumer
+from src.services.chat_cache import ChatCache
+from src.services.messages import MessageRepository
+
+
+class StorageArchive(StreamConsumer):
+    """
+    Copies of the delivered anonymous Messages in the storage channel.
+
+    The handler queues the delivered Messages, indexed by the recipient chat
+    so the replies resolve at once, and goes on. The background consumer
+    copies them to the storage channel at the pace of its send limit, then
+    indexes them by the storage copy and queues them to the outbox, in one
+    transaction with the acknowledgement.
+
+    The card revealing the author and the recipient is a part of the copy,
+    appended to the text or to the caption, so a Message takes one post of
+    the channel's budget. The albums, the media without the caption and the
+    texts too long for the card get the card as a reply to the copy.
+    """
+
+    STREAM = "storage:messages"
+    DEAD_LETTER_STREAM = "storage:messages:dead"
+    GROUP = "storage"
+
+    FAILURE_MESSAGE = 'Failed to copy the Messages to the storage.'
+
+    # The media the copy can take the caption of.
+    CAPTIONED = ("animation", "audio", "document", "photo", "video", "voice")
+
+    def __init__(self, redis: Redis, messages: MessageRepository, chats: ChatCache, chat_id: int | str, **kwargs):
+        super().__init__(redis, **kwargs)
+
+        self.messages = messages
+        self.chats = chats
+        self.chat_id = chat_id
+
+        self.logger = logging.getLogger('bot.storage')
+        self._bot: Bot | None = None
+
+    async def start(self, bot: Bot):
+        """ Start copying the queued Messages in the background. """
+
+        self._bot = bot
+
+        await super().start()
+
+    async def push(self, messages: list[Message], models: list[MessageModel]):
+        """ Index the delivered Messages by the recipient chat and queue them to the storage, in one round trip. """
+
+        pipeline = self.redis.pipeline(transaction=False)
+
+        for model in models:
+            self.messages.index.queue_store(model, pipeline)
+
+        pipeline.xadd(self.STREAM, {
+            "messages": dumps([model.to_json() for model in models]),
+            "content": dumps([self.content(message) for message in messages]),
+        })
+
+        await pipeline.execute()
+
+    @classmethod
+    def content(cls, message: Message) -> tuple[str | None, str | None]:
+        """ Kind of the Message content the card can be appended to, with its HTML. """
+
+        if message.text:
+            return "text", message.text_html
+
+        if message.effective_attachment and any(getattr(message, kind) for kind in cls.CAPTIONED):
+            return "caption", message.caption_html if message.caption else ""
+
+        return None, None
+
+    async def handle(self, entries: list[tuple[str, dict]]) -> bool:
+        # One by one, so the entries already copied aren't copied again when a later one fails.
+        for entry_id, fields in entries:
+            models = [MessageModel.from_json(message) for message in loads(fields["messages"])]
+
+            try:
+                storage_message_ids = await self.copy(models, loads(fields["content"]))
+            except (BadRequest, Forbidden) as error:
+                # The author deleted the Message or the chat, keep it aside for the manual review.
+                self.logger.error('Failed to copy the Messages of the entry %s to the storage: %s', entry_id, error)
+
+                await self._dead_letter(entry_id, fields)
+                continue
+
+            pipeline = self.redis.pipeline()
+
+            for model, storage_message_id in zip(models, storage_message_ids):
+                model.storage_message_id = storage_message_id
+                self.messages.queue_create(model, pipeline)
+
+            pipeline.xack(self.STREAM, self.GROUP, entry_id)
+            pipeline.xdel(self.STREAM, entry_id)
+
+            await pipeline.execute()
+
+        return True
+
+    async def copy(self, models: list[MessageModel], content: list[tuple[str | None, str | None]]) -> list[int]:
+        """ Copy the Messages to the storage with the card, return the IDs of the copies. """
+
+        author, recipient = await asyncio.gather(
+            self.chats.get_chat(self._bot, models[0].author_id),
+            self.chats.get_chat(self._bot, models[0].recipient_id),
+        )
+
+        card = self.card(author, recipient)
+
+        if len(models) == 1:
+            kind, html = content[0]
+            text = f"{html}\n\n{card}" if html else card
+
+            if kind == "text" and self.length(text) <= MessageLimit.MAX_TEXT_LENGTH:
+                sent = await self._bot.send_message(self.chat_id, text, parse_mode=ParseMode.HTML)
+                return [sent.message_id]
+
+            if kind == "caption" and self.length(text) <= MessageLimit.CAPTION_LENGTH:
+                sent = await self._bot.copy_message(
+                    self.chat_id,
+                    from_chat_id=models[0].author_id,
+                    message_id=models[0].author_chat_message_id,
+                    caption=text,
+                    parse_mode=ParseMode.HTML,
+                )
+                return [sent.message_id]
+
+        # The album is copied in one call, keeping it grouped.
+        copies = await self._bot.copy_messages(
+            self.chat_id,
+            from_chat_id=models[0].author_id,
+            message_ids=[model.author_chat_message_id for model in models],
+        )
+
+        await self._bot.send_message(
+            self.chat_id,
+            card,
+            parse_mode=ParseMode.HTML,
+            reply_to_message_id=copies[0].message_id,
+        )
+
+        return [copy.message_id for copy in copies]
+
+    @staticmethod
+    def length(text: str) -> int:
+        """ Length of the text as Telegram counts it, in the UTF-16 code units. """
+
+        return len(text.encode("utf-16-le")) // 2
+
+    @classmethod
+    def card(cls, author: ChatFullInfo, recipient: ChatFullInfo) -> str:
+        """ HTML card revealing the author and the recipient of the Message. """
+
+        return f"<b>Author:</b>\n\n{cls.chat_card(author)}\n\n<b>Recipient:</b>\n\n{cls.chat_card(recipient)}"
+
+    @staticmethod
+    def chat_card(chat: ChatFullInfo) -> str:
+        username = f"@{escape(chat.username)}" if chat.username else "-"
+        first_name = f"<code>{escape(chat.first_name)}</code>" if chat.first_name else "-"
+        last_name = f"<code>{escape(chat.last_name)}</code>" if chat.last_name else "-"
+        link = f"@{chat.username}" if chat.username else chat.id
+
+        return (
+            f"username: {username}\n"
+            f"first name: {first_name}\n"
+            f"last name: {last_name}\n\n"
+            f"<a href=\"https://web.telegram.org/k/#{link}\">Chat (web)</a>\n\n"
+            f"ID: <code>{chat.id}</code>"
+        )
+
+    async def _dead_letter(self, entry_id: str, fields: dict):
+        pipeline = self.redis.pipeline()
+        pipeline.xadd(self.DEAD_LETTER_STREAM, fields)
+        pipeline.xack(self.STREAM, self.GROUP, entry_id)
+        pipeline.xdel(self.STREAM, entry_id)
+
+        await pipeline.execute()
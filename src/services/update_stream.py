@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from json import dumps, loads
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from telegram import Update
+
+from src.services.redis_client import create_group
+
+
+class UpdateStream(object):
+    """
+    Updates passed from the ingest process to the worker processes.
+
+    Updates are partitioned into the shard streams by the User ID, every
+    shard is consumed by a single worker, so the updates of one User are
+    still handled in order. An entry is acknowledged only after it's handled,
+    so the updates held by a crashed worker are handled again once a worker
+    of the shard is back.
+    """
+
+    GROUP = "workers"
+
+    def __init__(
+            self,
+            redis: Redis,
+            shards: int = 4,
+            maxlen: int = 100000,
+            batch_size: int = 100,
+            block: int = 1000,
+            claim_idle: int = 60000,
+            max_in_flight: int = 256,
+    ):
+        self.redis = redis
+        self.shards = shards
+        self.maxlen = maxlen
+        self.batch_size = batch_size
+        self.block = block
+        self.claim_idle = claim_idle
+        self.max_in_flight = max_in_flight
+
+        self.logger = logging.getLogger('bot.update_stream')
+
+    def shard(self, user_id: int | None) -> int:
+        """ Shard of the User's updates, the updates without the User go to the first one. """
+
+        return 0 if user_id is None else user_id % self.shards
+
+    @staticmethod
+    def key(shard: int) -> str:
+        return f"updates:{shard}"
+
+    async def publish(self, update: Update):
+        """ Append the update to the stream of its shard. """
+
+        user_id = update.effective_user.id if update.effective_user else None
+
+        await self.redis.xadd(
+            self.key(self.shard(user_id)),
+            {"update": dumps(update.to_dict())},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    async def consume(self, shard: int, consumer: str, handle: Callable[[dict], Awaitable]):
+        """
+        Handle the updates of the shard until cancelled.
+
+        Updates are handed over to "handle" in the stream order without waiting
+        for the previous ones, "handle" is responsible for the per-User order.
+        """
+
+        key = self.key(shard)
+        slots = asyncio.Semaphore(self.max_in_flight)
+        in_flight = set()
+        tasks = set()
+
+        await create_group(self.redis, key, self.GROUP)
+
+        # Own entries left by the previous run of the worker go first.
+        read_from = "0"
+
+        try:
+            while True:
+                entries = await self._read(key, consumer, read_from)
+
+                if read_from != ">":
+                    # Page through the own pending entries, then switch to the new ones.
+                    read_from = entries[-1][0] if len(entries) == self.batch_size else ">"
+
+                for entry_id, fields in entries:
+                    # Deleted while pending, or claimed back while still being handled.
+                    if not fields or entry_id in in_flight:
+                        continue
+
+                    await slots.acquire()
+
+                    in_flight.add(entry_id)
+                    task = asyncio.create_task(self._handle(key, entry_id, fields, handle, slots, in_flight))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            # Let the updates in flight finish, so they are acknowledged.
+            if len(tasks) != 0:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _read(self, key: str, consumer: str, read_from: str) -> list[tuple[str, dict | None]]:
+        if read_from == ">":
+            # Entries of a crashed worker of the shard.
+            _, entries, *_ = await self.redis.xautoclaim(
+                key,
+                self.GROUP,
+                consumer,
+                min_idle_time=self.claim_idle,
+                count=self.batch_size,
+            )
+            if len(entries) != 0:
+                return entries
+
+        response = await self.redis.xreadgroup(
+            self.GROUP,
+            consumer,
+            {key: read_from},
+            count=self.batch_size,
+            block=self.block if read_from == ">" else None,
+        )
+
+        return response[0][1] if response else []
+
+    async def _handle(
+            self,
+            key: str,
+            entry_id: str,
+            fields: dict,
+            handle: Callable[[dict], Awaitable],
+            slots: asyncio.Semaphore,
+            in_flight: set,
+    ):
+        try:
+            await handle(loads(fields["update"]))
+        except Exception:
+            self.logger.exception('Failed to handle the update %s.', entry_id)
+        finally:
+            slots.release()
+
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.xack(key, self.GROUP, entry_id)
+        pipeline.xdel(key, entry_id)
+        await pipeline.execute()
+
+        in_flight.discard(entry_id)
+
@@ -0,0 +1,113 @@
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from src.metrics import USER_CACHE_LOOKUPS
+from src.models import UserModel
+
+
+class UserCache(object):
+    """
+    Cache of the backend Users in Redis.
+
+    Every User is stored twice, by its Telegram ID and by its link, so
+    both lookups cost a single GET. The entries are the compact encoding of
+    the User model.
+    """
+
+    def __init__(self, redis: Redis, ttl: int = 600):
+        self.redis = redis
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def telegram_id_key(telegram_id: int | str) -> str:
+        return f"user:tid:{telegram_id}"
+
+    @staticmethod
+    def link_key(link: str) -> str:
+        return f"user:link:{link}"
+
+    async def get_by_telegram_id(self, telegram_id: int | str) -> UserModel | None:
+        """ Get cached User by its Telegram ID. """
+
+        return self.decode(await self.redis.get(self.telegram_id_key(telegram_id)))
+
+    async def get_by_link(self, link: str) -> UserModel | None:
+        """ Get cached User by its link. """
+
+        return self.decode_by_link(link, await self.redis.get(self.link_key(link)))
+
+    def decode(self, value: str | None) -> UserModel | None:
+        """ Decode the cache entry fetched by the Telegram ID. """
+
+        return self._count("telegram_id", UserModel.decode(value) if value is not None else None)
+
+    def decode_by_link(self, link: str, value: str | None) -> UserModel | None:
+        """ Decode the cache entry fetched by the link. """
+
+        user = UserModel.decode(value) if value is not None else None
+
+        # The link entry outlived the User's link change.
+        if user is not None and user.link != link:
+            user = None
+
+        return self._count("link", user)
+
+    async def store(self, user: UserModel):
+        """ Cache the User under its Telegram ID and its link. """
+
+        pipeline = self.redis.pipeline(transaction=False)
+        self.queue_store(user, pipeline)
+        await pipeline.execute()
+
+    def queue_store(self, user: UserModel, pipeline: Pipeline):
+        """ Queue caching the User on the pipeline. """
+
+        value = user.encode()
+
+        pipeline.set(self.telegram_id_key(user.telegram_id), value, self.ttl)
+        if user.link is not None:
+            pipeline.set(self.link_key(user.link), value, self.ttl)
+
+    async def replace(self, previous: UserModel | None, user: UserModel):
+        """ Cache the changed User and drop the entry of its previous link. """
+
+        pipeline = self.redis.pipeline(transaction=False)
+
+        if previous is not None and previous.link is not None and previous.link != user.link:
+            pipeline.delete(self.link_key(previous.link))
+
+        self.queue_store(user, pipeline)
+        await pipeline.execute()
+
+    async def invalidate(self, user: UserModel):
+        """ Drop all cached entries of the User. """
+
+        keys = [self.telegram_id_key(user.telegram_id)]
+        if user.link is not None:
+            keys.append(self.link_key(user.link))
+
+        await self.redis.delete(*keys)
+
+    def stats(self) -> dict:
+        """ Hit/miss counters of the cache in this process, the metrics have them across the processes. """
+
+        total = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _count(self, key: str, user: UserModel | None) -> UserModel | None:
+        if user is None:
+            self.misses += 1
+            USER_CACHE_LOOKUPS.labels(key, "miss").inc()
+        else:
+            self.hits += 1
+            USER_CACHE_LOOKUPS.labels(key, "hit").inc()
+
+        return user
@@ -0,0 +1,130 @@
+from redis.asyncio.client import Pipeline
+
+from src.const import NOT_LOADED
+from src.models import UserModel
+from src.services.backend import BackendClient, BackendResponse
+from src.services.ban_list import BanList
+from src.services.user_cache import UserCache
+
+
+class UserRepository(object):
+    """
+    Resolve and change the Users through the cache in front of the backend.
+
+    Every change of the User goes through the backend first and is then
+    written to the cache, so a changed link never resolves to a stale User.
+    The Users resolved from the backend keep the ban list in sync. The data
+    of the successful responses is the User model.
+    """
+
+    def __init__(self, backend: BackendClient, cache: UserCache, ban_list: BanList):
+        self.backend = backend
+        self.cache = cache
+        self.ban_list = ban_list
+
+    async def get_sender(self, telegram_id: int | str) -> tuple[str | None, BackendResponse | None]:
+        """
+        Get the ban entry and the User sending the update.
+
+        The ban list and the cached User are fetched in one round trip, the
+        User known to be banned isn't resolved at all.
+        """
+
+        pipeline = self.cache.redis.pipeline(transaction=False)
+        self.ban_list.queue_get(telegram_id, pipeline)
+        pipeline.get(self.cache.telegram_id_key(telegram_id))
+
+        ban_entry, cache_entry = await pipeline.execute()
+
+        if ban_entry is not None:
+            return ban_entry, None
+
+        return None, await self.get_by_telegram_id(telegram_id, cache_entry)
+
+    async def get_by_telegram_id(
+            self,
+            telegram_id: int | str,
+            cache_entry: str | None | object = NOT_LOADED,
+    ) -> BackendResponse:
+        """
+        Get the User by its Telegram ID.
+
+        Takes the cache entry if it was already fetched along with other keys.
+        """
+
+        if cache_entry is NOT_LOADED:
+            user = await self.cache.get_by_telegram_id(telegram_id)
+        else:
+            user = self.cache.decode(cache_entry)
+
+        if user is not None:
+            return BackendResponse(200, user)
+
+        return await self._resolve(await self.backend.get_user(telegram_id=telegram_id))
+
+    async def get_by_link(self, link: str, cache_entry: str | None | object = NOT_LOADED) -> BackendResponse:
+        """
+        Get the User by its link.
+
+        Takes the cache entry if it was already fetched along with other keys.
+        """
+
+        if cache_entry is NOT_LOADED:
+            user = await self.cache.get_by_link(link)
+        else:
+            user = self.cache.decode_by_link(link, cache_entry)
+
+        if user is not None:
+            return BackendResponse(200, user)
+
+        return await self._resolve(await self.backend.get_user(link=link))
+
+    async def create(self, telegram_id: int | str) -> BackendResponse:
+        return await self._resolve(await self.backend.create_user(telegram_id))
+
+    async def patch(
+            self,
+            user: UserModel,
+            link: str = None,
+            welcome_message: str = None,
+    ) -> BackendResponse:
+        """ Patch the User and write the result through to the cache. """
+
+        response = await self.backend.patch_user(
+            user.telegram_id,
+            link=link,
+            welcome_message=welcome_message,
+        )
+
+        if response.ok:
+            response = BackendResponse(response.status_code, UserModel.from_json(response.data))
+            await self.cache.replace(user, response.data)
+        else:
+            # The backend state is unknown, don't trust the cached User anymore.
+            await self.cache.invalidate(user)
+
+        return response
+
+    async def store(self, user: UserModel):
+        """ Cache the User resolved from the backend and sync its ban, in one round trip. """
+
+        pipeline = self.cache.redis.pipeline(transaction=False)
+        self.queue_store(user, pipeline)
+        await pipeline.execute()
+
+    def queue_store(self, user: UserModel, pipeline: Pipeline):
+        """ Queue caching the User resolved from the backend and syncing its ban on the pipeline. """
+
+        self.cache.queue_store(user, pipeline)
+        self.ban_list.queue_sync(user, pipeline)
+
+    async def _resolve(self, response: BackendResponse) -> BackendResponse:
+        """ Decode the User resolved from the backend and store it. """
+
+        if not response.ok:
+            return response
+
+        user = UserModel.from_json(response.data)
+        await self.store(user)
+
+        return BackendResponse(response.status_code, user)
@@ -0,0 +1,36 @@
+from time import perf_counter
+from typing import Any
+
+from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
+
+from src.metrics import TELEGRAM_ERRORS, TELEGRAM_LATENCY
+from src.tracing import record_span
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """
+    Bot API request timing every call by the method.
+
+    Sits below the send scheduler, so the time waited for the send budget
+    isn't counted.
+    """
+
+    __slots__ = ()
+
+    async def post(self, url: str, *args, **kwargs) -> Any:
+        method = url.rsplit("/", 1)[-1]
+        started_at = perf_counter()
+        error = None
+
+        try:
+            return await super().post(url, *args, **kwargs)
+        except TelegramError as exception:
+            error = exception
+            TELEGRAM_ERRORS.labels(method, type(error).__name__).inc()
+            raise
+        finally:
+            duration = perf_counter() - started_at
+
+            TELEGRAM_LATENCY.labels(method).observe(duration)
+            record_span(f"telegram {method}", started_at, duration, error)
@@ -0,0 +1,175 @@
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from json import dumps
+from time import perf_counter, time
+from typing import Iterator
+
+from telegram import Update
+
+from src.const import ROOT_DIR
+
+
+class Span(object):
+    __slots__ = ("name", "start", "duration", "error", "attributes")
+
+    def __init__(self, name: str, start: float, duration: float, error: str | None, attributes: dict):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.error = error
+        self.attributes = attributes
+
+    def to_dict(self) -> dict:
+        span = {
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+        }
+
+        if self.error is not None:
+            span["error"] = self.error
+        if self.attributes:
+            span.update(self.attributes)
+
+        return span
+
+
+class Trace(object):
+    """ Spans of one update, the offsets are from the moment the update was received. """
+
+    __slots__ = ("update_id", "user_id", "timestamp", "started_at", "duration", "spans", "max_spans", "dropped")
+
+    def __init__(self, update_id: int, user_id: int | None, max_spans: int = 256):
+        self.update_id = update_id
+        self.user_id = user_id
+        self.timestamp = time()
+        self.started_at = perf_counter()
+        self.duration: float | None = None
+        self.spans: list[Span] = []
+        self.max_spans = max_spans
+        self.dropped = 0
+
+    def record(self, name: str, started_at: float, duration: float, error: BaseException = None, **attributes):
+        # The tasks started by the update may outlive it, their late spans are not exported.
+        if self.duration is not None:
+            return
+
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return
+
+        self.spans.append(Span(
+            name,
+            started_at - self.started_at,
+            duration,
+            None if error is None else type(error).__name__,
+            attributes,
+        ))
+
+    def finish(self):
+        self.duration = perf_counter() - self.started_at
+
+    def to_dict(self) -> dict:
+        return {
+            "update_id": self.update_id,
+            "user_id": self.user_id,
+            "timestamp": self.timestamp,
+            "duration": round(self.duration, 6),
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda span: span.start)],
+            "dropped_spans": self.dropped,
+        }
+
+
+# Trace of the update handled in the current task, the tasks it starts inherit it.
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def record_span(name: str, started_at: float, duration: float, error: BaseException = None, **attributes):
+    """ Record the already timed span to the trace of the current update, if there is one. """
+
+    trace = current_trace.get()
+
+    if trace is not None:
+        trace.record(name, started_at, duration, error, **attributes)
+
+
+class span(object):
+    """ Time the block as the span of the current update. """
+
+    __slots__ = ("name", "attributes", "started_at")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = 0.0
+
+    def __enter__(self):
+        self.started_at = perf_counter()
+
+    def __exit__(self, exc_type, exc, traceback):
+        record_span(self.name, self.started_at, perf_counter() - self.started_at, exc, **self.attributes)
+
+
+class Tracer(object):
+    """
+    Trace every update and write out the slow ones.
+
+    The updates slower than the threshold are appended to the JSON Lines file
+    with the breakdown of their spans, to be analysed offline.
+    """
+
+    def __init__(
+            self,
+            enabled: bool = True,
+            slow_update_threshold: float = 2.0,
+            path: str = "slow_updates.jsonl",
+            max_spans: int = 256,
+    ):
+        self.enabled = enabled
+        self.slow_update_threshold = slow_update_threshold
+        self.path = path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+        self.max_spans = max_spans
+
+        self.logger = logging.getLogger('bot.tracing')
+        self._file = None
+
+    @contextmanager
+    def trace(self, update: object) -> Iterator[Trace | None]:
+        if not self.enabled or not isinstance(update, Update):
+            yield None
+            return
+
+        trace = Trace(
+            update.update_id,
+            update.effective_user.id if update.effective_user else None,
+            self.max_spans,
+        )
+        token = current_trace.set(trace)
+
+        try:
+            yield trace
+        finally:
+            current_trace.reset(token)
+            trace.finish()
+
+            if trace.duration >= self.slow_update_threshold:
+                self.export(trace)
+
+    def export(self, trace: Trace):
+        self.logger.warning('Update %s took %.2fs, see %s.', trace.update_id, trace.duration, self.path)
+
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+
+            self._file.write(dumps(trace.to_dict()) + "\n")
+            self._file.flush()
+        except OSError:
+            self.logger.exception('Failed to write the trace of the update %s.', trace.update_id)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
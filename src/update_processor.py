@@ -0,0 +1,144 @@
+import asyncio
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.metrics import UPDATES_HANDLING, UPDATES_IN_FLIGHT
+from src.services.admission import AdmissionControl, UpdatePriority
+from src.services.albums import AlbumCollector
+from src.tracing import Tracer, current_trace
+
+# When the update was admitted to wait for a concurrency slot.
+admitted_at: ContextVar[float] = ContextVar("admitted_at")
+
+
+class UserLock(object):
+    __slots__ = ("lock", "holders")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Count of the updates holding or waiting for the lock.
+        self.holders = 0
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process the updates concurrently, but the updates of the same User in order.
+
+    Updates of one User wait for each other before taking a concurrency slot,
+    so a single busy User never occupies the slots of the others. The lock of
+    the User is dropped as soon as the User has no updates in flight.
+
+    Every update is traced from the moment it's received when the tracer is set.
+    The album items after the first one join its batch without taking the
+    lock, as the first item holds the lock while it collects them.
+
+    With the admission control set, the updates are classified before any
+    I/O, and admitted to wait for a slot by their priority once they are
+    next in the order of the User.
+    """
+
+    __slots__ = ("_locks", "tracer", "albums", "admission")
+
+    def __init__(
+            self,
+            max_concurrent_updates: int,
+            tracer: Tracer = None,
+            albums: AlbumCollector = None,
+            admission: AdmissionControl = None,
+    ):
+        super().__init__(max_concurrent_updates)
+
+        self._locks: dict[int, UserLock] = {}
+        self.tracer = tracer
+        self.albums = albums
+        self.admission = admission
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        trace = self.tracer.trace(update) if self.tracer is not None else nullcontext()
+
+        with UPDATES_IN_FLIGHT.track_inprogress(), trace:
+            await self._process_update(update, coroutine)
+
+    async def _process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if self.admission is None:
+            return await self._process_in_order(update, coroutine, UpdatePriority.DELIVERY)
+
+        priority = self.admission.classify(update)
+
+        if not self.admission.enter(priority):
+            coroutine.close()
+            return
+
+        try:
+            await self._process_in_order(update, coroutine, priority)
+        finally:
+            self.admission.leave()
+
+    async def _process_in_order(self, update: object, coroutine: Awaitable[Any], priority: UpdatePriority) -> None:
+        user = update.effective_user if isinstance(update, Update) else None
+
+        if user is None:
+            return await self._process_admitted(update, coroutine, priority)
+
+        if self.albums is not None and self.albums.add(update):
+            # Handled along with the first item of the album.
+            coroutine.close()
+            return
+
+        user_lock = self._locks.get(user.id)
+        if user_lock is None:
+            user_lock = self._locks[user.id] = UserLock()
+
+        user_lock.holders += 1
+
+        try:
+            async with user_lock.lock:
+                await self._process_admitted(update, coroutine, priority)
+        finally:
+            user_lock.holders -= 1
+
+            if user_lock.holders == 0:
+                del self._locks[user.id]
+
+            if self.albums is not None:
+                self.albums.discard(update)
+
+    async def _process_admitted(self, update: object, coroutine: Awaitable[Any], priority: UpdatePriority) -> None:
+        if self.admission is None:
+            return await super().process_update(update, coroutine)
+
+        if not await self.admission.admit(priority):
+            coroutine.close()
+            return
+
+        admitted_at.set(perf_counter())
+
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self.admission.release()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        trace = current_trace.get()
+
+        # Time waited for the User's previous updates and a free slot.
+        if trace is not None:
+            trace.record("queued", trace.started_at, perf_counter() - trace.started_at)
+
+        # Only the wait for the slot, the Users' own queues and the deferral don't load the others.
+        if self.admission is not None:
+            self.admission.record_wait(perf_counter() - admitted_at.get())
+
+        with UPDATES_HANDLING.track_inprogress():
+            await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
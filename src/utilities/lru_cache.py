@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable
+
+
+class LRUCache(object):
+    """
+    In-memory LRU cache with the entries expiring after the TTL.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at < monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key, None)
+
+        return default if entry is None else entry[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,35 @@
+from json import load
+
+from src.const import ROOT_DIR
+
+
+class Settings(object):
+    """ Project settings from <root>/settings.json """
+
+    BACKEND = None
+
+    def __init__(self):
+        pass
+
+
+def load_settings() -> Settings:
+    """ Load project settings from <root>/settings.json """
+
+    settings_object = Settings()
+
+    # Load project settings.
+    with open('{path}/settings.json'.format(path=ROOT_DIR), 'r') as file:
+        settings = load(file)
+
+    # Set every section except the secrets, which are handled by the env loader.
+    for key, value in settings.items():
+        if key == 'secrets':
+            continue
+
+        setattr(
+            settings_object,
+            key.upper(),
+            value,
+        )
+
+    return settings_object
@@ -0,0 +1,25 @@
+import asyncio
+import inspect
+
+import fakeredis
+import pytest
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem: pytest.Function):
+    """ Run the coroutine tests to the end, each in a new event loop. """
+
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+
+    return True
+
+
+@pytest.fixture
+def redis() -> fakeredis.FakeAsyncRedis:
+    """ In-memory Redis with the Lua scripting, decoding the responses as the bot's client does. """
+
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
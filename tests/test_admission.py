@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, MessageEntity, PhotoSize, Update, User
+from telegram.ext import CommandHandler, MessageHandler, filters
+
+from bot import TelegramBot
+from src.services.admission import AdmissionControl, UpdatePriority
+from src.update_processor import UserOrderedUpdateProcessor
+
+
+class FakeBot(object):
+    username = "bot"
+
+
+def message(update_id: int, user_id: int, edited: bool = False, **kwargs) -> Update:
+    message = Message(update_id, datetime.now(), Chat(user_id, "private"), from_user=User(user_id, "User", False), **kwargs)
+    message.set_bot(FakeBot())
+
+    return Update(update_id, edited_message=message) if edited else Update(update_id, message=message)
+
+
+def command(update_id: int, user_id: int, name: str) -> Update:
+    return message(
+        update_id,
+        user_id,
+        text=f"/{name}",
+        entities=[MessageEntity(MessageEntity.BOT_COMMAND, 0, len(name) + 1)],
+    )
+
+
+async def start_command(update, context):
+    pass
+
+
+async def link_command(update, context):
+    pass
+
+
+async def handle_message(update, context):
+    pass
+
+
+def admission(**kwargs) -> AdmissionControl:
+    control = AdmissionControl(**kwargs)
+    control.classify_by(
+        [
+            CommandHandler("start", start_command),
+            CommandHandler("link", link_command),
+            MessageHandler(filters.ALL, handle_message),
+        ],
+        {
+            handle_message: TelegramBot.message_priority,
+            link_command: UpdatePriority.PROFILE,
+        },
+    )
+
+    return control
+
+
+def test_message_priority():
+    assert TelegramBot.message_priority(message(1, 1, text="Hello")) is UpdatePriority.DELIVERY
+    assert TelegramBot.message_priority(message(1, 1, photo=[PhotoSize("id", "uid", 1, 1)])) is UpdatePriority.DELIVERY
+
+    # Nothing to deliver.
+    assert TelegramBot.message_priority(message(1, 1, edited=True, text="Hello")) is UpdatePriority.NOOP
+    assert TelegramBot.message_priority(message(1, 1, new_chat_title="Title")) is UpdatePriority.NOOP
+
+
+def test_classify_by_the_matching_handler():
+    control = admission()
+
+    assert control.classify(command(1, 1, "start")) is UpdatePriority.COMMAND
+    assert control.classify(command(1, 1, "link")) is UpdatePriority.PROFILE
+    assert control.classify(message(1, 1, text="Hello")) is UpdatePriority.DELIVERY
+    assert control.classify(message(1, 1, new_chat_title="Title")) is UpdatePriority.NOOP
+    # No handler takes the update.
+    assert control.classify(Update(1)) is UpdatePriority.NOOP
+    assert control.classify(object()) is UpdatePriority.COMMAND
+
+
+def test_enter_sheds_noop_and_overflow():
+    control = admission(max_pending=2)
+
+    assert not control.enter(UpdatePriority.NOOP)
+    assert control.enter(UpdatePriority.DELIVERY)
+    assert control.enter(UpdatePriority.PROFILE)
+    assert not control.enter(UpdatePriority.DELIVERY)
+
+    control.leave()
+    assert control.enter(UpdatePriority.DELIVERY)
+
+    assert control.stats()["shed"] == {"NOOP": {"noop": 1}, "DELIVERY": {"overflow": 1}}
+
+
+async def test_admit_under_latency_pressure():
+    control = admission(latency_threshold=0.05, defer_timeout=0.1)
+
+    # Calm, everything goes.
+    assert await control.admit(UpdatePriority.PROFILE)
+    control.record_wait(0.5)
+
+    assert await control.admit(UpdatePriority.DELIVERY)
+    assert not await control.admit(UpdatePriority.PROFILE)
+    assert not await control.admit(UpdatePriority.COMMAND)
+
+    # Deferred until the queue drains.
+    deferred = asyncio.create_task(control.admit(UpdatePriority.COMMAND))
+    await asyncio.sleep(0.01)
+    control.release()
+    control.release()
+    assert await deferred
+    assert control.queue_latency == 0.0
+
+    assert control.stats()["shed"] == {"COMMAND": {"deferred": 1}, "PROFILE": {"latency": 1}}
+
+
+async def test_processor_sheds_by_priority():
+    control = admission(latency_threshold=0.05, defer_timeout=0.2)
+    processor = UserOrderedUpdateProcessor(2, admission=control)
+    handled = []
+
+    async def handle(name: str, duration: float = 0.0):
+        await asyncio.sleep(duration)
+        handled.append(name)
+
+    # The deliveries of 20 Users take both slots for a while.
+    tasks = [
+        asyncio.create_task(processor.process_update(message(i, 100 + i, text="Hello"), handle(f"message {i}", 0.1)))
+        for i in range(20)
+    ]
+    await asyncio.sleep(0.25)
+
+    tasks.append(asyncio.create_task(processor.process_update(command(100, 200, "link"), handle("link"))))
+    tasks.append(asyncio.create_task(processor.process_update(command(101, 201, "start"), handle("start"))))
+    tasks.append(asyncio.create_task(processor.process_update(message(102, 202, edited=True, text="Hi"), handle("edited"))))
+
+    await asyncio.gather(*tasks)
+
+    assert handled == [f"message {i}" for i in range(20)]
+    assert control.stats() == {
+        "pending": 0,
+        "admitted": 0,
+        "queue_latency": 0.0,
+        "shed": {
+            "COMMAND": {"deferred": 1},
+            "PROFILE": {"latency": 1},
+            "NOOP": {"noop": 1},
+        },
+    }
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+from telegram import (
+    Chat,
+    Document,
+    InputMediaDocument,
+    InputMediaPhoto,
+    Message,
+    MessageEntity,
+    PhotoSize,
+    Update,
+    User,
+)
+
+from bot import TelegramBot
+from src.services.albums import AlbumCollector
+
+USER_ID = 1
+
+
+def item(update_id: int, media_group_id: str = "album", **kwargs) -> Update:
+    kwargs.setdefault("photo", [PhotoSize(f"photo-{update_id}", f"uid-{update_id}", 1, 1)])
+
+    return Update(update_id, message=Message(
+        update_id,
+        datetime.now(),
+        Chat(USER_ID, "private"),
+        from_user=User(USER_ID, "User", False),
+        media_group_id=media_group_id,
+        **kwargs,
+    ))
+
+
+async def test_items_join_the_batch_of_the_first_one():
+    albums = AlbumCollector(delay=0.05)
+    first = item(1)
+
+    assert not albums.add(first)
+    collecting = asyncio.create_task(albums.collect(first))
+
+    # Out of order, within the delay of each other.
+    for update_id in (3, 2):
+        await asyncio.sleep(0.02)
+        assert albums.add(item(update_id))
+
+    messages = await collecting
+    assert [message.message_id for message in messages] == [1, 2, 3]
+
+
+async def test_single_message_is_collected_as_is():
+    albums = AlbumCollector(delay=0.05)
+    single = item(1, media_group_id=None)
+
+    assert not albums.add(single)
+    assert await albums.collect(single) == [single.message]
+
+
+async def test_late_items_follow_the_delivered_album():
+    albums = AlbumCollector(delay=0.01, follow_up_time=0.1)
+    first = item(1)
+
+    albums.add(first)
+    await albums.collect(first)
+    albums.delivered(first, "receiver")
+
+    # Late, the item makes a batch of its own, which follows the album.
+    late = item(2)
+    assert not albums.add(late)
+    assert albums.follow_up(late) == "receiver"
+    assert [message.message_id for message in await albums.collect(late)] == [2]
+
+    assert albums.follow_up(item(3, media_group_id="other")) is None
+
+    await asyncio.sleep(0.1)
+    assert albums.follow_up(item(4)) is None
+
+
+async def test_expired_albums_are_dropped():
+    albums = AlbumCollector(follow_up_time=0.01)
+
+    albums.delivered(item(1, media_group_id="first"), "receiver")
+    await asyncio.sleep(0.02)
+    albums.delivered(item(2, media_group_id="second"), "receiver")
+
+    assert list(albums._delivered) == [(USER_ID, "second")]
+
+
+def test_album_items_are_sent_again_with_their_captions():
+    photo = item(1, caption="Look", caption_entities=[MessageEntity(MessageEntity.BOLD, 0, 4)]).message
+    document = item(2, photo=None, document=Document("document", "uid")).message
+
+    media = TelegramBot.album_media(photo)
+    assert isinstance(media, InputMediaPhoto)
+    assert media.media == "photo-1" and media.caption == "Look" and len(media.caption_entities) == 1
+
+    media = TelegramBot.album_media(document)
+    assert isinstance(media, InputMediaDocument) and media.media == "document"
@@ -0,0 +1,61 @@
+from src.helpers.user_roles import UserRoles
+from src.models import UserModel
+from src.services.backend import BackendResponse
+from src.services.ban_list import BanList
+from src.services.user_cache import UserCache
+
+
+class FakeBackend(object):
+
+    def __init__(self, banned: list[int]):
+        self.banned = banned
+
+    async def get_banned_users(self) -> BackendResponse:
+        return BackendResponse(200, list(self.banned))
+
+
+async def test_refresh_keeps_the_claims_of_the_users_still_banned(redis):
+    backend = FakeBackend([1, 2])
+    ban_list = BanList(redis, backend, UserCache(redis))
+
+    await ban_list.refresh()
+    assert await ban_list.claim_restriction(1)
+    # Restricted by the first claim only.
+    assert not await ban_list.claim_restriction(1)
+
+    backend.banned = [1, 3]
+    await ban_list.refresh()
+
+    assert await redis.hgetall(BanList.KEY) == {"1": "2", "3": "0"}
+    assert BanList.is_restricted(await redis.hget(BanList.KEY, 1))
+    assert not BanList.is_restricted(await redis.hget(BanList.KEY, 3))
+
+
+async def test_refresh_drops_the_cached_unbanned_users(redis):
+    cache = UserCache(redis)
+    backend = FakeBackend([1, 2])
+    ban_list = BanList(redis, backend, cache)
+
+    await ban_list.refresh()
+    await cache.store(UserModel(1, 1, "first", None, UserRoles.Banned, 0))
+    await cache.store(UserModel(2, 2, "second", None, UserRoles.Banned, 0))
+
+    backend.banned = [2]
+    await ban_list.refresh()
+
+    assert await redis.exists(UserCache.telegram_id_key(1), UserCache.link_key("first")) == 0
+    assert await cache.get_by_telegram_id(2) is not None
+
+
+async def test_sync_adds_and_removes_the_resolved_user(redis):
+    ban_list = BanList(redis, FakeBackend([]), UserCache(redis))
+
+    pipeline = redis.pipeline(transaction=False)
+    ban_list.queue_sync(UserModel(1, 1, None, None, UserRoles.Banned, 0), pipeline)
+    await pipeline.execute()
+    assert await redis.hget(BanList.KEY, 1) == "0"
+
+    pipeline = redis.pipeline(transaction=False)
+    ban_list.queue_sync(UserModel(1, 1, None, None, UserRoles.User, 0), pipeline)
+    await pipeline.execute()
+    assert await redis.hget(BanList.KEY, 1) is None
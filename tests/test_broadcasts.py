@@ -0,0 +1,159 @@
+import asyncio
+from collections import Counter
+
+from telegram.error import BadRequest, Forbidden
+
+from src.services.backend import BackendResponse
+from src.services.broadcasts import Broadcaster
+
+FAST = {"limit": 1000, "period": 1.0}
+
+
+class FakeBackend(object):
+
+    def __init__(self, count: int):
+        self.users = [{"id": user_id, "telegramId": 1000 + user_id} for user_id in range(1, count + 1)]
+
+    async def get_users_page(self, after: int = 0, limit: int = 100) -> BackendResponse:
+        return BackendResponse(200, [user for user in self.users if user["id"] > after][:limit])
+
+
+class FakeBot(object):
+
+    def __init__(self, errors: dict = None, delay: float = 0.0):
+        self.errors = errors or {}
+        self.delay = delay
+        self.sent = Counter()
+
+    async def copy_message(self, chat_id: int, **kwargs):
+        await asyncio.sleep(self.delay)
+
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+
+        self.sent[chat_id] += 1
+
+
+async def finish(state: dict):
+    pass
+
+
+def broadcaster(redis, count: int, **kwargs) -> Broadcaster:
+    kwargs.setdefault("rate", FAST)
+
+    return Broadcaster(redis, FakeBackend(count), **kwargs)
+
+
+async def test_only_one_broadcast_runs_at_a_time(redis):
+    broadcasts = broadcaster(redis, 1)
+
+    assert await broadcasts.create(1, 1, 5)
+    assert not await broadcasts.create(1, 1, 6)
+    assert (await broadcasts.status())["message_id"] == "5"
+
+    assert await broadcasts.cancel()
+    assert not await broadcasts.cancel()
+    assert await broadcasts.create(1, 1, 6)
+
+
+async def test_pages_are_sent_and_the_outcomes_counted(redis):
+    broadcasts = broadcaster(redis, 5, page_size=2)
+    bot = broadcasts._bot = FakeBot({
+        1002: Forbidden("Forbidden: bot was blocked by the user"),
+        1003: Forbidden("Forbidden: user is deactivated"),
+        1004: BadRequest("Chat not found"),
+    })
+    finished = []
+
+    async def on_finish(state: dict):
+        finished.append(state)
+
+    broadcasts._on_finish = on_finish
+
+    await broadcasts.create(1, 1, 5)
+    state = await broadcasts.status()
+    assert await broadcasts._claim_lease(state["id"])
+    await broadcasts.send_pages(state)
+
+    assert set(bot.sent) == {1001, 1005}
+    assert finished[0]["status"] == Broadcaster.DONE
+    assert finished[0]["cursor"] == "5"
+    assert {outcome: finished[0][outcome] for outcome in Broadcaster.OUTCOMES} == {
+        "sent": "2",
+        "blocked": "1",
+        "deactivated": "1",
+        "failed": "1",
+    }
+    assert await redis.hgetall(Broadcaster.UNREACHABLE_KEY) == {"1002": "blocked", "1003": "deactivated"}
+    assert await redis.exists(Broadcaster.LEASE_KEY) == 0
+
+
+async def test_broadcast_is_continued_from_the_checkpoint(redis):
+    broadcasts = broadcaster(redis, 5, page_size=2)
+    bot = broadcasts._bot = FakeBot()
+    broadcasts._on_finish = finish
+
+    await broadcasts.create(1, 1, 5)
+    # Stopped after the first page.
+    await redis.hset(Broadcaster.KEY, mapping={"cursor": 2, "sent": 2})
+
+    state = await broadcasts.status()
+    assert await broadcasts._claim_lease(state["id"])
+    await broadcasts.send_pages(state)
+
+    assert set(bot.sent) == {1003, 1004, 1005}
+    assert (await broadcasts.status())["sent"] == "5"
+
+
+async def test_lease_is_held_by_one_process(redis):
+    first = broadcaster(redis, 1)
+    second = broadcaster(redis, 1)
+
+    await first.create(1, 1, 5)
+    broadcast_id = (await first.status())["id"]
+
+    assert await first._claim_lease(broadcast_id)
+    assert not await second._claim_lease(broadcast_id)
+    # Only the lease of the running broadcast is claimed.
+    assert not await first._claim_lease("other")
+
+    await first._release(keys=[Broadcaster.LEASE_KEY], args=[first.token])
+    assert await second._claim_lease(broadcast_id)
+
+
+async def test_page_is_stopped_once_the_lease_is_lost(redis):
+    broadcasts = broadcaster(redis, 10, page_size=10, workers=1)
+    broadcasts._bot = FakeBot()
+
+    await broadcasts.create(1, 1, 5)
+    state = await broadcasts.status()
+    assert await broadcasts._claim_lease(state["id"])
+
+    # Taken over by another process, found out on the renewal after the next send.
+    await redis.set(Broadcaster.LEASE_KEY, "other")
+    outcomes, _, renewed = await broadcasts._send_page(state["id"], broadcasts.backend.users, 1, 5)
+
+    assert not renewed
+    assert outcomes["sent"] == 1
+
+
+async def test_every_user_is_sent_once_by_the_processes(redis):
+    bot = FakeBot(delay=0.01)
+    done = asyncio.Event()
+
+    async def on_finish(state: dict):
+        done.set()
+
+    processes = [broadcaster(redis, 25, page_size=10, workers=2, check_interval=0.01) for _ in range(2)]
+    for process in processes:
+        await process.start(bot, on_finish)
+
+    try:
+        await processes[1].create(1, 1, 5)
+        await asyncio.wait_for(done.wait(), 5)
+    finally:
+        for process in processes:
+            await process.stop()
+
+    assert len(bot.sent) == 25
+    assert set(bot.sent.values()) == {1}
@@ -0,0 +1,112 @@
+from datetime import datetime
+from time import perf_counter
+
+from telegram import Chat, Message, Update, User
+from telegram.error import NetworkError
+
+from src.services.error_reports import ErrorAggregator
+from src.tracing import Trace, current_trace
+
+ERRORS_ID = -300
+
+
+class FakeBot(object):
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.sent: list[dict] = []
+
+    async def send_message(self, **kwargs):
+        if self.error is not None:
+            raise self.error
+
+        self.sent.append(kwargs)
+
+
+def message(update_id: int, user_id: int) -> Update:
+    return Update(update_id, message=Message(
+        update_id,
+        datetime.now(),
+        Chat(user_id, "private"),
+        from_user=User(user_id, "User", False),
+        text="Hello",
+    ))
+
+
+def test_errors_are_grouped_by_the_fingerprint():
+    errors = ErrorAggregator(ERRORS_ID, max_samples=2)
+
+    for update_id in range(3):
+        errors.report("Backend error", "GET /api/user", 503, message(update_id, 100 + update_id))
+    errors.report("Backend error", "GET /api/user", 500)
+    errors.report("Telegram error", "sendMessage", "Forbidden", message(9, 109))
+
+    assert errors.digest() == "\n".join([
+        "Errors in the last 60s:",
+        "\n3× Backend error GET /api/user (503)\nUID/MID: 100/0, 101/1",
+        "\n1× Backend error GET /api/user (500)\nUID/MID: -",
+        "\n1× Telegram error sendMessage (Forbidden)\nUID/MID: 109/9",
+    ])
+
+    # Every error is kept in the buffer, the groups start over.
+    assert len(errors.recent) == 5
+    assert errors.recent[0]["user_id"] == 100 and errors.recent[0]["status_code"] == 503
+    assert errors.digest() is None
+
+
+def test_digest_is_limited_to_the_largest_groups():
+    errors = ErrorAggregator(ERRORS_ID, max_groups=2, buffer_size=3)
+
+    for status_code in (500, 502, 503):
+        for _ in range(status_code - 499):
+            errors.report("Backend error", "GET /api/user", status_code)
+
+    digest = errors.digest()
+
+    assert "(503)" in digest and "(502)" in digest and "(500)" not in digest
+    assert digest.endswith("\n…and 1 more.")
+    assert len(errors.recent) == 3
+
+
+def test_exception_is_attributed_to_the_failed_call():
+    errors = ErrorAggregator(ERRORS_ID)
+    assert errors.failed_call() is None
+
+    trace = Trace(1, 100)
+    trace.record("redis GET", perf_counter(), 0.01, NetworkError("Timed out"))
+    trace.record("backend GET /api/user", perf_counter(), 0.01, NetworkError("Timed out"))
+    trace.record("handler", perf_counter(), 0.02, NetworkError("Timed out"))
+    trace.record("telegram sendMessage", perf_counter(), 0.01)
+
+    token = current_trace.set(trace)
+    try:
+        errors.report_exception(ValueError("Oops"), message(1, 100))
+    finally:
+        current_trace.reset(token)
+
+    assert errors.recent[0]["kind"] == "ValueError"
+    assert errors.recent[0]["endpoint"] == "backend GET /api/user"
+    assert "ValueError: Oops" in errors.recent[0]["details"]
+
+
+async def test_pending_errors_are_posted_on_stop():
+    errors = ErrorAggregator(ERRORS_ID, interval=60.0)
+    bot = FakeBot()
+
+    await errors.start(bot)
+    errors.report("Backend error", "GET /api/user", 503)
+    await errors.stop()
+
+    assert len(bot.sent) == 1
+    assert bot.sent[0]["chat_id"] == ERRORS_ID
+    assert "1× Backend error" in bot.sent[0]["text"]
+
+
+async def test_failed_post_is_not_retried():
+    errors = ErrorAggregator(ERRORS_ID)
+    errors._bot = FakeBot(NetworkError("Timed out"))
+
+    errors.report("Backend error", "GET /api/user", 503)
+    await errors.post_digest()
+
+    assert errors.digest() is None
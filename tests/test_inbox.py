@@ -0,0 +1,176 @@
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from benchmarks.fake_backend import FakeBackend
+from src.helpers.reply_templates import load_reply_templates
+from src.markup import Markup
+from src.models import MessageModel
+from src.services.backend import BackendClient
+from src.services.inbox import Inbox
+from src.services.message_index import MessageIndex
+from src.services.message_outbox import MessageOutbox
+from src.services.messages import MessageRepository
+from src.services.stats import StatsCounters
+
+RECIPIENT_ID = 2
+
+
+async def serve_backend(messages: int) -> tuple[FakeBackend, HTTPServer, BackendClient]:
+    backend = FakeBackend()
+
+    for message_id in range(1, messages + 1):
+        backend.create_message({
+            "authorChatMessageId": message_id,
+            "recipientChatMessageId": message_id,
+            "storageMessageId": message_id,
+            "authorId": 1,
+            "recipientId": RECIPIENT_ID,
+            "body": f"Message {message_id}",
+        })
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(backend.application())
+    server.add_sockets([sock])
+
+    return backend, server, BackendClient(base_url=f"http://127.0.0.1:{port}")
+
+
+def cursor(page: dict, markup: Markup, direction: str) -> dict | None:
+    """ Cursor of the button to the page in the direction, None if there is no button. """
+
+    keyboard = markup.inbox(page)
+    buttons = keyboard.inline_keyboard[0] if keyboard is not None else ()
+
+    for button in buttons:
+        _, button_direction, message_id = button.callback_data.split(":")
+
+        if button_direction == direction:
+            return {direction: int(message_id)}
+
+    return None
+
+
+def ids(page: dict) -> list[int]:
+    return [message["id"] for message in page["messages"]]
+
+
+async def test_pages_by_the_cursors_of_the_buttons(redis):
+    _, server, client = await serve_backend(12)
+    inbox = Inbox(redis, client, page_size=5)
+    markup = Markup(load_reply_templates())
+
+    try:
+        latest = (await inbox.get_page(RECIPIENT_ID)).data
+        assert ids(latest) == [12, 11, 10, 9, 8]
+        assert not latest["hasNewer"] and latest["hasOlder"]
+        assert cursor(latest, markup, "after") is None
+
+        older = (await inbox.get_page(RECIPIENT_ID, **cursor(latest, markup, "before"))).data
+        assert ids(older) == [7, 6, 5, 4, 3]
+        assert older["hasNewer"] and older["hasOlder"]
+
+        oldest = (await inbox.get_page(RECIPIENT_ID, **cursor(older, markup, "before"))).data
+        assert ids(oldest) == [2, 1]
+        assert oldest["hasNewer"] and not oldest["hasOlder"]
+        assert cursor(oldest, markup, "before") is None
+
+        # Back to the newer pages, the same pages as on the way to the oldest one.
+        newer = (await inbox.get_page(RECIPIENT_ID, **cursor(oldest, markup, "after"))).data
+        assert ids(newer) == [7, 6, 5, 4, 3]
+        assert newer["hasNewer"] and newer["hasOlder"]
+
+        newest = (await inbox.get_page(RECIPIENT_ID, **cursor(newer, markup, "after"))).data
+        assert ids(newest) == [12, 11, 10, 9, 8]
+        assert not newest["hasNewer"] and newest["hasOlder"]
+    finally:
+        server.stop()
+        await client.close()
+
+
+async def test_page_of_the_exact_page_size(redis):
+    _, server, client = await serve_backend(5)
+    inbox = Inbox(redis, client, page_size=5)
+
+    try:
+        page = (await inbox.get_page(RECIPIENT_ID)).data
+        assert ids(page) == [5, 4, 3, 2, 1]
+        assert not page["hasNewer"] and not page["hasOlder"]
+
+        empty = (await inbox.get_page(RECIPIENT_ID, before=1)).data
+        assert ids(empty) == []
+        assert Markup(load_reply_templates()).inbox(empty) is None
+    finally:
+        server.stop()
+        await client.close()
+
+
+async def test_pages_are_cached_by_the_cursor(redis):
+    backend, server, client = await serve_backend(12)
+    inbox = Inbox(redis, client, page_size=5)
+
+    try:
+        await inbox.get_page(RECIPIENT_ID)
+        await inbox.get_page(RECIPIENT_ID, before=8)
+        calls = backend.total_calls
+
+        assert ids((await inbox.get_page(RECIPIENT_ID)).data) == [12, 11, 10, 9, 8]
+        assert ids((await inbox.get_page(RECIPIENT_ID, before=8)).data) == [7, 6, 5, 4, 3]
+        assert backend.total_calls == calls
+
+        assert 0 < await redis.ttl(Inbox.page_key(RECIPIENT_ID)) <= inbox.ttl
+    finally:
+        server.stop()
+        await client.close()
+
+
+async def test_new_message_drops_the_cached_latest_page(redis):
+    backend, server, client = await serve_backend(3)
+    inbox = Inbox(redis, client, page_size=5)
+    messages = MessageRepository(
+        client,
+        MessageIndex(redis),
+        MessageOutbox(redis, client),
+        StatsCounters(redis, client),
+    )
+
+    try:
+        assert ids((await inbox.get_page(RECIPIENT_ID)).data) == [3, 2, 1]
+
+        message = MessageModel(4, 4, 4, 1, RECIPIENT_ID, "Message 4")
+        await messages.create(message)
+        assert await redis.exists(Inbox.page_key(RECIPIENT_ID)) == 0
+
+        # Stored by the outbox.
+        backend.create_message(message.to_json())
+        assert ids((await inbox.get_page(RECIPIENT_ID)).data) == [4, 3, 2, 1]
+    finally:
+        server.stop()
+        await client.close()
+
+
+async def test_newest_page_after_the_cursor_is_not_cached(redis):
+    backend, server, client = await serve_backend(7)
+    inbox = Inbox(redis, client, page_size=5)
+
+    try:
+        # Older Messages are still newer than this page.
+        assert ids((await inbox.get_page(RECIPIENT_ID, after=1)).data) == [6, 5, 4, 3, 2]
+        assert await redis.exists(Inbox.page_key(RECIPIENT_ID, after=1)) == 1
+
+        # The newest page changes with the next Message.
+        assert ids((await inbox.get_page(RECIPIENT_ID, after=2)).data) == [7, 6, 5, 4, 3]
+        assert await redis.exists(Inbox.page_key(RECIPIENT_ID, after=2)) == 0
+
+        backend.create_message({
+            "authorChatMessageId": 8,
+            "recipientChatMessageId": 8,
+            "storageMessageId": 8,
+            "authorId": 1,
+            "recipientId": RECIPIENT_ID,
+            "body": "Message 8",
+        })
+        assert ids((await inbox.get_page(RECIPIENT_ID, after=2)).data) == [7, 6, 5, 4, 3]
+        assert (await inbox.get_page(RECIPIENT_ID, after=2)).data["hasNewer"]
+    finally:
+        server.stop()
+        await client.close()
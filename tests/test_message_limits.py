@@ -0,0 +1,81 @@
+import asyncio
+
+from src.services.message_limits import MessageLimits
+
+
+def limits(redis, **kwargs) -> MessageLimits:
+    return MessageLimits(
+        redis,
+        sender=kwargs.get("sender", {"limit": 2, "window": 0.2}),
+        receiver=kwargs.get("receiver", {"limit": 3, "window": 60}),
+        pair=kwargs.get("pair", {"limit": 1, "window": 60}),
+    )
+
+
+async def test_sender_limit_within_the_window(redis):
+    message_limits = limits(redis)
+
+    assert (await message_limits.take_message(1)).allowed
+    assert (await message_limits.take_message(1)).allowed
+
+    check = await message_limits.take_message(1)
+    assert check.exceeded == "sender"
+    assert 0 < check.retry_after <= 0.2
+
+    # The limits are per sender.
+    assert (await message_limits.take_message(2)).allowed
+
+
+async def test_window_slides(redis):
+    message_limits = limits(redis)
+
+    await message_limits.take_message(1)
+    await asyncio.sleep(0.1)
+    await message_limits.take_message(1)
+
+    check = await message_limits.take_message(1)
+    assert not check.allowed
+
+    # Only the first send left the window.
+    await asyncio.sleep(check.retry_after + 0.02)
+    assert (await message_limits.take_message(1)).allowed
+    assert not (await message_limits.take_message(1)).allowed
+
+
+async def test_denied_sends_are_not_counted(redis):
+    message_limits = limits(redis)
+
+    await message_limits.take_message(1)
+    await message_limits.take_message(1)
+
+    for _ in range(5):
+        assert not (await message_limits.take_message(1)).allowed
+
+    assert await redis.zcard("limit:sender:1") == 2
+
+    await asyncio.sleep(0.25)
+    assert (await message_limits.take_message(1)).allowed
+
+
+async def test_session_limits_are_taken_all_or_none(redis):
+    message_limits = limits(redis)
+
+    assert (await message_limits.take_session(1, "link")).allowed
+
+    # The pair limit is exceeded, the receiver limit isn't taken either.
+    assert (await message_limits.take_session(1, "link")).exceeded == "pair"
+    assert await redis.zcard("limit:receiver:link") == 1
+
+    assert (await message_limits.take_session(2, "link")).allowed
+    assert (await message_limits.take_session(3, "link")).allowed
+    assert (await message_limits.take_session(4, "link")).exceeded == "receiver"
+
+
+async def test_limit_keys_expire_with_the_window(redis):
+    message_limits = limits(redis)
+
+    await message_limits.take_message(1)
+    await message_limits.take_session(1, "link")
+
+    assert 0 < await redis.pttl("limit:sender:1") <= 200
+    assert 0 < await redis.pttl("limit:pair:1:link") <= 60000
@@ -0,0 +1,138 @@
+import asyncio
+from orjson import loads
+
+from src.models import MessageModel
+from src.services.backend import BackendResponse
+from src.services.inbox import Inbox
+from src.services.message_outbox import MessageOutbox
+from src.services.redis_client import create_group
+
+
+class FakeBackend(object):
+
+    def __init__(self, *status_codes: int):
+        # Status codes of the next calls, the calls after them succeed.
+        self.status_codes = list(status_codes)
+        self.stored: list[dict] = []
+        self.calls = 0
+
+    async def create_messages(self, messages: list[dict]) -> BackendResponse:
+        self.calls += 1
+        status_code = self.status_codes.pop(0) if self.status_codes else 200
+
+        if status_code == 200:
+            self.stored.extend(messages)
+
+        return BackendResponse(status_code, None)
+
+
+def message(message_id: int) -> MessageModel:
+    return MessageModel(message_id, message_id, message_id, 1, 2, f"Message {message_id}")
+
+
+async def outbox_of(redis, backend: FakeBackend, **kwargs) -> MessageOutbox:
+    outbox = MessageOutbox(redis, backend, block=1, **kwargs)
+    await create_group(redis, MessageOutbox.STREAM, MessageOutbox.GROUP)
+
+    return outbox
+
+
+async def test_batch_is_stored_and_acknowledged(redis):
+    backend = FakeBackend()
+    outbox = await outbox_of(redis, backend)
+
+    await redis.set(Inbox.page_key(2), "page")
+    for message_id in (1, 2, 3):
+        await outbox.push(message(message_id))
+
+    assert await outbox.handle(await outbox._read())
+
+    assert [stored["storageMessageId"] for stored in backend.stored] == [1, 2, 3]
+    assert await redis.xlen(MessageOutbox.STREAM) == 0
+    assert await outbox._read() == []
+    # Cached before the Messages were stored.
+    assert await redis.exists(Inbox.page_key(2)) == 0
+
+
+async def test_failed_batch_is_read_again(redis):
+    backend = FakeBackend(503)
+    outbox = await outbox_of(redis, backend)
+
+    await outbox.push(message(1))
+
+    entries = await outbox._read()
+    assert not await outbox.handle(entries)
+    assert backend.stored == []
+
+    # The own pending entries go first.
+    assert await outbox._read() == entries
+    assert await outbox.handle(entries)
+    assert [stored["storageMessageId"] for stored in backend.stored] == [1]
+
+
+async def test_rejected_batch_goes_to_the_dead_letter_stream(redis):
+    backend = FakeBackend(400)
+    outbox = await outbox_of(redis, backend)
+
+    await outbox.push(message(1))
+    assert await outbox.handle(await outbox._read())
+
+    assert await redis.xlen(MessageOutbox.STREAM) == 0
+    _, fields = (await redis.xrange(MessageOutbox.DEAD_LETTER_STREAM))[0]
+    assert MessageModel.from_json(loads(fields["message"])).storage_message_id == 1
+
+
+async def test_timeouts_and_throttling_are_retried_not_dead_lettered(redis):
+    backend = FakeBackend(408, 429)
+    outbox = await outbox_of(redis, backend)
+
+    await outbox.push(message(1))
+    entries = await outbox._read()
+
+    assert not await outbox.handle(entries)
+    assert not await outbox.handle(entries)
+    assert await outbox.handle(entries)
+    assert await redis.xlen(MessageOutbox.DEAD_LETTER_STREAM) == 0
+
+
+async def test_entries_of_a_crashed_consumer_are_claimed(redis):
+    backend = FakeBackend()
+    crashed = await outbox_of(redis, backend, consumer="crashed")
+    outbox = await outbox_of(redis, backend, consumer="alive", claim_idle=10)
+
+    await outbox.push(message(1))
+    assert len(await crashed._read()) == 1
+
+    # Not idle for long enough yet.
+    assert await outbox._read() == []
+
+    await asyncio.sleep(0.02)
+    entries = await outbox._read()
+    assert len(entries) == 1
+
+    assert await outbox.handle(entries)
+    assert await redis.xpending(MessageOutbox.STREAM, MessageOutbox.GROUP) == {
+        "pending": 0,
+        "min": None,
+        "max": None,
+        "consumers": [],
+    }
+
+
+async def test_consumer_retries_with_the_delay(redis):
+    backend = FakeBackend(503, 503)
+    outbox = MessageOutbox(redis, backend, block=1, retry_delay=0.01, max_retry_delay=0.02)
+
+    await outbox.start()
+    try:
+        await outbox.push(message(1))
+
+        for _ in range(100):
+            if backend.stored:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await outbox.stop()
+
+    assert backend.calls == 3
+    assert [stored["storageMessageId"] for stored in backend.stored] == [1]
@@ -0,0 +1,75 @@
+from json import dumps
+
+from src.helpers.user_roles import UserRoles
+from src.models import MessageModel, UserModel
+
+USER = {
+    "id": 1,
+    "telegramId": 100,
+    "link": "link",
+    "welcomeMessage": "Привет",
+    "roles": (UserRoles.User | UserRoles.Special).value,
+    "registeredAt": 1700000000,
+}
+
+MESSAGE = {
+    "authorChatMessageId": 1,
+    "recipientChatMessageId": 2,
+    "storageMessageId": 3,
+    "authorId": 100,
+    "recipientId": 200,
+    "body": "Hello",
+}
+
+
+def user_fields(user: UserModel) -> tuple:
+    return tuple(getattr(user, name) for name in UserModel.__slots__)
+
+
+def message_fields(message: MessageModel) -> tuple:
+    return tuple(getattr(message, name) for name in MessageModel.__slots__)
+
+
+def test_user_is_decoded_from_the_backend_json():
+    user = UserModel.from_json(USER)
+
+    assert user.roles == UserRoles.User | UserRoles.Special
+    assert user.is_special and not user.is_banned
+    assert user_fields(user) == (1, 100, "link", "Привет", user.roles, 1700000000)
+
+
+def test_user_round_trips_through_the_cache():
+    user = UserModel.from_json(USER)
+
+    assert user_fields(UserModel.decode(user.encode())) == user_fields(user)
+    # Compact, without the keys.
+    assert user.encode().startswith(b"[")
+
+    missing = UserModel.from_json({**USER, "link": None, "welcomeMessage": None})
+    assert user_fields(UserModel.decode(missing.encode())) == user_fields(missing)
+
+
+def test_user_cached_as_the_backend_json_is_decoded():
+    assert user_fields(UserModel.decode(dumps(USER))) == user_fields(UserModel.from_json(USER))
+
+
+def test_message_round_trips_through_the_backend_json():
+    message = MessageModel.from_json(MESSAGE)
+
+    assert message.to_json() == MESSAGE
+    assert MessageModel.from_json({key: value for key, value in MESSAGE.items() if key != "body"}).body is None
+
+
+def test_message_round_trips_through_the_index_without_the_body():
+    message = MessageModel.from_json(MESSAGE)
+    decoded = MessageModel.decode(message.encode())
+
+    assert message_fields(decoded) == message_fields(message)[:-1] + (None,)
+
+    # Not copied to the storage yet.
+    pending = MessageModel(1, 2, None, 100, 200)
+    assert MessageModel.decode(pending.encode()).storage_message_id is None
+
+
+def test_message_indexed_as_the_backend_json_is_decoded():
+    assert message_fields(MessageModel.decode(dumps(MESSAGE).encode())) == message_fields(MessageModel.from_json(MESSAGE))
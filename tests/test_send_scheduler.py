@@ -0,0 +1,125 @@
+import asyncio
+from time import monotonic
+
+import pytest
+from telegram.error import RetryAfter
+
+from src.services.send_scheduler import Priority, SendScheduler, TokenBucket
+
+STORAGE_ID = -100
+ERROR_ID = -200
+
+
+def scheduler(**kwargs) -> SendScheduler:
+    return SendScheduler(chat_priorities={STORAGE_ID: Priority.STORAGE, ERROR_ID: Priority.ERROR}, **kwargs)
+
+
+async def send(limiter: SendScheduler, chat_id: int, sent: list, endpoint: str = "sendMessage", **rate_limit_args):
+    async def callback():
+        sent.append((chat_id, monotonic()))
+        return True
+
+    return await limiter.process_request(callback, (), {}, endpoint, {"chat_id": chat_id}, rate_limit_args or None)
+
+
+def test_token_bucket_refills_and_pauses():
+    bucket = TokenBucket(limit=2, period=1.0)
+    now = bucket.updated_at
+
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.ready_at(now) == pytest.approx(now + 0.5)
+    assert not bucket.is_idle(now)
+
+    bucket.pause(now + 2.0)
+    assert bucket.ready_at(now + 1.0) == now + 2.0
+    assert bucket.is_idle(now + 2.0)
+
+
+async def test_sends_are_granted_by_the_priority():
+    limiter = scheduler(global_limit={"limit": 1, "period": 0.02})
+    await limiter.initialize()
+    sent = []
+
+    try:
+        await asyncio.gather(
+            send(limiter, 1, sent, priority=Priority.BULK),
+            send(limiter, ERROR_ID, sent),
+            send(limiter, STORAGE_ID, sent),
+            send(limiter, 2, sent),
+        )
+    finally:
+        await limiter.shutdown()
+
+    assert [chat_id for chat_id, _ in sent] == [2, STORAGE_ID, ERROR_ID, 1]
+    assert limiter.stats()["USER"]["sent"] == 1
+
+
+async def test_busy_chat_doesnt_hold_the_others():
+    limiter = scheduler(private_chat_limit={"limit": 1, "period": 0.1})
+    await limiter.initialize()
+    sent = []
+
+    try:
+        started_at = monotonic()
+        await asyncio.gather(send(limiter, 1, sent), send(limiter, 1, sent), send(limiter, 2, sent))
+    finally:
+        await limiter.shutdown()
+
+    times = {}
+    for chat_id, sent_at in sent:
+        times.setdefault(chat_id, []).append(sent_at - started_at)
+
+    assert times[2][0] < 0.05
+    assert times[1][1] >= 0.09
+
+
+async def test_other_calls_are_not_scheduled():
+    limiter = scheduler(global_limit={"limit": 1, "period": 60.0})
+    sent = []
+
+    # Without the running scheduler only the calls which aren't sends go through.
+    await send(limiter, 1, sent, endpoint="getChat")
+    await send(limiter, 1, sent, endpoint="answerCallbackQuery")
+
+    assert len(sent) == 2
+
+
+async def test_flood_limit_pauses_the_chat_and_retries():
+    limiter = scheduler()
+    await limiter.initialize()
+    attempts = []
+
+    async def flooded():
+        attempts.append(monotonic())
+        if len(attempts) == 1:
+            raise RetryAfter(0.1)
+        return True
+
+    try:
+        started_at = monotonic()
+        assert await limiter.process_request(flooded, (), {}, "sendMessage", {"chat_id": 1}, None)
+
+        # The other sends to the chat wait for the pause too.
+        sent = []
+        await send(limiter, 1, sent)
+    finally:
+        await limiter.shutdown()
+
+    assert len(attempts) == 2
+    assert attempts[1] - started_at >= 0.09
+    assert sent[0][1] - started_at >= 0.09
+
+
+async def test_flood_limit_is_raised_after_the_retries():
+    limiter = scheduler(max_retries=1)
+    await limiter.initialize()
+
+    async def flooded():
+        raise RetryAfter(0.01)
+
+    try:
+        with pytest.raises(RetryAfter):
+            await limiter.process_request(flooded, (), {}, "sendMessage", {"chat_id": 1}, None)
+    finally:
+        await limiter.shutdown()
@@ -0,0 +1,69 @@
+import asyncio
+
+from src.const import NOT_LOADED
+from src.services.message_index import MessageIndex
+from src.services.sessions import SessionStore
+from src.services.user_cache import UserCache
+
+
+async def test_consume_gets_and_deletes_the_session(redis):
+    sessions = SessionStore(redis)
+    await sessions.open(1, "link")
+
+    session = await sessions.consume(1)
+    assert session.receiver_link == "link"
+    assert session.replied_message is NOT_LOADED
+
+    # The session is used by one message only.
+    assert (await sessions.consume(1)).receiver_link is None
+
+
+async def test_consume_without_session(redis):
+    session = await SessionStore(redis).consume(1)
+
+    assert session.receiver_link is None
+    assert session.receiver is NOT_LOADED
+    assert session.replied_message is NOT_LOADED
+
+
+async def test_consume_fetches_the_cached_receiver(redis):
+    sessions = SessionStore(redis)
+    await redis.set(UserCache.link_key("link"), "receiver")
+
+    await sessions.open(1, "link")
+    assert (await sessions.consume(1)).receiver == "receiver"
+
+    # Not cached.
+    await sessions.open(1, "other")
+    assert (await sessions.consume(1)).receiver is None
+
+
+async def test_consume_fetches_the_replied_message(redis):
+    sessions = SessionStore(redis)
+    await redis.set(MessageIndex.recipient_key(1, 5), "message")
+
+    session = await sessions.consume(1, 5)
+    assert session.receiver_link is None
+    assert session.replied_message == "message"
+
+    assert (await sessions.consume(1, 6)).replied_message is None
+
+
+async def test_session_expires(redis):
+    sessions = SessionStore(redis, ttl=1800)
+    await sessions.open(1, "link")
+
+    assert 0 < await redis.pttl(SessionStore.key(1)) <= 1800 * 1000
+
+    await redis.pexpire(SessionStore.key(1), 10)
+    await asyncio.sleep(0.05)
+
+    assert (await sessions.consume(1)).receiver_link is None
+
+
+async def test_reopened_session_replaces_the_link(redis):
+    sessions = SessionStore(redis)
+    await sessions.open(1, "first")
+    await sessions.open(1, "second")
+
+    assert (await sessions.consume(1)).receiver_link == "second"
@@ -0,0 +1,71 @@
+from src.models import MessageModel
+from src.services.backend import BackendResponse
+from src.services.message_outbox import MessageOutbox
+from src.services.stats import StatsCounters
+
+
+class FakeBackend(object):
+
+    def __init__(self, sent: int, received: int):
+        self.sent = sent
+        self.received = received
+        # Called while the backend request is in flight.
+        self.during_request = None
+
+    async def get_user_stats(self, telegram_id: int) -> BackendResponse:
+        if self.during_request is not None:
+            await self.during_request()
+
+        return BackendResponse(200, {"sent": self.sent, "received": self.received})
+
+
+async def queue_message(redis, stats: StatsCounters, message_id: int, author_id: int, recipient_id: int):
+    """ Count and queue the Message as the repository does. """
+
+    message = MessageModel(message_id, message_id, message_id, author_id, recipient_id, "Hello")
+
+    async with redis.pipeline() as pipeline:
+        stats.queue_message(message, pipeline)
+        MessageOutbox(redis, None).queue_push(message, pipeline)
+        await pipeline.execute()
+
+
+async def test_first_read_adds_the_pending_messages_to_the_backend_counts(redis):
+    stats = StatsCounters(redis, FakeBackend(sent=5, received=3))
+
+    await queue_message(redis, stats, 1, author_id=1, recipient_id=2)
+    await queue_message(redis, stats, 2, author_id=2, recipient_id=1)
+    await queue_message(redis, stats, 3, author_id=3, recipient_id=2)
+
+    assert await stats.get_user(1) == {"sent": 6, "received": 4}
+
+    # Reconciled once, the later Messages are counted locally.
+    await queue_message(redis, stats, 4, author_id=1, recipient_id=2)
+    assert await stats.get_user(1) == {"sent": 7, "received": 4}
+
+
+async def test_messages_queued_during_the_reconcile_are_kept(redis):
+    backend = FakeBackend(sent=5, received=0)
+    stats = StatsCounters(redis, backend)
+
+    await queue_message(redis, stats, 1, author_id=1, recipient_id=2)
+
+    async def queue_during_request():
+        await queue_message(redis, stats, 2, author_id=1, recipient_id=2)
+
+    backend.during_request = queue_during_request
+
+    assert await stats.get_user(1) == {"sent": 7, "received": 0}
+
+
+async def test_pending_messages_are_counted_across_the_pages(redis):
+    stats = StatsCounters(redis, FakeBackend(sent=0, received=0))
+
+    for message_id in range(1, 6):
+        await queue_message(redis, stats, message_id, author_id=1, recipient_id=2)
+
+    last_entry_id = (await redis.xrevrange(MessageOutbox.STREAM, count=1))[0][0]
+
+    assert await stats.count_pending(1, last_entry_id, page_size=2) == (5, 0)
+    assert await stats.count_pending(2, last_entry_id, page_size=2) == (0, 5)
+    assert await stats.count_pending(1, None) == (0, 0)
@@ -0,0 +1,150 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from telegram import Chat, Message, MessageEntity, MessageId, PhotoSize
+from telegram.error import BadRequest
+
+from src.models import MessageModel
+from src.services.chat_cache import ChatCache
+from src.services.message_index import MessageIndex
+from src.services.message_outbox import MessageOutbox
+from src.services.messages import MessageRepository
+from src.services.redis_client import create_group
+from src.services.stats import StatsCounters
+from src.services.storage_archive import StorageArchive
+
+AUTHOR_ID = 1
+RECIPIENT_ID = 2
+STORAGE_ID = -100
+
+
+class FakeBot(object):
+
+    def __init__(self):
+        self.sent: list[tuple[str, dict]] = []
+        self.error: Exception | None = None
+        self._message_id = 1000
+
+    async def get_chat(self, chat_id: int) -> SimpleNamespace:
+        return SimpleNamespace(id=chat_id, username=f"user{chat_id}", first_name="<First>", last_name=None)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> MessageId:
+        return self._send("sendMessage", chat_id=chat_id, text=text, **kwargs)
+
+    async def copy_message(self, chat_id: int, **kwargs) -> MessageId:
+        return self._send("copyMessage", chat_id=chat_id, **kwargs)
+
+    async def copy_messages(self, chat_id: int, message_ids: list[int], **kwargs) -> tuple[MessageId, ...]:
+        return tuple(
+            self._send("copyMessages", chat_id=chat_id, message_id=message_id, **kwargs)
+            for message_id in message_ids
+        )
+
+    def _send(self, method: str, **params) -> MessageId:
+        if self.error is not None:
+            raise self.error
+
+        self._message_id += 1
+        self.sent.append((method, params))
+
+        return MessageId(self._message_id)
+
+
+def message(message_id: int, **kwargs) -> Message:
+    return Message(message_id, datetime.now(), Chat(AUTHOR_ID, "private"), **kwargs)
+
+
+def model(message_id: int) -> MessageModel:
+    return MessageModel(message_id, message_id + 100, None, AUTHOR_ID, RECIPIENT_ID, "Hello")
+
+
+async def archive_of(redis) -> tuple[StorageArchive, FakeBot]:
+    messages = MessageRepository(
+        None,
+        MessageIndex(redis),
+        MessageOutbox(redis, None),
+        StatsCounters(redis, None),
+    )
+    archive = StorageArchive(redis, messages, ChatCache(), STORAGE_ID, block=1)
+    bot = archive._bot = FakeBot()
+
+    await create_group(redis, StorageArchive.STREAM, StorageArchive.GROUP)
+
+    return archive, bot
+
+
+async def handle_queued(archive: StorageArchive):
+    while entries := await archive._read():
+        await archive.handle(entries)
+
+
+async def test_text_is_posted_with_the_card_in_one_message(redis):
+    archive, bot = await archive_of(redis)
+    text = message(1, text="Hello <b>", entities=[MessageEntity(MessageEntity.BOLD, 0, 5)])
+
+    await archive.push([text], [model(1)])
+
+    # Replied to by the recipient before the copy is posted.
+    indexed = await archive.messages.index.get_by_recipient_chat(RECIPIENT_ID, 101)
+    assert indexed.author_chat_message_id == 1 and indexed.storage_message_id is None
+
+    await handle_queued(archive)
+
+    assert len(bot.sent) == 1
+    method, params = bot.sent[0]
+    assert method == "sendMessage" and params["chat_id"] == STORAGE_ID
+    assert params["text"].startswith("<b>Hello</b> &lt;b&gt;\n\n<b>Author:</b>")
+    assert "first name: <code>&lt;First&gt;</code>" in params["text"]
+    assert f"ID: <code>{RECIPIENT_ID}</code>" in params["text"]
+
+    stored = await archive.messages.index.get_by_storage(1001)
+    assert stored.author_chat_message_id == 1 and stored.recipient_chat_message_id == 101
+    assert await redis.xlen(MessageOutbox.STREAM) == 1
+    assert await redis.xlen(StorageArchive.STREAM) == 0
+    assert await redis.hget(StatsCounters.user_key(AUTHOR_ID), "sent") == "1"
+
+
+async def test_media_is_copied_with_the_card_in_the_caption(redis):
+    archive, bot = await archive_of(redis)
+    photo = message(1, photo=[PhotoSize("id", "uid", 1, 1)], caption="Look")
+
+    await archive.push([photo], [model(1)])
+    await handle_queued(archive)
+
+    assert len(bot.sent) == 1
+    method, params = bot.sent[0]
+    assert method == "copyMessage" and params["message_id"] == 1
+    assert params["caption"].startswith("Look\n\n<b>Author:</b>")
+
+
+async def test_album_gets_the_card_as_a_reply(redis):
+    archive, bot = await archive_of(redis)
+    album = [message(message_id, photo=[PhotoSize("id", "uid", 1, 1)], media_group_id="1") for message_id in (1, 2)]
+
+    await archive.push(album, [model(1), model(2)])
+    await handle_queued(archive)
+
+    assert [method for method, _ in bot.sent] == ["copyMessages", "copyMessages", "sendMessage"]
+    assert bot.sent[2][1]["reply_to_message_id"] == 1001
+    assert (await archive.messages.index.get_by_storage(1002)).author_chat_message_id == 2
+
+
+async def test_too_long_text_gets_the_card_as_a_reply(redis):
+    archive, bot = await archive_of(redis)
+
+    await archive.push([message(1, text="🙂" * 2040)], [model(1)])
+    await handle_queued(archive)
+
+    assert [method for method, _ in bot.sent] == ["copyMessages", "sendMessage"]
+
+
+async def test_message_failing_to_be_copied_is_dead_lettered(redis):
+    archive, bot = await archive_of(redis)
+    bot.error = BadRequest("Message to copy not found")
+
+    await archive.push([message(1, text="Hello")], [model(1)])
+    await handle_queued(archive)
+
+    assert await redis.xlen(StorageArchive.STREAM) == 0
+    assert await redis.xlen(StorageArchive.DEAD_LETTER_STREAM) == 1
+    assert await redis.xlen(MessageOutbox.STREAM) == 0
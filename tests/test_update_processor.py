@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from telegram import Chat, Message, PhotoSize, Update, User
+
+from src.services.albums import AlbumCollector
+from src.update_processor import UserOrderedUpdateProcessor
+
+
+def message(update_id: int, user_id: int, **kwargs) -> Update:
+    kwargs.setdefault("text", "Hello")
+
+    return Update(update_id, message=Message(
+        update_id,
+        datetime.now(),
+        Chat(user_id, "private"),
+        from_user=User(user_id, "User", False),
+        **kwargs,
+    ))
+
+
+async def test_updates_of_one_user_are_processed_in_order():
+    processor = UserOrderedUpdateProcessor(4)
+    handled = []
+
+    async def handle(name: str, duration: float):
+        await asyncio.sleep(duration)
+        handled.append(name)
+
+    # The later updates are quicker, but wait for the earlier ones.
+    await asyncio.gather(*(
+        processor.process_update(message(i, 1), handle(f"update {i}", 0.03 - i * 0.01))
+        for i in range(3)
+    ))
+
+    assert handled == ["update 0", "update 1", "update 2"]
+    assert processor._locks == {}
+
+
+async def test_busy_user_doesnt_take_the_slots_of_the_others():
+    processor = UserOrderedUpdateProcessor(2)
+    handled = []
+
+    async def handle(name: str, duration: float):
+        await asyncio.sleep(duration)
+        handled.append(name)
+
+    busy = [
+        asyncio.create_task(processor.process_update(message(i, 1), handle(f"busy {i}", 0.05)))
+        for i in range(5)
+    ]
+    await asyncio.sleep(0.01)
+
+    await processor.process_update(message(10, 2), handle("other", 0.0))
+    # Only one update of the busy User has been handled by then.
+    assert handled == ["other"]
+
+    await asyncio.gather(*busy)
+    assert handled[1:] == [f"busy {i}" for i in range(5)]
+
+
+async def test_lock_is_dropped_when_the_update_fails():
+    processor = UserOrderedUpdateProcessor(1)
+
+    async def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        await processor.process_update(message(1, 1), fail())
+
+    assert processor._locks == {}
+
+
+async def test_album_items_are_handled_with_the_first_one():
+    albums = AlbumCollector(delay=0.03)
+    processor = UserOrderedUpdateProcessor(4, albums=albums)
+    batches = []
+
+    async def handle(update: Update):
+        batches.append([item.message_id for item in await albums.collect(update)])
+
+    items = [message(i, 1, text=None, photo=[PhotoSize("id", "uid", 1, 1)], media_group_id="album") for i in range(3)]
+
+    await asyncio.gather(*(processor.process_update(item, handle(item)) for item in items))
+
+    assert batches == [[0, 1, 2]]
+    assert processor._locks == {}
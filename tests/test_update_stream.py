@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+from src.services.redis_client import create_group
+from src.services.update_stream import UpdateStream
+
+
+def message(update_id: int, user_id: int) -> Update:
+    return Update(update_id, message=Message(
+        update_id,
+        datetime.now(),
+        Chat(user_id, "private"),
+        from_user=User(user_id, "User", False),
+        text="Hello",
+    ))
+
+
+async def consume_until(stream: UpdateStream, shard: int, consumer: str, handled: list, count: int, handle=None):
+    """ Consume the shard until the count of the updates is handled. """
+
+    async def record(update: dict):
+        if handle is not None:
+            await handle(update)
+        handled.append(update["update_id"])
+
+    consuming = asyncio.create_task(stream.consume(shard, consumer, record))
+
+    for _ in range(100):
+        if len(handled) >= count:
+            break
+        await asyncio.sleep(0.01)
+
+    consuming.cancel()
+    await asyncio.gather(consuming, return_exceptions=True)
+
+
+async def test_updates_are_partitioned_by_the_user(redis):
+    stream = UpdateStream(redis, shards=2)
+
+    for update_id, user_id in enumerate((1, 2, 3, 4, 5)):
+        await stream.publish(message(update_id, user_id))
+
+    assert await redis.xlen(UpdateStream.key(0)) == 2
+    assert await redis.xlen(UpdateStream.key(1)) == 3
+
+
+async def test_updates_are_handled_in_order_and_acknowledged(redis):
+    stream = UpdateStream(redis, shards=1, block=1)
+    handled = []
+
+    for update_id in range(5):
+        await stream.publish(message(update_id, 1))
+
+    await consume_until(stream, 0, "worker", handled, 5)
+
+    assert handled == [0, 1, 2, 3, 4]
+    assert await redis.xlen(UpdateStream.key(0)) == 0
+    assert (await redis.xpending(UpdateStream.key(0), UpdateStream.GROUP))["pending"] == 0
+
+
+async def test_failed_update_is_not_handled_again(redis):
+    stream = UpdateStream(redis, shards=1, block=1)
+    handled = []
+
+    async def fail(update: dict):
+        if update["update_id"] == 0:
+            raise ValueError
+
+    for update_id in range(2):
+        await stream.publish(message(update_id, 1))
+
+    await consume_until(stream, 0, "worker", handled, 1, fail)
+
+    assert handled == [1]
+    assert await redis.xlen(UpdateStream.key(0)) == 0
+
+
+async def test_own_pending_updates_go_first(redis):
+    stream = UpdateStream(redis, shards=1, block=1, batch_size=2)
+    handled = []
+    key = UpdateStream.key(0)
+
+    await create_group(redis, key, UpdateStream.GROUP)
+    for update_id in range(3):
+        await stream.publish(message(update_id, 1))
+
+    # Read, but not handled before the previous run of the worker stopped.
+    await redis.xreadgroup(UpdateStream.GROUP, "worker", {key: ">"})
+    await stream.publish(message(3, 1))
+
+    await consume_until(stream, 0, "worker", handled, 4)
+
+    assert handled == [0, 1, 2, 3]
+
+
+async def test_updates_of_a_crashed_worker_are_claimed(redis):
+    stream = UpdateStream(redis, shards=1, block=1, claim_idle=10)
+    handled = []
+    key = UpdateStream.key(0)
+
+    await create_group(redis, key, UpdateStream.GROUP)
+    await stream.publish(message(0, 1))
+    await redis.xreadgroup(UpdateStream.GROUP, "crashed", {key: ">"})
+
+    await asyncio.sleep(0.02)
+    await consume_until(stream, 0, "worker", handled, 1)
+
+    assert handled == [0]
+    assert await redis.xlen(key) == 0
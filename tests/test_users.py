@@ -0,0 +1,117 @@
+from collections import Counter
+
+from benchmarks.fake_backend import FakeBackend as BackendState
+from src.helpers.user_roles import UserRoles
+from src.models import UserModel
+from src.services.backend import BackendResponse
+from src.services.ban_list import BanList
+from src.services.user_cache import UserCache
+from src.services.users import UserRepository
+
+
+class FakeBackend(object):
+    """ User endpoints of the backend over the in-memory state of the benchmarks' stand-in. """
+
+    def __init__(self):
+        self.state = BackendState()
+        self.calls = Counter()
+        self.fail_patch = False
+
+    async def get_user(self, telegram_id: int = None, link: str = None) -> BackendResponse:
+        self.calls["get_user"] += 1
+
+        user = self.state.users.get(telegram_id) if telegram_id is not None else self.state.users_by_link.get(link)
+
+        return BackendResponse(200, dict(user)) if user is not None else BackendResponse(404, None)
+
+    async def patch_user(self, telegram_id: int, link: str = None, welcome_message: str = None) -> BackendResponse:
+        self.calls["patch_user"] += 1
+
+        if self.fail_patch:
+            return BackendResponse(503, None)
+
+        user = self.state.patch_user(telegram_id, {"link": link, "welcomeMessage": welcome_message})
+
+        return BackendResponse(200, dict(user))
+
+
+def repository(redis) -> tuple[UserRepository, FakeBackend]:
+    backend = FakeBackend()
+    cache = UserCache(redis)
+
+    return UserRepository(backend, cache, BanList(redis, backend, cache)), backend
+
+
+async def test_user_is_resolved_once_then_taken_from_the_cache(redis):
+    users, backend = repository(redis)
+    backend.state.create_user(1, link="first")
+
+    assert (await users.get_by_telegram_id(1)).data.link == "first"
+    assert (await users.get_by_telegram_id(1)).data.link == "first"
+    assert (await users.get_by_link("first")).data.telegram_id == 1
+    assert backend.calls["get_user"] == 1
+
+    # Missing Users aren't cached.
+    assert (await users.get_by_telegram_id(2)).status_code == 404
+    assert (await users.get_by_telegram_id(2)).status_code == 404
+    assert backend.calls["get_user"] == 3
+
+
+async def test_link_change_is_written_through(redis):
+    users, backend = repository(redis)
+    backend.state.create_user(1, link="first")
+
+    user = (await users.get_by_telegram_id(1)).data
+    assert (await users.patch(user, link="second")).ok
+    calls = backend.calls["get_user"]
+
+    assert (await users.get_by_link("second")).data.telegram_id == 1
+    assert (await users.get_by_telegram_id(1)).data.link == "second"
+    assert backend.calls["get_user"] == calls
+
+    # The previous link resolves to nobody.
+    assert await redis.exists(UserCache.link_key("first")) == 0
+    assert (await users.get_by_link("first")).status_code == 404
+
+
+async def test_welcome_message_change_is_written_through(redis):
+    users, backend = repository(redis)
+    backend.state.create_user(1, link="first")
+
+    user = (await users.get_by_telegram_id(1)).data
+    await users.patch(user, welcome_message="Hi")
+
+    assert (await users.cache.get_by_telegram_id(1)).welcome_message == "Hi"
+    assert (await users.cache.get_by_link("first")).welcome_message == "Hi"
+
+
+async def test_failed_change_drops_the_cached_user(redis):
+    users, backend = repository(redis)
+    backend.state.create_user(1, link="first")
+    backend.fail_patch = True
+
+    user = (await users.get_by_telegram_id(1)).data
+    assert not (await users.patch(user, link="second")).ok
+
+    assert await redis.exists(UserCache.telegram_id_key(1), UserCache.link_key("first")) == 0
+
+
+async def test_stale_link_entry_is_a_miss(redis):
+    users, backend = repository(redis)
+    backend.state.create_user(1, link="first")
+
+    # The entry of the previous link outlived the change of the link.
+    user = backend.state.patch_user(1, {"link": "second"})
+    await redis.set(UserCache.link_key("first"), UserModel.from_json(user).encode())
+
+    assert await users.cache.get_by_link("first") is None
+    assert (await users.get_by_link("first")).status_code == 404
+
+
+async def test_banned_user_is_synced_to_the_ban_list(redis):
+    users, backend = repository(redis)
+    backend.state.create_user(1, link="first", roles=UserRoles.Banned)
+
+    await users.get_by_telegram_id(1)
+
+    assert await redis.hexists(BanList.KEY, 1)
@@ -0,0 +1,90 @@
+"""
+Local stand-in of Telegram delivering the updates by webhook.
+
+POSTs synthetic message updates to the bot running in the webhook mode:
+
+    python -m tools.post_updates --users 10 --messages 5 --start-link my_link
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from itertools import count
+from time import monotonic, time
+
+import httpx
+
+update_ids = count(1)
+message_ids = count(1)
+
+
+def message_update(user_id: int, text: str) -> dict:
+    """ Build the update of the private message from the User. """
+
+    message = {
+        "message_id": next(message_ids),
+        "date": int(time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User {user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+        "text": text,
+    }
+
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split(" ")[0])}]
+
+    return {"update_id": next(update_ids), "message": message}
+
+
+async def post_user_updates(
+        client: httpx.AsyncClient,
+        url: str,
+        user_id: int,
+        messages: int,
+        start_link: str | None,
+) -> list[float]:
+    """ POST the User's updates in order, return the time of every POST. """
+
+    texts = [f"Anonymous message #{number}" for number in range(messages)]
+    if start_link is not None:
+        texts.insert(0, f"/start {start_link}")
+
+    timings = []
+    for text in texts:
+        started_at = monotonic()
+        response = await client.post(url, json=message_update(user_id, text))
+        response.raise_for_status()
+        timings.append(monotonic() - started_at)
+
+    return timings
+
+
+async def main():
+    parser = ArgumentParser(description="POST synthetic updates to the bot's webhook.")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret-token", default=None)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--first-user-id", type=int, default=1000000)
+    parser.add_argument("--start-link", default=None)
+    arguments = parser.parse_args()
+
+    headers = {}
+    if arguments.secret_token:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = arguments.secret_token
+
+    started_at = monotonic()
+
+    async with httpx.AsyncClient(headers=headers) as client:
+        timings = await asyncio.gather(*(
+            post_user_updates(client, arguments.url, user_id, arguments.messages, arguments.start_link)
+            for user_id in range(arguments.first_user_id, arguments.first_user_id + arguments.users)
+        ))
+
+    elapsed = monotonic() - started_at
+    timings = sorted(timing for user_timings in timings for timing in user_timings)
+
+    print(f"Posted {len(timings)} updates in {elapsed:.2f}s ({len(timings) / elapsed:.1f}/s).")
+    print(f"Max POST time: {timings[-1] * 1000:.1f}ms.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())